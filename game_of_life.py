@@ -3,6 +3,8 @@
 
 from gol.model import GolModel
 from gol.engine.isotropic import GolEngine
+# Or use the HashLife engine to jump ahead many generations at a time
+# from gol.engine.hashlife import GolEngine
 from gol.view.info import GolInfoView
 from gol.view.grid import GolGridView
 from gol.controller import GolController
@@ -13,3 +15,5 @@ model = GolModel()
 model.state = set({(-1, 0), (0, 0), (1, 0)})
 
 controller = GolController(model, engine, GolGridView, GolInfoView)
+# Or let the engine run flat out and show 60 frames per second
+# controller = GolController(model, engine, GolGridView, GolInfoView, frame_rate=60)
@@ -0,0 +1,288 @@
+"""Benchmarks for the engines, the loader and the saver
+
+Runs a fixed set of workloads so results can be compared between engines
+and between commits. Results are printed as a table and written as JSON.
+
+Usage:
+python -m gol.benchmark --engines isotropic hashlife --output results.json
+python -m gol.benchmark --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from gol.engine import ENGINES, get_engine
+from gol.files.loader import load_file
+from gol.files.saver import save_file
+from gol.model import GolModel
+from gol.soup import random_soup
+
+# The folder with the example patterns that come with the program
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "example_patterns")
+
+GOSPER_GLIDER_GUN = """x = 36, y = 9
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4bo
+bo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+# Smallest pattern that grows forever. Turns into a block-laying switch engine.
+INFINITE_GROWTH = """x = 8, y = 6
+6bo$4bob2o$4bobo$4bo$2bo$obo!
+"""
+
+
+def pattern_from_rle(rle):
+    """Load a pattern from an RLE string
+    """
+
+    with tempfile.NamedTemporaryFile("w", suffix=".rle", delete=False) as rle_file:
+        rle_file.write(rle)
+    try:
+        return load_file(rle_file.name)
+    finally:
+        os.remove(rle_file.name)
+
+
+def gun_array(count, spacing=120):
+    """A square of 'count' by 'count' Gosper glider guns
+
+    The streams of gliders run into the guns further down, which keeps the
+    pattern busy.
+    """
+
+    gun = pattern_from_rle(GOSPER_GLIDER_GUN)
+    model = GolModel()
+    model.state = set(
+        (x + column * spacing, y + row * spacing)
+        for row in range(count) for column in range(count) for x, y in gun.state)
+    return model
+
+
+def soup(size, density, seed="benchmark"):
+    """A square random soup
+    """
+
+    model = GolModel()
+    model.state = random_soup(seed + str(density), size, density)
+    return model
+
+
+def workloads(scale=1):
+    """The engine workloads
+
+    Parameters:
+    scale (float): multiplies the number of generations
+
+    Return:
+    list: (name, model, generations) for each workload
+    """
+
+    acorn = load_file(os.path.join(PATTERN_DIR, "ACORN.LIF"))
+    return [
+        ("acorn", acorn, int(1000 * scale)),
+        ("soup-0.1", soup(256, 0.1), int(100 * scale)),
+        ("soup-0.3", soup(256, 0.3), int(100 * scale)),
+        ("soup-0.5", soup(256, 0.5), int(100 * scale)),
+        ("gun-array", gun_array(8), int(500 * scale)),
+        ("infinite-growth", pattern_from_rle(INFINITE_GROWTH), int(2000 * scale)),
+    ]
+
+
+def advance(engine, model, generations):
+    """Advance a model the fastest way the engine allows
+    """
+
+    if hasattr(engine, "advance_by"):
+        return engine.advance_by(model, generations)
+    for _ in range(generations):
+        model = engine.advance(model)
+    return model
+
+
+def measure(function, memory=True):
+    """Time a function and optionally measure its peak memory use
+
+    The peak memory is measured in a second run, since tracing memory slows
+    the function down.
+
+    Return:
+    (result, float, int): the result, the time in seconds and the peak
+        memory in bytes (None if not measured)
+    """
+
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+def bench_engine(engine_name, name, model, generations, memory=True):
+    """Benchmark one engine on one workload
+
+    Cells per second is the number of generations times the average of the
+    first and last population, divided by the time.
+    """
+
+    engine = get_engine(engine_name)
+    try:
+        result, seconds, peak = measure(lambda: advance(engine, model, generations), memory)
+    finally:
+        if hasattr(engine, "close"):
+            engine.close()
+
+    population = (len(model.state) + len(result.state)) / 2
+    return {
+        "benchmark": name,
+        "engine": engine_name,
+        "generations": generations,
+        "population": len(result.state),
+        "seconds": seconds,
+        "generations_per_second": generations / seconds,
+        "cells_per_second": generations * population / seconds,
+        "peak_memory": peak,
+    }
+
+
+def bench_files(size, memory=True):
+    """Benchmark saving and loading a large random soup as RLE
+    """
+
+    model = soup(size, 0.5)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "soup.rle")
+
+        _, seconds, peak = measure(lambda: save_file(model, filename), memory)
+        file_size = os.path.getsize(filename)
+        results.append({
+            "benchmark": "save-rle", "engine": None, "bytes": file_size,
+            "population": len(model.state), "seconds": seconds,
+            "cells_per_second": len(model.state) / seconds, "peak_memory": peak})
+
+        loaded, seconds, peak = measure(lambda: load_file(filename), memory)
+        results.append({
+            "benchmark": "load-rle", "engine": None, "bytes": file_size,
+            "population": len(loaded.state), "seconds": seconds,
+            "cells_per_second": len(loaded.state) / seconds, "peak_memory": peak})
+
+    return results
+
+
+def git_commit():
+    """Return the current git commit, or None if not in a git repository
+    """
+
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def print_table(results, out=sys.stderr, baseline=None):
+    """Print the results as a table
+
+    Parameters:
+    results: list of result dicts
+    out: file to print to
+    baseline: list of result dicts from an earlier run to compare with
+    """
+
+    previous = {}
+    for result in baseline or []:
+        previous[(result["benchmark"], result["engine"])] = result["seconds"]
+
+    for result in results:
+        line = "{:<16} {:<10} {:>10.3f} s {:>14,.0f} cells/s".format(
+            result["benchmark"], result["engine"] or "-", result["seconds"],
+            result["cells_per_second"])
+        if result.get("peak_memory") is not None:
+            line += " {:>10.1f} MiB".format(result["peak_memory"] / 1024 / 1024)
+        earlier = previous.get((result["benchmark"], result["engine"]))
+        if earlier:
+            line += " {:>6.2f}x".format(earlier / result["seconds"])
+        print(line, file=out)
+
+
+def main(argv=None):
+    """Command line entry point
+
+    Parameters:
+    argv: command line arguments. Defaults to sys.argv[1:]
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m gol.benchmark", description="Benchmark the game of life")
+    parser.add_argument("-e", "--engines", nargs="+", choices=sorted(ENGINES),
+                        default=["isotropic", "hashlife", "active"],
+                        help="engines to benchmark")
+    parser.add_argument("-b", "--benchmarks", nargs="+",
+                        help="only run benchmarks with these names")
+    parser.add_argument("-s", "--scale", type=float, default=1,
+                        help="multiply the number of generations by this")
+    parser.add_argument("--rle-size", type=int, default=2048,
+                        help="width and height of the soup saved and loaded as RLE")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="do not measure peak memory (halves the run time)")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to")
+    parser.add_argument("-c", "--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    memory = not args.no_memory
+    wanted = set(args.benchmarks) if args.benchmarks else None
+
+    results = []
+    for name, model, generations in workloads(args.scale):
+        if wanted and name not in wanted:
+            continue
+        for engine_name in args.engines:
+            results.append(bench_engine(engine_name, name, model, generations, memory))
+            print_table(results[-1:])
+
+    if not wanted or wanted & {"save-rle", "load-rle"}:
+        for result in bench_files(args.rle_size, memory):
+            results.append(result)
+            print_table(results[-1:])
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        print("\nCompared with " + args.compare + " (higher is faster):", file=sys.stderr)
+        print_table(results, baseline=baseline)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Saves checkpoints of long runs so they can be resumed
+
+A checkpoint is a binary snapshot with the state, dying cells, rule and
+generation of the model. Checkpoints are written by a background thread, so
+the engine keeps going while the file is written. Each checkpoint is written to a temporary
+file that replaces the previous checkpoint when it is complete, so a crash
+while writing leaves the last good checkpoint in place.
+"""
+
+import copy
+import os
+from collections.abc import MutableSet
+import tempfile
+import threading
+import time
+
+from gol.files.snapshot import load_snapshot, write_snapshot
+
+
+def write_atomic(model, filename):
+    """Save a model as a snapshot, replacing 'filename' in one step
+
+    Parameters:
+    model (GolModel): the model to save
+    filename (str): the checkpoint file
+    """
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile(
+            "wb", dir=directory, prefix=os.path.basename(filename) + ".",
+            suffix=".tmp", delete=False) as temporary:
+        try:
+            write_snapshot(model, temporary)
+            temporary.flush()
+            os.fsync(temporary.fileno())
+        except BaseException:
+            temporary.close()
+            os.remove(temporary.name)
+            raise
+    os.replace(temporary.name, filename)
+
+
+def resume(filename, engine=None):
+    """Load the latest checkpoint
+
+    Parameters:
+    filename (str): the checkpoint file
+    engine: the engine the run continues with. An engine with a
+        'load_snapshot' method (like the dense engine) loads the checkpoint itself.
+
+    Return:
+    GolModel: the model in the checkpoint, or None if there is no checkpoint
+    """
+
+    try:
+        if hasattr(engine, "load_snapshot"):
+            return engine.load_snapshot(filename)
+        return load_snapshot(filename)
+    except FileNotFoundError:
+        return None
+
+
+class Checkpointer():
+    """Writes checkpoints of a model from a background thread
+
+    Call update() with every new model. A checkpoint is written when
+    'every_generations' generations or 'every_seconds' seconds have passed
+    since the last one. If the thread is still writing when the next
+    checkpoint is due, only the newest model is kept for the next write.
+
+    Parameters:
+    filename (str): the checkpoint file
+    every_generations (int): generations between checkpoints. 0 to not count generations.
+    every_seconds (float): seconds between checkpoints. 0 to not look at the time.
+    generation (int): the generation the run starts from
+
+    Attributes:
+    saved_generation (int): generation of the last checkpoint written, or None
+    error (Exception): the error of the last failed write, or None
+    """
+
+    def __init__(self, filename, every_generations=0, every_seconds=0, generation=0):
+        self.filename = filename
+        self.every_generations = every_generations
+        self.every_seconds = every_seconds
+        self.saved_generation = None
+        self.error = None
+
+        self._last_generation = generation
+        self._last_time = time.monotonic()
+        # Generation of the last model handed to the thread, or None
+        self._handed_generation = None
+
+        # The model waiting to be written, and whether the thread should stop
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def due(self, model):
+        """Check if a checkpoint of a model is due
+
+        Parameters:
+        model (GolModel): the current model
+
+        Return:
+        bool: True if a checkpoint should be written
+        """
+
+        if self.every_generations and \
+                model.generation - self._last_generation >= self.every_generations:
+            return True
+        if self.every_seconds and time.monotonic() - self._last_time >= self.every_seconds:
+            return True
+        return False
+
+    def update(self, model):
+        """Write a checkpoint of a model if one is due
+
+        Parameters:
+        model (GolModel): the current model
+
+        Return:
+        bool: True if a checkpoint was handed to the background thread
+        """
+
+        if not self.due(model):
+            return False
+        self.save(model)
+        return True
+
+    def save(self, model):
+        """Write a checkpoint of a model now
+
+        The engines never change a state they have returned, so the state
+        is handed to the thread as it is and only turned into cells there.
+        Only a state that can be changed in place, like a set the user
+        toggles cells in, is copied, so the model can be changed after this
+        returns.
+
+        Parameters:
+        model (GolModel): the model to save
+        """
+
+        pending = copy.copy(model)
+        if isinstance(model.state, MutableSet):
+            # A TiledState copies its dict of tiles, not the cells
+            pending.state = model.state.copy() if hasattr(model.state, "copy") \
+                else set(model.state)
+
+        self._last_generation = model.generation
+        self._last_time = time.monotonic()
+        self._handed_generation = model.generation
+        with self._condition:
+            self._pending = pending
+            self._condition.notify()
+
+    def finish(self, model):
+        """Write a checkpoint of the last model of a run, unless it was already handed over
+
+        Parameters:
+        model (GolModel): the last model
+        """
+
+        if self._handed_generation != model.generation:
+            self.save(model)
+
+    def close(self):
+        """Write the checkpoint that is waiting, if any, and stop the thread
+
+        Raises the error of the last failed write, if any.
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        """Background thread: write the pending model until closed
+        """
+
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                model, self._pending = self._pending, None
+                if model is None:
+                    return
+
+            try:
+                write_atomic(model, self.filename)
+            except OSError as error:
+                self.error = error
+            else:
+                self.error = None
+                self.saved_generation = model.generation
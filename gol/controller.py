@@ -1,10 +1,142 @@
 """Controller for Game of Life
 Must contain a GolController class as specified below
+
+The controller runs an asyncio event loop. The views put messages on its
+queue from their own threads, and the engine is advanced in an executor so
+messages are handled while a generation is being calculated.
 """
 
-import queue
+import asyncio
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gol.cycle import CycleDetector
+from gol.engine import engine_for_rule
 from gol.files.loader import load_file
 from gol.files.saver import save_file
+from gol.frame import Frame, toggled
+from gol.history import GolHistory
+from gol.stats import GolStats
+from gol.tiles import TiledState
+
+# Seconds between statistics sent to the info view
+STATS_INTERVAL = 0.5
+
+
+class HubQueue():
+    """The controller queue
+
+    Messages can be put on it from any thread. They are handed to the
+    controller's event loop straight away, so nothing has to poll for them.
+
+    Parameters:
+    loop: the asyncio event loop of the controller
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.messages = asyncio.Queue()
+
+    def put(self, message):
+        """Put a (msg, attr) message on the queue. Safe to call from any thread.
+        """
+
+        try:
+            self.loop.call_soon_threadsafe(self.messages.put_nowait, message)
+        except RuntimeError:
+            # The controller has quit and closed its loop
+            pass
+
+    async def get(self):
+        """Wait for the next (msg, attr) message
+        """
+
+        return await self.messages.get()
+
+
+class Coalescer():
+    """Sends a message to a view, collapsing a burst of them into the latest one
+
+    Only one message is in flight at a time. Anything sent while the view is
+    busy replaces the message waiting to go, and the latest one goes out
+    when the view says it is idle.
+
+    Parameters:
+    loop: the asyncio event loop of the controller
+    view_queue: the queue of the view
+    msg (str): the message to send, e.g. "update"
+    """
+
+    def __init__(self, loop, view_queue, msg):
+        self.loop = loop
+        self.view_queue = view_queue
+        self.msg = msg
+        # Seconds between messages. 0 to send as soon as the view is idle.
+        self.interval = 0
+        self._pending = None
+        self._has_pending = False
+        self._busy = False
+        self._next_time = 0
+        self._timer = None
+        # Set when the view is idle and nothing is waiting to go
+        self._ready = asyncio.Event()
+        self._ready.set()
+
+    def send(self, attr):
+        """Send 'attr' to the view, or keep it until the view is idle
+        """
+
+        self._pending = attr
+        self._has_pending = True
+        self._ready.clear()
+        self._flush()
+
+    def busy(self):
+        """The view is busy, e.g. redrawing after zooming
+        """
+
+        self._busy = True
+        self._ready.clear()
+
+    def idle(self):
+        """The view is done with the last message
+        """
+
+        self._busy = False
+        self._flush()
+
+    async def ready(self):
+        """Wait until the view is idle and nothing is waiting to go
+        """
+
+        await self._ready.wait()
+
+    def _flush(self):
+        """Send the waiting message if the view is idle and the interval has passed
+        """
+
+        if self._busy:
+            return
+        if not self._has_pending:
+            self._ready.set()
+            return
+
+        now = self.loop.time()
+        if now < self._next_time:
+            if self._timer is None:
+                self._timer = self.loop.call_at(self._next_time, self._timer_done)
+            return
+
+        self.view_queue.put((self.msg, self._pending))
+        self._pending = None
+        self._has_pending = False
+        self._busy = True
+        self._next_time = now + self.interval
+
+    def _timer_done(self):
+        self._timer = None
+        self._flush()
 
 
 class GolController():
@@ -12,17 +144,49 @@ class GolController():
 
     Parameters:
     model: The game of life model with the state and rules
-    engine: GolEngine class to use
+    engine: GolEngine to use. Files with rules it cannot run get an engine that can.
     grid_view: GolGridView class to use
     info_view: GolInfoView class to use
+    checkpointer (Checkpointer): writes checkpoints while 'running', or None
+    frame_rate (float): frames per second to show while 'running'. With 0 the
+        next generation waits until the grid view has drawn the last one.
+        Otherwise the engine runs flat out and the grid view is sent the
+        latest generation at most this often, skipping the ones in between.
+    step_size (int): generations to advance at a time while 'running'
     """
 
-    def __init__(self, model, engine, grid_view, info_view):
-        self.queue = queue.Queue()
+    def __init__(self, model, engine, grid_view, info_view, checkpointer=None,
+                 frame_rate=0, step_size=1):
+        self.loop = asyncio.new_event_loop()
+        self.queue = HubQueue(self.loop)
         self.model = model
-        self.engine = engine
+        # The engine given, and the one that runs the rule of the model
+        self.default_engine = engine
+        self.engine = engine_for_rule(engine, model.rule)
+        # The engine is advanced in here, one step at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Held while the model is being changed, so a step and a message
+        # like 'toggle_cell' do not change it at the same time
+        self.model_lock = asyncio.Lock()
+        # Set while 'running'
+        self.running = asyncio.Event()
+        # Number of generations to advance for each update while 'running'
+        self.step_size = step_size
+        # Frames per second while 'running'. 0 to draw every update.
+        self.frame_rate = frame_rate
+        # Stops 'running' when the pattern has stabilised
+        self.cycle_detector = CycleDetector()
+        # Only stop once, so the user can keep 'running' a stabilised pattern
+        self.stop_on_cycle = True
+        # Recent generations, to step back in time
+        self.history = GolHistory()
+        self.checkpointer = checkpointer
+        # Statistics of the loop. None unless turned on with a 'stats' message.
+        self.stats = None
         self.grid_view = grid_view(self.queue)
         self.info_view = info_view(self.queue)
+        # Sends the frames to the grid view
+        self.frames = Coalescer(self.loop, self.grid_view.queue, "update")
 
         # Start the controller
         self.go()
@@ -31,74 +195,311 @@ class GolController():
         """Starts the controller loop
         """
 
-        # Exit loop when done is True
-        done = False
+        try:
+            self.loop.run_until_complete(self.main())
+        finally:
+            self.executor.shutdown()
+            self.loop.close()
 
-        # This is True when 'running' the game of life
-        auto_advance = False
+    async def main(self):
+        """Handle messages until told to quit, while 'running' in the background
+        """
 
-        # This is True when the view is busy updating the game of life
-        view_busy = False
+        self.history.record(self.model)
 
         # Start by telling the grid view to draw the cells
-        self.grid_view.queue.put(("update", self.model.state))
+        self.frames.send(self.frame())
+
+        tasks = [asyncio.ensure_future(self.run_loop()), asyncio.ensure_future(self.stats_loop())]
+        try:
+            await self.message_loop()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # The executor has one thread, so a step that is still being
+        # calculated is done before the checkpoint is saved
+        if self.checkpointer:
+            await self.in_executor(self.close_checkpointer)
+
+    def close_checkpointer(self):
+        """Save the last checkpoint and stop the checkpointer
+        """
+
+        self.checkpointer.save(self.model)
+        self.checkpointer.close()
 
+    async def message_loop(self):
+        """Handle the messages from the views until 'quit'
+        """
+
+        done = False
         while not done:
+            wait_start = time.perf_counter()
             # Wait for message from either view
-            msg, attr = self.queue.get()
+            msg, attr = await self.queue.get()
+
+            if self.stats:
+                self.stats.record_message(msg, time.perf_counter() - wait_start)
 
             if msg == "quit":  # Quit the program
                 self.info_view.queue.put(("quit", None))
                 self.grid_view.queue.put(("quit", None))
+                self.running.clear()
                 done = True
 
             elif msg == "open":  # Load file
-                try:
-                    self.model = load_file(attr)
-                except FileNotFoundError:
-                    self.info_view.queue.put(("error_loading", None))
-                else:
-                    # Update the info in the info view
-                    self.info_view.queue.put(("model", self.model))
-                    # Tell the grid to draw the new cells
-                    self.grid_view.queue.put(("update", self.model.state))
-                    view_busy = True
+                async with self.model_lock:
+                    try:
+                        model = await self.in_executor(load_file, attr)
+                    except (FileNotFoundError, ValueError):
+                        # A missing file, or a rule that cannot be parsed
+                        self.info_view.queue.put(("error_loading", None))
+                        continue
+                    if not isinstance(model.state, (set, TiledState)):
+                        # The views and the history need cells they can go
+                        # through quickly, not a TreeState
+                        model.state = TiledState(model.state)
+                    self.model = model
+                    self.engine = engine_for_rule(self.default_engine, model.rule)
+                    self.cycle_detector.reset()
+                    self.stop_on_cycle = True
+                    self.history.clear()
+                    self.history.record(self.model)
+                # Update the info in the info view
+                self.info_view.queue.put(("model", self.model))
+                # Tell the grid to draw the new cells
+                self.frames.send(self.frame())
 
             elif msg == "save":  # Save file
                 try:
-                    save_file(self.model, attr)
+                    await self.in_executor(save_file, self.model, attr)
                 except FileNotFoundError:
                     self.info_view.queue.put(("error_saving", None))
 
             elif msg == "step":  # Calculate one generation
-                # Calculate the next generation
-                self.model = self.engine.advance(self.model)
+                async with self.model_lock:
+                    try:
+                        await self.in_executor(self.advance, 1)
+                    except ValueError as error:
+                        # The engine cannot run the rule
+                        self.info_view.queue.put(("error_engine", str(error)))
+                        continue
                 # Tell the grid view to draw the cells
-                self.grid_view.queue.put(("update", self.model.state))
-                view_busy = True
+                self.frames.send(self.frame())
+
+            elif msg == "step_back":  # Go back one generation
+                async with self.model_lock:
+                    found = self.seek(self.model.generation - 1)
+                if found:
+                    self.frames.send(self.frame())
+
+            elif msg == "seek":  # Go to a recent generation
+                async with self.model_lock:
+                    found = self.seek(attr)
+                if found:
+                    self.frames.send(self.frame())
 
             elif msg == "run":  # 'Run' the game of life
-                auto_advance = not auto_advance
+                if self.running.is_set():
+                    self.running.clear()
+                else:
+                    self.running.set()
+
+            elif msg == "faster":  # Double the number of generations per update
+                self.step_size *= 2
+
+            elif msg == "slower":  # Halve the number of generations per update
+                self.step_size = max(1, self.step_size // 2)
+
+            elif msg == "frame_rate":  # Frames per second while 'running'. 0 to draw every update.
+                self.frame_rate = attr
 
             elif msg == "view_idle":  # Grid view is done updating the window
-                view_busy = False
+                self.frames.idle()
+                # The time it took to draw the window
+                if self.stats and attr is not None:
+                    self.stats.record_frame(attr)
+
+            elif msg == "stats":  # Turn statistics on (True) or off (False)
+                self.stats = GolStats() if attr else None
+                if not attr:
+                    self.info_view.queue.put(("stats", None))
+
+            elif msg == "stats_export":  # Write the statistics to a CSV or JSON file
+                if self.stats:
+                    try:
+                        self.stats.export(attr)
+                    except OSError:
+                        self.info_view.queue.put(("error_saving", None))
 
             elif msg == "view_busy":  # Grid view is budy updating the window
-                view_busy = True
+                self.frames.busy()
 
             elif msg == "toggle_cell":  # Turn a cell on or off
-                if attr in self.model.state:
-                    self.model.state.remove(attr)
-                else:
-                    self.model.state.add(attr)
+                async with self.model_lock:
+                    # The grid view may still be drawing the old state
+                    self.model.state = toggled(self.model.state, attr)
+                    self.cycle_detector.reset()
+                    self.stop_on_cycle = True
+                    self.history.toggle(self.model, attr)
                 # Tell grid view to update window
-                self.grid_view.queue.put(("update", self.model.state))
-                view_busy = True
-
-            # When the game of life is 'running'
-            # only advance to the next generation and tell the grid view
-            # to update the window if it is not busy
-            if auto_advance and not view_busy:
-                self.model = self.engine.advance(self.model)
-                self.grid_view.queue.put(("update", self.model.state))
-                view_busy = True
+                self.frames.send(self.frame())
+
+    async def run_loop(self):
+        """Advance the model while 'running'
+
+        With a frame rate the engine runs flat out and the grid view gets
+        the latest generation when the next frame is due. Otherwise each
+        step waits until the grid view has drawn the last one.
+        """
+
+        while True:
+            await self.running.wait()
+            if not self.frame_rate:
+                await self.frames.ready()
+
+            async with self.model_lock:
+                if not self.running.is_set():
+                    continue
+                try:
+                    cycle = await self.in_executor(self.advance, self.step_size)
+                except ValueError as error:
+                    # The engine cannot run the rule
+                    self.running.clear()
+                    self.info_view.queue.put(("error_engine", str(error)))
+                    continue
+
+            if cycle and self.stop_on_cycle:
+                # Stop 'running' when the pattern has stabilised
+                self.running.clear()
+                self.stop_on_cycle = False
+                self.info_view.queue.put(("stabilised", self.cycle_detector.cycle))
+
+            self.frames.interval = 1 / self.frame_rate if self.frame_rate else 0
+            self.frames.send(self.frame())
+
+    async def stats_loop(self):
+        """Tell the info view how things are going
+        """
+
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            if self.stats:
+                self.info_view.queue.put(("stats", self.stats.summary()))
+
+    async def in_executor(self, function, *args):
+        """Call a function in the executor, so the event loop keeps handling messages
+
+        Parameters:
+        function: the function to call
+        args: passed on to the function
+
+        Return:
+        The return value of the function
+        """
+
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    def frame(self):
+        """The current generation for the views
+
+        The state is not copied. It is never changed after this.
+
+        Return:
+        Frame: the generation, alive cells and bounding box of the model
+        """
+
+        return Frame(self.model.generation, self.model.state, self.model.bounds)
+
+    def advance(self, generations):
+        """Advance the model a number of generations
+
+        Engines with an 'advance_by' method (like the HashLife engine) can
+        jump ahead in one go. Other engines are advanced one generation at a time.
+
+        Parameters:
+        generations (int): number of generations to advance
+
+        Return:
+        Cycle: the cycle if the pattern has stabilised, otherwise None
+        """
+
+        if generations > 1 and hasattr(self.engine, "advance_by"):
+            self.advance_engine(self.engine.advance_by, generations)
+            self.history.record(self.model)
+            if self.checkpointer:
+                self.checkpointer.update(self.model)
+            if not self.stop_on_cycle:
+                return None
+            return self.cycle_detector.update(
+                self.model.state, self.model.generation, self.model.bounds)
+
+        cycle = None
+        for _ in range(generations):
+            self.advance_engine(self.engine.advance)
+            self.history.record(self.model)
+            if self.checkpointer:
+                self.checkpointer.update(self.model)
+            if not self.stop_on_cycle:
+                # The cycle was already reported. Nothing to look for until the pattern changes.
+                continue
+            cycle = self.cycle_detector.update(
+                self.model.state, self.model.generation, self.model.bounds)
+            if cycle:
+                break
+        return cycle
+
+    def advance_engine(self, advance, *args):
+        """Call an engine method on the model, recording statistics if they are on
+
+        Parameters:
+        advance: the engine method, e.g. self.engine.advance
+        args: passed on after the model
+        """
+
+        # Statistics can be turned off by a message while this runs in the executor
+        stats = self.stats
+        if not stats:
+            self.model = advance(self.model, *args)
+            return
+
+        old_state = self.model.state
+        start = time.perf_counter()
+        self.model = advance(self.model, *args)
+        seconds = time.perf_counter() - start
+        stats.record_generation(old_state, self.model, args[0] if args else 1, seconds)
+
+    def seek(self, generation):
+        """Go back to a recent generation
+
+        Anything after that generation is forgotten.
+
+        Parameters:
+        generation (int): the generation to go to
+
+        Return:
+        bool: True if the generation was still in the history
+        """
+
+        if generation < 0 or generation > self.model.generation:
+            return False
+
+        found = self.history.seek(generation)
+        if found is None:
+            return False
+
+        generation, state, dying = found
+        self.history.truncate(generation, state)
+        self.cycle_detector.reset()
+        self.stop_on_cycle = True
+
+        # Make a shallow copy and replace the state
+        self.model = copy.copy(self.model)
+        self.model.state = state
+        self.model.dying = dying
+        self.model.generation = generation
+        self.model.births = self.model.deaths = None
+
+        return True
@@ -0,0 +1,175 @@
+"""Detects when a pattern has become periodic
+
+Keeps hashes of recent states, moved so that the top left corner of the
+bounding box is at (0, 0). When a state comes back, the pattern has
+stabilised. The distance it moved tells oscillators and spaceships apart.
+"""
+
+from collections import Counter, deque, namedtuple
+
+# A detected cycle
+#   generation: the first generation of the repeating state
+#   period: number of generations before the state repeats
+#   displacement (dx, dy): how far the pattern moved in one period.
+#       (0, 0) for still lifes and oscillators.
+Cycle = namedtuple("Cycle", "generation period displacement")
+
+
+def state_shape(state, bounds=None):
+    """Return a cheap key that is the same for a state and any translation of it
+
+    Parameters:
+    state: set of alive cells
+    bounds: the bounding box of the state, if known. See GolModel.bounds.
+
+    Return:
+    ((int, int, int), int, int): the population, width and height, and the
+        top left corner of the bounding box
+    """
+
+    if bounds is None:
+        if hasattr(state, "bounds"):
+            bounds = state.bounds()
+        elif state:
+            bounds = (min(x for x, _ in state), min(y for _, y in state),
+                      max(x for x, _ in state), max(y for _, y in state))
+    if bounds is None:
+        return (0, 0, 0), 0, 0
+
+    min_x, min_y, max_x, max_y = bounds
+    population = getattr(state, "population", None)
+    if population is None:
+        population = len(state)
+    return (population, max_x - min_x + 1, max_y - min_y + 1), min_x, min_y
+
+
+def state_key(state, min_x, min_y):
+    """Return a hash of a state moved so that (min_x, min_y) is at (0, 0)
+
+    Goes through every cell, so it is only used when the shape of the state
+    has been seen before.
+    """
+
+    return hash(frozenset((x - min_x, y - min_y) for x, y in state))
+
+
+class CycleDetector():
+    """Detects repeating states
+
+    A state is only hashed when a state with the same population and size
+    of bounding box is in the history, so a step costs nothing extra until
+    the pattern looks like it might repeat. The first state of a cycle is
+    not hashed, so the cycle is found one period after the state first
+    repeats, and its 'generation' is the first hashed state of the cycle.
+
+    Only a hash of each state is kept, so a (very unlikely) hash collision
+    can report a cycle that is not there.
+
+    Parameters:
+    max_history (int): number of states to remember. Cycles longer than
+        this are not detected.
+    """
+
+    def __init__(self, max_history=1000):
+        self.max_history = max_history
+        self.cycle = None
+
+        # (shape, key, generation, min_x, min_y) of the remembered states.
+        # key is None for states that were not hashed.
+        self.history = deque()
+        # Number of remembered states of each shape
+        self._shapes = Counter()
+        # (shape, hash) -> (generation, min_x, min_y) of the hashed states
+        self._seen = dict()
+
+    def reset(self):
+        """Forget all states, e.g. after the pattern was edited
+        """
+
+        self.history.clear()
+        self._shapes.clear()
+        self._seen.clear()
+        self.cycle = None
+
+    def update(self, state, generation, bounds=None):
+        """Add a state and check if it has been seen before
+
+        Call this for every generation to get the exact period. When
+        generations are skipped, the period found is a multiple of the
+        real period.
+
+        Parameters:
+        state: set of alive cells
+        generation (int): the generation of the state
+        bounds: the bounding box of the state, if known. See GolModel.bounds.
+
+        Return:
+        Cycle: the cycle if the state has been seen before, otherwise None
+        """
+
+        shape, min_x, min_y = state_shape(state, bounds)
+
+        key = None
+        if self._shapes[shape]:
+            key = (shape, state_key(state, min_x, min_y))
+            seen = self._seen.get(key)
+            if seen is not None:
+                first_generation, first_x, first_y = seen
+                self.cycle = Cycle(first_generation, generation - first_generation,
+                                   (min_x - first_x, min_y - first_y))
+                return self.cycle
+            self._seen[key] = (generation, min_x, min_y)
+
+        self.history.append((shape, key, generation, min_x, min_y))
+        self._shapes[shape] += 1
+        if len(self.history) > self.max_history:
+            shape, key, *_ = self.history.popleft()
+            self._shapes[shape] -= 1
+            if not self._shapes[shape]:
+                del self._shapes[shape]
+            if key is not None:
+                del self._seen[key]
+        return None
+
+
+def describe_cycle(cycle):
+    """Describe a cycle found by the cycle detector
+
+    Parameters:
+    cycle (Cycle): the cycle to describe
+
+    Return:
+    str: a short description
+    """
+
+    if cycle.displacement != (0, 0):
+        kind = "Spaceship with period {}, moving {} per period".format(
+            cycle.period, cycle.displacement)
+    elif cycle.period == 1:
+        kind = "Still life"
+    else:
+        kind = "Oscillator with period {}".format(cycle.period)
+    return "{}, from generation {}".format(kind, cycle.generation)
+
+
+def find_cycle(model, engine, max_generations, max_history=1000):
+    """Advance a model until it repeats
+
+    Parameters:
+    model (GolModel): the model to advance
+    engine: the engine to use
+    max_generations (int): give up after this many generations
+    max_history (int): number of states to remember
+
+    Return:
+    (GolModel, Cycle): the last model and the cycle, or None if no cycle was found
+    """
+
+    detector = CycleDetector(max_history)
+    detector.update(model.state, model.generation, model.bounds)
+    for _ in range(max_generations):
+        model = engine.advance(model)
+        cycle = detector.update(model.state, model.generation, model.bounds)
+        if cycle:
+            return model, cycle
+    return model, None
@@ -0,0 +1,70 @@
+"""Engines to calculate game of life generations
+
+Each engine module contains a GolEngine class with an 'advance' method.
+"""
+
+import importlib
+
+from gol.rule import GenerationsRule, IsotropicRule, LtlRule
+
+# Engine names and the modules they live in. Modules are only imported when
+# the engine is used, so engines with extra dependencies (like NumPy) do not
+# slow down or break the others.
+ENGINES = {
+    "isotropic": "gol.engine.isotropic",
+    "hashlife": "gol.engine.hashlife",
+    "dense": "gol.engine.dense",
+    "parallel": "gol.engine.parallel",
+    "active": "gol.engine.active",
+    # Keeps the state as 64x64 bitmap tiles
+    "tiled": "gol.engine.tiled",
+    # Isotropic non-totalistic rules like B2-a3/S12
+    "lookup": "gol.engine.lookup",
+    # Generations and Larger than Life rules
+    "generations": "gol.engine.multistate",
+    "ltl": "gol.engine.multistate",
+}
+
+# Rules that only some engines can run, and the names of those engines.
+# The first one is used when the engine has to be changed.
+RULE_ENGINES = (
+    (GenerationsRule, ("generations", "ltl")),
+    (LtlRule, ("ltl", "generations")),
+    (IsotropicRule, ("lookup", "hashlife")),
+)
+
+
+def engine_for_rule(engine, rule):
+    """Find an engine that can run a rule
+
+    Parameters:
+    engine (GolEngine): the engine in use
+    rule: the rule to run
+
+    Return:
+    GolEngine: 'engine' if it can run the rule, otherwise a new engine that can
+    """
+
+    for rule_type, names in RULE_ENGINES:
+        if isinstance(rule, rule_type):
+            if type(engine).__module__ in (ENGINES[name] for name in names):
+                return engine
+            return get_engine(names[0])
+    return engine
+
+
+def get_engine(name, **kwargs):
+    """Create an engine by name
+
+    Parameters:
+    name (str): one of the names in ENGINES
+    kwargs: passed on to the GolEngine class
+
+    Return:
+    GolEngine: the engine
+    """
+
+    if name not in ENGINES:
+        raise ValueError("Unknown engine: " + str(name))
+    module = importlib.import_module(ENGINES[name])
+    return module.GolEngine(**kwargs)
@@ -0,0 +1,193 @@
+"""Contains an engine that only looks at the active parts of the pattern
+
+Must contain a GolEngine class with an 'advance' method
+
+The engine remembers the neighbour counts between generations and only
+re-evaluates the neighbourhoods of cells that changed in the last
+generation. Still lifes cost nothing, so the cost of a step is proportional
+to the activity rather than the population. The state is kept in tiles, so
+the new generation shares the unchanged tiles with the last one instead of
+copying every cell.
+"""
+
+import copy
+
+from gol.rule import compile_rule
+from gol.tiles import TiledState
+
+# Offsets to the eight neighbours of a cell
+NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class ActiveState(TiledState):
+    """State of alive cells that remembers changes made outside the engine
+
+    'add', 'remove' and 'discard' are tracked, so toggling cells does not
+    force the engine to start over. The in-place set operators go through
+    them too.
+
+    The cells are kept in tiles, so a copy only copies the dict of tiles.
+    That way the engine can leave the state of the last generation alone
+    without going through all of its cells.
+    """
+
+    def __init__(self, cells=()):
+        TiledState.__init__(self, cells)
+        # (cell, +1/-1) for each cell added or removed since 'origin'. None when unknown.
+        self.changes = []
+        # The state the changes are relative to. None for this state itself.
+        self.origin = None
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # Results of set operators are plain TiledStates, not tracked
+        return TiledState(iterable)
+
+    def copy(self):
+        """Copy the cells and the changes, so toggling cells in a copy is tracked too
+        """
+
+        new_state = self.untracked_copy()
+        new_state.origin = self if self.origin is None else self.origin
+        new_state.changes = None if self.changes is None else list(self.changes)
+        return new_state
+
+    def untracked_copy(self):
+        """Copy the cells only. The copy has no changes.
+        """
+
+        new_state = ActiveState()
+        new_state.tiles = dict(self.tiles)
+        new_state._population = self._population
+        return new_state
+
+    def add(self, cell):
+        if self.changes is not None and cell not in self:
+            self.changes.append((cell, 1))
+        TiledState.add(self, cell)
+
+    def discard(self, cell):
+        if self.changes is not None and cell in self:
+            self.changes.append((cell, -1))
+        TiledState.discard(self, cell)
+
+
+class GolEngine():
+    """Engine that tracks the active region between generations
+
+    Attributes:
+    active_size (int): number of cells that changed in the last generation
+    """
+
+    def __init__(self):
+        self.active_size = 0
+
+        # The state returned by the last call to advance
+        self._state = None
+        self._rule = None
+
+        # Neighbour counts of the cells in self._state
+        self._counts = dict()
+
+        # Cells that changed in the last generation
+        self._active = set()
+
+    def _count(self, cells, delta):
+        """Add 'delta' to the neighbour counts around each cell
+        """
+
+        counts = self._counts
+        for x, y in cells:
+            for dx, dy in NEIGHBOURS:
+                position = (x+dx, y+dy)
+                count = counts.get(position, 0) + delta
+                if count:
+                    counts[position] = count
+                else:
+                    del counts[position]
+
+    def _synchronise(self, model, rule):
+        """Make sure the neighbour counts match the state of the model
+        """
+
+        state = model.state
+        origin = getattr(state, "origin", None)
+        if origin is None:
+            origin = state
+        if origin is self._state and getattr(state, "changes", None) is not None \
+                and rule is self._rule:
+            # Only a few cells were toggled since the last generation
+            for cell, delta in state.changes:
+                self._count((cell,), delta)
+                self._active.add(cell)
+            state.changes = []
+            state.origin = None
+        else:
+            # Start over
+            self._rule = rule
+            self._counts = dict()
+            self._count(state, 1)
+            self._active = set(state)
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        rule = compile_rule(model.rule)
+        next_state = rule.next_state
+
+        self._synchronise(model, rule)
+
+        state = model.state
+        counts = self._counts
+
+        # Only cells next to a change can change
+        candidates = set(self._active)
+        for x, y in self._active:
+            for dx, dy in NEIGHBOURS:
+                candidates.add((x+dx, y+dy))
+
+        births = []
+        deaths = []
+        for position in candidates:
+            alive = position in state
+            if next_state[alive][counts.get(position, 0)] != alive:
+                if alive:
+                    deaths.append(position)
+                else:
+                    births.append(position)
+
+        # Copy the state so the previous generation is left untouched. Only
+        # the dict of tiles is copied, not the cells.
+        if isinstance(state, ActiveState):
+            new_state = state.untracked_copy()
+        else:
+            new_state = ActiveState(state)
+        for cell in deaths:
+            TiledState.discard(new_state, cell)
+        for cell in births:
+            TiledState.add(new_state, cell)
+
+        self._count(births, 1)
+        self._count(deaths, -1)
+        self._active = set(births)
+        self._active.update(deaths)
+        self._state = new_state
+        self.active_size = len(self._active)
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.state = new_state
+        new_model.generation = model.generation + 1
+        new_model.births = len(births)
+        new_model.deaths = len(deaths)
+        # Only the tiles on the edges are looked at
+        new_model.set_bounds(new_state.bounds())
+
+        return new_model
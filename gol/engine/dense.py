@@ -0,0 +1,475 @@
+"""Contains a dense engine to calculate game of life generations
+
+Must contain a GolEngine class with an 'advance' method
+
+The cells are kept in a bit-packed NumPy array with 64 cells in each word.
+Neighbours are counted for all cells at once with shifts and bitwise adders,
+which is fast for dense patterns in a bounded universe.
+
+A model whose state is a GridState stays packed from one generation to the
+next. load_snapshot makes such a model straight from the memory mapped
+coordinates of a binary snapshot, without a set of cells in between.
+"""
+
+import copy
+from collections.abc import Set
+
+import numpy
+
+from gol.files.snapshot import open_snapshot
+from gol.model import GolModel
+from gol.rule import compile_rule
+
+# Number of cells in each word
+WORD_BITS = 64
+
+# Supported shapes of the universe
+TOPOLOGIES = ("auto", "finite", "torus")
+
+_ONE = numpy.uint64(1)
+_LAST_BIT = numpy.uint64(WORD_BITS - 1)
+
+
+class Grid():
+    """A bit-packed rectangle of cells
+
+    Bit i of word w in row r is the cell (origin_x + 64*w + i, origin_y + r).
+
+    Parameters:
+    words: 2D numpy.uint64 array with the packed cells
+    origin_x, origin_y (int): coordinates of the top left cell
+    width (int): number of cells in each row
+    topology (str): "auto", "finite" or "torus"
+    """
+
+    def __init__(self, words, origin_x, origin_y, width, topology):
+        self.words = words
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.width = width
+        self.topology = topology
+
+        # Mask for the cells in the last word of each row
+        used_bits = width - (words.shape[1] - 1) * WORD_BITS
+        self._last_word_mask = numpy.uint64((1 << used_bits) - 1)
+
+    @property
+    def height(self):
+        """Number of rows in the grid
+        """
+
+        return self.words.shape[0]
+
+    @classmethod
+    def from_cells(cls, cells, topology="auto", bounds=None):
+        """Pack a set of alive cells into a grid
+
+        Parameters:
+        cells: Iterable of (x, y) coordinates, or a NumPy array of shape (n, 2)
+        topology (str): "auto", "finite" or "torus"
+        bounds (x_min, y_min, x_max, y_max): The bounds of the universe.
+            Only used for the "finite" and "torus" topologies.
+
+        Return:
+        Grid: the packed cells
+        """
+
+        if isinstance(cells, numpy.ndarray):
+            cells = cells.reshape(-1, 2)
+        else:
+            cells = numpy.array(list(cells), dtype=numpy.int64).reshape(-1, 2)
+        xs, ys = cells[:, 0], cells[:, 1]
+
+        if topology == "auto":
+            if len(cells):
+                x_min, y_min = int(xs.min()) - 1, int(ys.min()) - 1
+                x_max, y_max = int(xs.max()) + 1, int(ys.max()) + 1
+            else:
+                x_min = y_min = x_max = y_max = 0
+            # Round the width up to whole words
+            width = -(-(x_max - x_min + 1) // WORD_BITS) * WORD_BITS
+        else:
+            x_min, y_min, x_max, y_max = bounds
+            width = x_max - x_min + 1
+
+        height = y_max - y_min + 1
+        xs = xs - x_min
+        ys = ys - y_min
+
+        if topology == "torus":
+            xs %= width
+            ys %= height
+        elif topology == "finite":
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            xs, ys = xs[inside], ys[inside]
+
+        word_count = -(-width // WORD_BITS)
+        cell_array = numpy.zeros((height, word_count * WORD_BITS), dtype=numpy.bool_)
+        cell_array[ys, xs] = True
+
+        return cls(cls._pack(cell_array), x_min, y_min, width, topology)
+
+    @classmethod
+    def from_snapshot(cls, filename, topology="auto", bounds=None):
+        """Pack the cells of a binary snapshot into a grid
+
+        The coordinates are read straight from the memory mapped file.
+
+        Parameters:
+        filename (str): the snapshot file
+        topology (str): "auto", "finite" or "torus"
+        bounds (x_min, y_min, x_max, y_max): The bounds of the universe.
+            Only used for the "finite" and "torus" topologies.
+
+        Return:
+        (Grid, SnapshotHeader): the packed cells and the snapshot header
+        """
+
+        header, coordinates, mapped = open_snapshot(filename)
+        try:
+            cells = numpy.frombuffer(coordinates, dtype=numpy.int64)
+            grid = cls.from_cells(cells, topology, bounds)
+            del cells
+        finally:
+            coordinates.release()
+            mapped.close()
+        return grid, header
+
+    @staticmethod
+    def _pack(cell_array):
+        """Pack a 2D boolean array into 64 cells per word
+        """
+
+        packed = numpy.packbits(cell_array, axis=1, bitorder="little")
+        return packed.view("<u8").astype(numpy.uint64)
+
+    def to_array(self):
+        """Unpack the grid to a 2D boolean array of shape (height, width)
+        """
+
+        as_bytes = self.words.astype("<u8").view(numpy.uint8)
+        cell_array = numpy.unpackbits(as_bytes, axis=1, bitorder="little")
+        return cell_array[:, :self.width].astype(numpy.bool_)
+
+    def coordinates(self):
+        """Return the coordinates of the alive cells, sorted by row and then column
+
+        Return:
+        (numpy.ndarray, numpy.ndarray): x and y as 64 bit integers
+        """
+
+        ys, xs = numpy.nonzero(self.to_array())
+        return xs.astype(numpy.int64) + self.origin_x, ys.astype(numpy.int64) + self.origin_y
+
+    def to_cells(self):
+        """Return the set of alive cells
+
+        Return:
+        set: set of (x, y) coordinates of alive cells
+        """
+
+        xs, ys = self.coordinates()
+        return set(zip(xs.tolist(), ys.tolist()))
+
+    def bounds(self):
+        """Return the bounding box of the alive cells
+
+        Return:
+        (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        rows = numpy.flatnonzero(self.words.any(axis=1))
+        if len(rows) == 0:
+            return None
+        columns = numpy.bitwise_or.reduce(self.words, axis=0).astype("<u8").view(numpy.uint8)
+        columns = numpy.flatnonzero(numpy.unpackbits(columns, bitorder="little"))
+        return (int(columns[0]) + self.origin_x, int(rows[0]) + self.origin_y,
+                int(columns[-1]) + self.origin_x, int(rows[-1]) + self.origin_y)
+
+    def population(self):
+        """Return the number of alive cells
+        """
+
+        return int(numpy.unpackbits(self.words.view(numpy.uint8)).sum())
+
+    def copy(self):
+        """Return a copy of the grid that does not share the words
+        """
+
+        return Grid(self.words.copy(), self.origin_x, self.origin_y, self.width, self.topology)
+
+    def births(self, old):
+        """Count the cells that are alive here but not in an older grid
+
+        Parameters:
+        old (Grid): an earlier generation. The grid only grows, so it fits inside this one.
+
+        Return:
+        int: the number of cells born
+        """
+
+        top = old.origin_y - self.origin_y
+        left = (old.origin_x - self.origin_x) // WORD_BITS
+        height, word_count = old.words.shape
+        born = self.words.copy()
+        born[top:top + height, left:left + word_count] &= ~old.words
+        return int(numpy.unpackbits(born.view(numpy.uint8)).sum())
+
+    def _grow(self):
+        """Make room for the pattern to grow one cell in every direction
+
+        Only used for the "auto" topology, where the width is a whole number of words.
+        """
+
+        words = self.words
+        pad_top = int(words[0].any())
+        pad_bottom = int(words[-1].any())
+        pad_left = int((words[:, 0] & _ONE).any())
+        pad_right = int((words[:, -1] >> _LAST_BIT).any())
+
+        if pad_top or pad_bottom or pad_left or pad_right:
+            self.words = numpy.pad(
+                words,
+                ((pad_top * WORD_BITS, pad_bottom * WORD_BITS), (pad_left, pad_right)))
+            self.origin_x -= pad_left * WORD_BITS
+            self.origin_y -= pad_top * WORD_BITS
+            self.width = self.words.shape[1] * WORD_BITS
+            self._last_word_mask = numpy.uint64((1 << WORD_BITS) - 1)
+
+    def _shift_west(self, words):
+        """Return words where each cell holds the value of its western neighbour
+        """
+
+        shifted = words << _ONE
+        shifted[:, 1:] |= words[:, :-1] >> _LAST_BIT
+        if self.topology == "torus":
+            last = self.width - 1
+            shifted[:, 0] |= (words[:, last // WORD_BITS] >> numpy.uint64(last % WORD_BITS)) & _ONE
+        shifted[:, -1] &= self._last_word_mask
+        return shifted
+
+    def _shift_east(self, words):
+        """Return words where each cell holds the value of its eastern neighbour
+        """
+
+        shifted = words >> _ONE
+        shifted[:, :-1] |= words[:, 1:] << _LAST_BIT
+        if self.topology == "torus":
+            last = self.width - 1
+            shifted[:, last // WORD_BITS] |= (words[:, 0] & _ONE) << numpy.uint64(last % WORD_BITS)
+        return shifted
+
+    def _shift_south(self, words):
+        """Return words where each cell holds the value of its northern neighbour
+        """
+
+        if self.topology == "torus":
+            return numpy.roll(words, 1, axis=0)
+        shifted = numpy.zeros_like(words)
+        shifted[1:] = words[:-1]
+        return shifted
+
+    def _shift_north(self, words):
+        """Return words where each cell holds the value of its southern neighbour
+        """
+
+        if self.topology == "torus":
+            return numpy.roll(words, -1, axis=0)
+        shifted = numpy.zeros_like(words)
+        shifted[:-1] = words[1:]
+        return shifted
+
+    def step(self, rule):
+        """Calculate the next generation in place
+
+        Parameters:
+        rule (RuleTable): the compiled rule
+        """
+
+        if self.topology == "auto":
+            self._grow()
+
+        alive = self.words
+        west = self._shift_west(alive)
+        east = self._shift_east(alive)
+        rows = (west, alive, east)
+        neighbours = [west, east]
+        for row in rows:
+            neighbours.append(self._shift_south(row))
+            neighbours.append(self._shift_north(row))
+
+        # Add the eight neighbour planes into a 4 bit count, one bit plane per bit
+        count = [numpy.zeros_like(alive) for _ in range(4)]
+        for plane in neighbours:
+            carry = plane
+            for bit in range(4):
+                count[bit], carry = count[bit] ^ carry, count[bit] & carry
+
+        # Pick the cells where the count matches the rule
+        new_alive = numpy.zeros_like(alive)
+        for number in range(9):
+            in_birth = rule.next_state[0][number]
+            in_survival = rule.next_state[1][number]
+            if not in_survival and not in_birth:
+                continue
+            match = ~numpy.zeros_like(alive)
+            for bit in range(4):
+                match &= count[bit] if number >> bit & 1 else ~count[bit]
+            if in_survival and in_birth:
+                new_alive |= match
+            elif in_survival:
+                new_alive |= match & alive
+            else:
+                new_alive |= match & ~alive
+
+        new_alive[:, -1] &= self._last_word_mask
+        self.words = new_alive
+
+
+class GridState(Set):
+    """A state kept as a packed Grid instead of a set of cells
+
+    It can be iterated and tested for cells like a set, but is never
+    changed. The dense engine advances it without unpacking it.
+
+    Parameters:
+    grid (Grid): the cells
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self._population = grid.population()
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # Results of set operators are plain sets
+        return set(iterable)
+
+    @property
+    def population(self):
+        """Number of alive cells
+        """
+
+        return self._population
+
+    def bounds(self):
+        """Return the bounding box of the alive cells. See Grid.bounds.
+        """
+
+        return self.grid.bounds()
+
+    def coordinates(self):
+        """Return the coordinates of the alive cells. See Grid.coordinates.
+        """
+
+        return self.grid.coordinates()
+
+    def __len__(self):
+        return self._population
+
+    def __iter__(self):
+        xs, ys = self.grid.coordinates()
+        return zip(xs.tolist(), ys.tolist())
+
+    def __contains__(self, cell):
+        grid = self.grid
+        x = cell[0] - grid.origin_x
+        y = cell[1] - grid.origin_y
+        if not (0 <= x < grid.width and 0 <= y < grid.height):
+            return False
+        return bool(int(grid.words[y, x // WORD_BITS]) >> (x % WORD_BITS) & 1)
+
+
+class GolEngine():
+    """Dense, bit-packed engine
+
+    Parameters:
+    topology (str): "auto" grows the universe as needed, "finite" treats
+        everything outside 'bounds' as dead and "torus" wraps around the edges
+    bounds (x_min, y_min, x_max, y_max): The bounds of the universe.
+        Required for the "finite" and "torus" topologies.
+    """
+
+    def __init__(self, topology="auto", bounds=None):
+        if topology not in TOPOLOGIES:
+            raise ValueError("Unknown topology: " + str(topology))
+        if topology != "auto" and bounds is None:
+            raise ValueError("Bounds are required for the " + topology + " topology")
+        self.topology = topology
+        self.bounds = bounds
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        The state is only packed and unpacked once.
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        rule = compile_rule(model.rule)
+
+        state = model.state
+        packed = isinstance(state, GridState) and state.grid.topology == self.topology
+        if packed:
+            # Stay packed. The old grid is left alone for whoever still has it.
+            grid = state.grid.copy()
+        else:
+            grid = Grid.from_cells(state, self.topology, self.bounds)
+        for _ in range(generations):
+            grid.step(rule)
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.generation = model.generation + generations
+        if packed:
+            new_model.state = GridState(grid)
+            new_model.births = grid.births(state.grid)
+        else:
+            new_model.state = grid.to_cells()
+            new_model.births = len(new_model.state - state)
+        new_model.deaths = len(state) + new_model.births - len(new_model.state)
+        new_model.set_bounds(grid.bounds())
+
+        return new_model
+
+    def load_snapshot(self, filename):
+        """Load a binary snapshot into a model that stays packed
+
+        The coordinates are read straight from the memory mapped file and
+        never become a set of cells.
+
+        Parameters:
+        filename (str): the snapshot file
+
+        Return:
+        GolModel: a model whose state is a GridState
+        """
+
+        grid, header = Grid.from_snapshot(filename, self.topology, self.bounds)
+        model = GolModel()
+        model.state = GridState(grid)
+        model.rule = header.rule
+        model.generation = header.generation
+        model.name = header.name
+        model.author = header.author
+        model.description = header.description
+        model.filename = filename
+        model.set_bounds(grid.bounds())
+        return model
@@ -0,0 +1,659 @@
+"""Contains a HashLife engine to calculate game of life generations
+
+Must contain a GolEngine class with an 'advance' method
+
+The state is kept as a quadtree where identical sub-trees are shared
+(hash-consing), and the result of advancing a sub-tree is memoized. This
+makes it possible to jump ahead an exponentially growing number of
+generations on periodic or sparse patterns.
+"""
+
+import copy
+
+from gol.rule import compile_rule
+
+
+class Node():
+    """A square of cells in the quadtree
+
+    A node at level 0 is a single cell. A node at level k is a square of
+    2^k by 2^k cells made of four nodes at level k-1.
+    """
+
+    __slots__ = ("nw", "ne", "sw", "se", "level", "population")
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.level = level
+        self.population = population
+
+
+class Universe():
+    """Keeps track of the canonical nodes and memoized results for one rule
+
+    Parameters:
+    rule (RuleTable): the compiled rule
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+
+        # Canonical nodes, keyed by their four children
+        self.table = dict()
+
+        # Memoized results, keyed by (node, log2 of generations)
+        self.results = dict()
+
+        self.off = Node(None, None, None, None, 0, 0)
+        self.on = Node(None, None, None, None, 0, 1)
+
+        # Empty nodes by level
+        self._empty = [self.off]
+
+    def node(self, nw, ne, sw, se):
+        """Return the canonical node with the given children
+        """
+
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, nw.level + 1,
+                        nw.population + ne.population + sw.population + se.population)
+            self.table[key] = node
+        return node
+
+    def empty(self, level):
+        """Return the empty node at the given level
+        """
+
+        while len(self._empty) <= level:
+            smaller = self._empty[-1]
+            self._empty.append(self.node(smaller, smaller, smaller, smaller))
+        return self._empty[level]
+
+    def expand(self, node):
+        """Return a node one level up with 'node' in the center
+        """
+
+        border = self.empty(node.level - 1)
+        return self.node(
+            self.node(border, border, border, node.nw),
+            self.node(border, border, node.ne, border),
+            self.node(border, node.sw, border, border),
+            self.node(node.se, border, border, border))
+
+    def center(self, node):
+        """Return the center node one level down
+        """
+
+        return self.node(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _horizontal(self, west, east):
+        return self.node(west.ne, east.nw, west.se, east.sw)
+
+    def _vertical(self, north, south):
+        return self.node(north.sw, north.se, south.nw, south.ne)
+
+    def _life_4x4(self, node):
+        """Calculate the next generation of the center 2x2 cells of a 4x4 node
+        """
+
+        # Cells of the 4x4 square in rows
+        cells = (
+            (node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne),
+            (node.nw.sw, node.nw.se, node.ne.sw, node.ne.se),
+            (node.sw.nw, node.sw.ne, node.se.nw, node.se.ne),
+            (node.sw.sw, node.sw.se, node.se.sw, node.se.se))
+
+        # Look up the whole 3x3 neighbourhood, so non-totalistic rules work too
+        table = self.rule.table
+        new_cells = []
+        for y in (1, 2):
+            for x in (1, 2):
+                index = 0
+                for dy in (-1, 0, 1):
+                    for dx in (-1, 0, 1):
+                        index |= cells[y+dy][x+dx].population << (3 * dy + dx + 4)
+                new_cells.append(self.on if table[index] else self.off)
+
+        return self.node(*new_cells)
+
+    def successor(self, node, step):
+        """Advance the center of a node by 2^step generations
+
+        Parameters:
+        node (Node): node at level k >= 2
+        step (int): log2 of the number of generations. Must be <= k-2
+
+        Return:
+        Node: the center node at level k-1 after 2^step generations
+        """
+
+        if node.population == 0:
+            return node.nw
+
+        key = (node, step)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            # Nine overlapping sub-squares one level down
+            n00 = node.nw
+            n01 = self._horizontal(node.nw, node.ne)
+            n02 = node.ne
+            n10 = self._vertical(node.nw, node.sw)
+            n11 = self.center(node)
+            n12 = self._vertical(node.ne, node.se)
+            n20 = node.sw
+            n21 = self._horizontal(node.sw, node.se)
+            n22 = node.se
+
+            if step == node.level - 2:
+                # Full speed: advance twice by half the generations
+                advance = lambda n: self.successor(n, step - 1)
+                second_step = step - 1
+            else:
+                # Slower: only the second half advances
+                advance = self.center
+                second_step = step
+
+            c00, c01, c02 = advance(n00), advance(n01), advance(n02)
+            c10, c11, c12 = advance(n10), advance(n11), advance(n12)
+            c20, c21, c22 = advance(n20), advance(n21), advance(n22)
+
+            result = self.node(
+                self.successor(self.node(c00, c01, c10, c11), second_step),
+                self.successor(self.node(c01, c02, c11, c12), second_step),
+                self.successor(self.node(c10, c11, c20, c21), second_step),
+                self.successor(self.node(c11, c12, c21, c22), second_step))
+
+        self.results[key] = result
+        return result
+
+    def collect(self, roots):
+        """Garbage collect nodes not reachable from 'roots'
+
+        Memoized results are kept when their node is still reachable.
+
+        Parameters:
+        roots: Iterable of nodes to keep
+        """
+
+        marked = set()
+
+        def mark(node):
+            stack = [node]
+            while stack:
+                node = stack.pop()
+                if node.level == 0 or node in marked:
+                    continue
+                marked.add(node)
+                stack.extend((node.nw, node.ne, node.sw, node.se))
+
+        for root in roots:
+            mark(root)
+        for node in self._empty:
+            mark(node)
+
+        results = dict()
+        for (node, step), result in self.results.items():
+            if node in marked:
+                mark(result)
+                results[(node, step)] = result
+
+        self.results = results
+        self.table = {(node.nw, node.ne, node.sw, node.se): node for node in marked}
+
+    def from_cells(self, cells):
+        """Build a quadtree from a set of alive cells
+
+        Parameters:
+        cells: Iterable of (x, y) coordinates
+
+        Return:
+        (Node, int, int): the root node and the coordinates of its top left cell
+        """
+
+        cells = list(cells)
+        if not cells:
+            return self.empty(3), -4, -4
+
+        min_x = min(x for x, _ in cells)
+        min_y = min(y for _, y in cells)
+        extent = max(max(x for x, _ in cells) - min_x, max(y for _, y in cells) - min_y)
+        level = max(3, extent.bit_length())
+
+        # Build the tree bottom up, one level at a time
+        nodes = {(x - min_x, y - min_y): self.on for x, y in cells}
+        for current in range(level):
+            empty = self.empty(current)
+            parents = dict()
+            for x, y in nodes:
+                parents.setdefault((x >> 1, y >> 1), None)
+            nodes = {
+                (x, y): self.node(
+                    nodes.get((2*x, 2*y), empty),
+                    nodes.get((2*x+1, 2*y), empty),
+                    nodes.get((2*x, 2*y+1), empty),
+                    nodes.get((2*x+1, 2*y+1), empty))
+                for x, y in parents}
+
+        return nodes[(0, 0)], min_x, min_y
+
+    def to_cells(self, node, origin_x, origin_y):
+        """Return the set of alive cells in a quadtree
+
+        Parameters:
+        node (Node): the root node
+        origin_x, origin_y (int): coordinates of the top left cell of the root
+
+        Return:
+        set: set of (x, y) coordinates of alive cells
+        """
+
+        return set(self.iter_cells(node, origin_x, origin_y))
+
+    @staticmethod
+    def iter_cells(node, origin_x, origin_y):
+        """Generate the alive cells in a quadtree one at a time
+
+        Parameters:
+        node (Node): the root node
+        origin_x, origin_y (int): coordinates of the top left cell of the root
+
+        Yield:
+        (int, int): the coordinates of an alive cell
+        """
+
+        stack = [(node, origin_x, origin_y)]
+        while stack:
+            node, x, y = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                yield x, y
+                continue
+            half = 1 << (node.level - 1)
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + half, y))
+            stack.append((node.sw, x, y + half))
+            stack.append((node.se, x + half, y + half))
+
+    def build(self, cells, level, x=0, y=0):
+        """Build a node from the alive cells inside a square
+
+        For small squares like the leaves of a macrocell file. Use
+        from_cells for whole patterns.
+
+        Parameters:
+        cells: set of (x, y) coordinates
+        level (int): the level of the node
+        x, y (int): coordinates of the top left cell of the square
+
+        Return:
+        Node: the node
+        """
+
+        if level == 0:
+            return self.on if (x, y) in cells else self.off
+        half = 1 << (level - 1)
+        return self.node(
+            self.build(cells, level - 1, x, y), self.build(cells, level - 1, x + half, y),
+            self.build(cells, level - 1, x, y + half),
+            self.build(cells, level - 1, x + half, y + half))
+
+    def adopt(self, node, memo=None):
+        """Return the node of this universe with the same cells as a node
+
+        Nodes built by another universe (e.g. for another rule) have to be
+        adopted before they can be advanced here.
+
+        Parameters:
+        node (Node): the node to adopt
+        memo (dict): nodes adopted so far, so shared sub-trees are only adopted once
+
+        Return:
+        Node: the canonical node in this universe
+        """
+
+        if node.level == 0:
+            return self.on if node.population else self.off
+        if self.table.get((node.nw, node.ne, node.sw, node.se)) is node:
+            return node
+        if memo is None:
+            memo = dict()
+        adopted = memo.get(node)
+        if adopted is None:
+            adopted = self.node(self.adopt(node.nw, memo), self.adopt(node.ne, memo),
+                                self.adopt(node.sw, memo), self.adopt(node.se, memo))
+            memo[node] = adopted
+        return adopted
+
+    def rows(self, node, origin_x, origin_y):
+        """Generate the rows of a quadtree from top to bottom as runs of alive cells
+
+        Only rows with alive cells are generated. The work depends on the
+        number of runs, not on the size of the square.
+
+        Parameters:
+        node (Node): the root node
+        origin_x, origin_y (int): coordinates of the top left cell of the root
+
+        Yield:
+        (int, list): the y coordinate of the row and a sorted list of
+            (start, end) runs of alive cells, with 'end' not included
+        """
+
+        if node.population == 0:
+            return
+
+        if node.level <= 3:
+            # Small enough to sort the cells
+            row_cells = dict()
+            for x, y in self.iter_cells(node, origin_x, origin_y):
+                row_cells.setdefault(y, []).append(x)
+            for y in sorted(row_cells):
+                runs = []
+                for x in sorted(row_cells[y]):
+                    if runs and runs[-1][1] == x:
+                        runs[-1][1] = x + 1
+                    else:
+                        runs.append([x, x + 1])
+                yield y, [tuple(run) for run in runs]
+            return
+
+        half = 1 << (node.level - 1)
+        for west, east, y in ((node.nw, node.ne, origin_y), (node.sw, node.se, origin_y + half)):
+            west_rows = self.rows(west, origin_x, y)
+            east_rows = self.rows(east, origin_x + half, y)
+            west_row = next(west_rows, None)
+            east_row = next(east_rows, None)
+            while west_row or east_row:
+                if east_row is None or (west_row and west_row[0] < east_row[0]):
+                    yield west_row
+                    west_row = next(west_rows, None)
+                elif west_row is None or east_row[0] < west_row[0]:
+                    yield east_row
+                    east_row = next(east_rows, None)
+                else:
+                    # The same row in both halves. Join the runs that meet in the middle.
+                    runs = list(west_row[1])
+                    east_runs = east_row[1]
+                    if runs[-1][1] == east_runs[0][0]:
+                        runs[-1] = (runs[-1][0], east_runs[0][1])
+                        east_runs = east_runs[1:]
+                    runs.extend(east_runs)
+                    yield west_row[0], runs
+                    west_row = next(west_rows, None)
+                    east_row = next(east_rows, None)
+
+    def _edge(self, node, axis, last, memo):
+        """Offset of the first or last alive column (axis 0) or row (axis 1) in a node
+
+        Only the halves of the node closest to the edge are searched, so
+        this is quick even for huge patterns.
+
+        Return:
+        int: the offset from the top left corner, or None if the node is empty
+        """
+
+        if node.population == 0:
+            return None
+        if node.level == 0:
+            return 0
+        found = memo.get(node)
+        if found is not None:
+            return found
+
+        half = 1 << (node.level - 1)
+        if axis == 0:
+            halves = ((node.nw, node.sw), (node.ne, node.se))
+        else:
+            halves = ((node.nw, node.ne), (node.sw, node.se))
+        order = ((1, half), (0, 0)) if last else ((0, 0), (1, half))
+
+        for side, offset in order:
+            edges = [edge for edge in (self._edge(child, axis, last, memo)
+                                       for child in halves[side]) if edge is not None]
+            if edges:
+                found = offset + (max(edges) if last else min(edges))
+                break
+
+        memo[node] = found
+        return found
+
+    def bounds(self, node, origin_x, origin_y):
+        """Return the bounding box of the alive cells in a quadtree
+
+        Parameters:
+        node (Node): the root node
+        origin_x, origin_y (int): coordinates of the top left cell of the root
+
+        Return:
+        (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        if node.population == 0:
+            return None
+        return (origin_x + self._edge(node, 0, False, {}),
+                origin_y + self._edge(node, 1, False, {}),
+                origin_x + self._edge(node, 0, True, {}),
+                origin_y + self._edge(node, 1, True, {}))
+
+
+class TreeState():
+    """A state kept as a quadtree instead of a set of cells
+
+    Holds patterns with far more cells than would fit in memory as a set.
+    It can be iterated and tested for cells like a set, but 'population'
+    and 'bounds' should be used instead of len() for huge patterns.
+
+    Parameters:
+    universe (Universe): the universe the root belongs to
+    root (Node): the root node
+    origin_x, origin_y (int): coordinates of the top left cell of the root
+    """
+
+    __slots__ = ("universe", "root", "origin_x", "origin_y")
+
+    def __init__(self, universe, root, origin_x, origin_y):
+        self.universe = universe
+        self.root = root
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+
+    @classmethod
+    def from_cells(cls, cells, rule):
+        """Build a tree state from a set of cells
+
+        Parameters:
+        cells: Iterable of (x, y) coordinates
+        rule: the rule, e.g. a Rule or 'B3/S23'
+
+        Return:
+        TreeState: the cells as a quadtree
+        """
+
+        universe = Universe(compile_rule(rule, totalistic=False))
+        return cls(universe, *universe.from_cells(cells))
+
+    @property
+    def population(self):
+        """Number of alive cells. Can be larger than fits in a machine word.
+        """
+
+        return self.root.population
+
+    def bounds(self):
+        """Return the bounding box of the alive cells
+
+        Return:
+        (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        return self.universe.bounds(self.root, self.origin_x, self.origin_y)
+
+    def rows(self):
+        """Generate the rows with alive cells as runs. See Universe.rows.
+        """
+
+        return self.universe.rows(self.root, self.origin_x, self.origin_y)
+
+    def __len__(self):
+        return self.root.population
+
+    def __iter__(self):
+        return self.universe.iter_cells(self.root, self.origin_x, self.origin_y)
+
+    def __contains__(self, cell):
+        x = cell[0] - self.origin_x
+        y = cell[1] - self.origin_y
+        node = self.root
+        size = 1 << node.level
+        if not (0 <= x < size and 0 <= y < size):
+            return False
+        while node.level > 0 and node.population:
+            half = 1 << (node.level - 1)
+            if y < half:
+                node = node.nw if x < half else node.ne
+            else:
+                node = node.sw if x < half else node.se
+            x %= half
+            y %= half
+        return node.population == 1
+
+
+class GolEngine():
+    """HashLife engine
+
+    Models with a TreeState are advanced without ever making a set of
+    cells, and get a TreeState back.
+
+    Parameters:
+    max_nodes (int): number of canonical nodes kept before garbage collecting
+    tree (bool): always return a TreeState, also for models with a set of cells
+    """
+
+    def __init__(self, max_nodes=1000000, tree=False):
+        self.max_nodes = max_nodes
+        self.tree = tree
+        self.universe = None
+
+    def _get_universe(self, rule, preferred=None):
+        """Return a universe for 'rule', reusing the memoized results if possible
+
+        Parameters:
+        rule: the rule of the model
+        preferred (Universe): a universe to use if it has the same rule,
+            e.g. the one a TreeState was built in
+        """
+
+        table = compile_rule(rule, totalistic=False)
+
+        if preferred is not None and preferred.rule is table:
+            self.universe = preferred
+
+        universe = self.universe
+        if universe is None or universe.rule is not table:
+            universe = Universe(table)
+            self.universe = universe
+        return universe
+
+    def _step(self, universe, root, origin_x, origin_y, step):
+        """Advance the root by 2^step generations
+
+        Return:
+        (Node, int, int): the new root and the coordinates of its top left cell
+        """
+
+        # Make sure the pattern has room to grow for 2^step generations
+        while root.level < step + 2 or universe.center(root).population != root.population:
+            half = 1 << (root.level - 1)
+            root = universe.expand(root)
+            origin_x -= half
+            origin_y -= half
+
+        # Expand once more so the result covers the whole current root
+        root = universe.successor(universe.expand(root), step)
+
+        return root, origin_x, origin_y
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_pow2(self, model, k):
+        """Calculate the generation 2^k generations ahead
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        k (int): log2 of the number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1 << k)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        state = model.state
+        tree = isinstance(state, TreeState)
+        if tree:
+            universe = self._get_universe(model.rule, state.universe)
+            root = universe.adopt(state.root)
+            origin_x, origin_y = state.origin_x, state.origin_y
+        else:
+            universe = self._get_universe(model.rule)
+            root, origin_x, origin_y = universe.from_cells(state)
+
+        # Advance by each power of two in 'generations'
+        step = 0
+        remaining = generations
+        while remaining:
+            if remaining & 1:
+                root, origin_x, origin_y = self._step(
+                    universe, root, origin_x, origin_y, step)
+            remaining >>= 1
+            step += 1
+
+        if len(universe.table) > self.max_nodes:
+            universe.collect([root])
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.generation = model.generation + generations
+        if tree or self.tree:
+            # Comparing every cell would defeat the purpose of the tree
+            new_model.state = TreeState(universe, root, origin_x, origin_y)
+            new_model.births = new_model.deaths = None
+        else:
+            new_model.state = universe.to_cells(root, origin_x, origin_y)
+            new_model.births = len(new_model.state - state)
+            new_model.deaths = len(state) + new_model.births - len(new_model.state)
+        new_model.set_bounds(universe.bounds(root, origin_x, origin_y))
+
+        return new_model
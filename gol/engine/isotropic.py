@@ -5,6 +5,9 @@ Must contain a GolEngine class with an 'advance' method
 
 from collections import defaultdict
 import copy
+import math
+
+from gol.rule import compile_rule
 
 class GolEngine():
     """Contains everything needed for the engine to work
@@ -20,6 +23,9 @@ class GolEngine():
         model (GolModel): the model containing the state of the newly calculated system
         """
 
+        # Look up the next state in a table instead of checking the rule for every cell
+        next_state = compile_rule(model.rule).next_state
+
         # Prepare to count neighbours
         neighbour_count = defaultdict(int)
 
@@ -38,14 +44,42 @@ class GolEngine():
         new_state = set()
 
         # Iterate through the "heat-map" and apply rules
+        state = model.state
+        births = 0
+        # The bounding box of the new state, found on the way
+        min_x = min_y = math.inf
+        max_x = max_y = -math.inf
         for position, count in neighbour_count.items():
-            if count in model.rule.birth:
-                new_state.add(position)
-            elif count in model.rule.survival and position in model.state:
+            alive = position in state
+            if next_state[alive][count]:
                 new_state.add(position)
+                if not alive:
+                    births += 1
+                x, y = position
+                if x < min_x:
+                    min_x = x
+                if x > max_x:
+                    max_x = x
+                if y < min_y:
+                    min_y = y
+                if y > max_y:
+                    max_y = y
+
+        # Alive cells without neighbours are not in the heat-map
+        if next_state[1][0]:
+            for position in state:
+                if position not in neighbour_count:
+                    new_state.add(position)
+                    x, y = position
+                    min_x, max_x = min(min_x, x), max(max_x, x)
+                    min_y, max_y = min(min_y, y), max(max_y, y)
 
         # Make a shallow copy and replace the state
         new_model = copy.copy(model)
         new_model.state = new_state
+        new_model.generation = model.generation + 1
+        new_model.births = births
+        new_model.deaths = len(state) + births - len(new_state)
+        new_model.set_bounds((min_x, min_y, max_x, max_y) if new_state else None)
 
         return new_model
@@ -0,0 +1,60 @@
+"""Contains a lookup table engine to calculate game of life generations
+
+Must contain a GolEngine class with an 'advance' method
+
+The next state of every cell is looked up in the 512-entry table of the
+compiled rule, indexed by its whole 3x3 neighbourhood. This runs isotropic
+non-totalistic rules like B2-a3/S12 as well as ordinary B/S rules.
+"""
+
+import copy
+import numpy
+
+from gol.engine.multistate import GROW_CELLS, StateGrid
+from gol.rule import compile_rule
+
+
+class GolEngine():
+    """Engine for any two-state rule with a 3x3 neighbourhood
+    """
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        The cells are only put into the grid and taken out once.
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        table = numpy.frombuffer(compile_rule(model.rule, totalistic=False).table, dtype=numpy.uint8)
+
+        grid = StateGrid.from_cells(model.state, {}, 1 + GROW_CELLS)
+        for _ in range(generations):
+            grid.step_table(table)
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.state, _ = grid.to_cells()
+        new_model.generation = model.generation + generations
+        new_model.births = len(new_model.state - model.state)
+        new_model.deaths = len(model.state) + new_model.births - len(new_model.state)
+        new_model.set_bounds(grid.bounds())
+
+        return new_model
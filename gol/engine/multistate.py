@@ -0,0 +1,266 @@
+"""Contains an engine for Generations and Larger than Life rules
+
+Must contain a GolEngine class with an 'advance' method
+
+Every cell is a byte holding its state: 0 is dead, 1 is alive and 2 and up
+are the dying states. The alive neighbours are counted with a box filter
+made from running sums along each axis, so the work for each cell is the
+same whatever the radius of the rule.
+"""
+
+import copy
+import numpy
+
+from gol.rule import GenerationsRule, IsotropicRule, LtlRule, rule_string
+
+# Number of dead cells added to a side of the grid when the pattern gets
+# too close to it
+GROW_CELLS = 32
+
+
+def rule_tables(rule):
+    """Turn a rule into lookup tables indexed by the neighbour count
+
+    Parameters:
+    rule: a Rule, GenerationsRule or LtlRule
+
+    Return:
+    (int, bool, numpy.ndarray, numpy.ndarray, int): the radius, whether the
+        cell itself is counted, the birth and survival tables and the
+        number of states
+    """
+
+    if isinstance(rule, IsotropicRule):
+        raise ValueError("Rule needs the lookup or hashlife engine: " + rule_string(rule))
+    if isinstance(rule, LtlRule):
+        size = (2 * rule.radius + 1) ** 2
+        counts = numpy.arange(size + 1)
+        birth = (counts >= rule.birth[0]) & (counts <= rule.birth[1])
+        survival = (counts >= rule.survival[0]) & (counts <= rule.survival[1])
+        return rule.radius, rule.middle, birth, survival, rule.states
+
+    birth = numpy.zeros(10, dtype=numpy.bool_)
+    survival = numpy.zeros(10, dtype=numpy.bool_)
+    birth[list(rule.birth)] = True
+    survival[list(rule.survival)] = True
+    states = rule.states if isinstance(rule, GenerationsRule) else 2
+    return 1, False, birth, survival, states
+
+
+def box_counts(alive, radius):
+    """Count the alive cells in the square of radius 'radius' around every cell
+
+    Everything outside the array is dead.
+
+    Parameters:
+    alive: 2D numpy.bool_ array
+    radius (int): the radius of the square
+
+    Return:
+    numpy.ndarray: 2D numpy.int32 array with the counts, the cell itself included
+    """
+
+    size = 2 * radius + 1
+    height, width = alive.shape
+
+    # Running sums along the rows, with a leading zero column
+    sums = numpy.zeros((height, width + size), dtype=numpy.int32)
+    numpy.cumsum(alive, axis=1, out=sums[:, radius + 1:radius + 1 + width])
+    sums[:, radius + 1 + width:] = sums[:, radius + width:radius + 1 + width]
+    across = sums[:, size:] - sums[:, :-size]
+
+    # Running sums of those along the columns
+    sums = numpy.zeros((height + size, width), dtype=numpy.int32)
+    numpy.cumsum(across, axis=0, out=sums[radius + 1:radius + 1 + height])
+    sums[radius + 1 + height:] = sums[radius + height:radius + 1 + height]
+    return sums[size:] - sums[:-size]
+
+
+class StateGrid():
+    """A rectangle of cells with one byte for each cell
+
+    cells[r, c] is the state of the cell (origin_x + c, origin_y + r).
+    Everything outside the rectangle is dead.
+
+    Parameters:
+    cells: 2D numpy.uint8 array with the states
+    origin_x, origin_y (int): coordinates of the top left cell
+    """
+
+    def __init__(self, cells, origin_x, origin_y):
+        self.cells = cells
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+
+    @classmethod
+    def from_cells(cls, alive, dying, margin):
+        """Put alive and dying cells into a grid
+
+        Parameters:
+        alive: Iterable of (x, y) coordinates of alive cells
+        dying (dict): {(x, y): state} for the dying cells
+        margin (int): number of dead cells around the pattern
+
+        Return:
+        StateGrid: the cells
+        """
+
+        alive = numpy.array(list(alive), dtype=numpy.int64).reshape(-1, 2)
+        dying_cells = numpy.array(list(dying), dtype=numpy.int64).reshape(-1, 2)
+        everything = numpy.concatenate((alive, dying_cells))
+
+        if len(everything):
+            x_min, y_min = everything.min(axis=0) - margin
+            x_max, y_max = everything.max(axis=0) + margin
+        else:
+            x_min = y_min = -margin
+            x_max = y_max = margin
+
+        cells = numpy.zeros((int(y_max - y_min) + 1, int(x_max - x_min) + 1), dtype=numpy.uint8)
+        cells[dying_cells[:, 1] - y_min, dying_cells[:, 0] - x_min] = \
+            numpy.fromiter(dying.values(), dtype=numpy.uint8, count=len(dying))
+        cells[alive[:, 1] - y_min, alive[:, 0] - x_min] = 1
+
+        return cls(cells, int(x_min), int(y_min))
+
+    def to_cells(self):
+        """Return the alive and the dying cells
+
+        Return:
+        (set, dict): set of (x, y) coordinates of alive cells and
+            {(x, y): state} for the dying cells
+        """
+
+        ys, xs = numpy.nonzero(self.cells == 1)
+        alive = set(zip((xs + self.origin_x).tolist(), (ys + self.origin_y).tolist()))
+
+        ys, xs = numpy.nonzero(self.cells > 1)
+        dying = dict(zip(zip((xs + self.origin_x).tolist(), (ys + self.origin_y).tolist()),
+                         self.cells[ys, xs].tolist()))
+        return alive, dying
+
+    def bounds(self):
+        """Return the bounding box of the alive cells
+
+        Return:
+        (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        alive = self.cells == 1
+        rows = numpy.flatnonzero(alive.any(axis=1))
+        if len(rows) == 0:
+            return None
+        columns = numpy.flatnonzero(alive.any(axis=0))
+        return (int(columns[0]) + self.origin_x, int(rows[0]) + self.origin_y,
+                int(columns[-1]) + self.origin_x, int(rows[-1]) + self.origin_y)
+
+    def _grow(self, radius):
+        """Make sure no alive cell is within 'radius' cells of the edge
+
+        Cells can only be born within 'radius' cells of an alive cell.
+        """
+
+        alive = self.cells == 1
+        pad = max(radius, GROW_CELLS)
+        pad_top = pad if alive[:radius].any() else 0
+        pad_bottom = pad if alive[-radius:].any() else 0
+        pad_left = pad if alive[:, :radius].any() else 0
+        pad_right = pad if alive[:, -radius:].any() else 0
+
+        if pad_top or pad_bottom or pad_left or pad_right:
+            self.cells = numpy.pad(self.cells, ((pad_top, pad_bottom), (pad_left, pad_right)))
+            self.origin_x -= pad_left
+            self.origin_y -= pad_top
+
+    def step(self, tables):
+        """Calculate the next generation in place
+
+        Parameters:
+        tables: the lookup tables from rule_tables
+        """
+
+        radius, middle, birth, survival, states = tables
+
+        self._grow(radius)
+        cells = self.cells
+
+        alive = cells == 1
+        counts = box_counts(alive, radius)
+        if not middle:
+            counts -= alive
+
+        # Alive cells that do not survive and dying cells move on one state
+        new_cells = numpy.where(cells == 0, cells, cells + 1)
+        new_cells[cells == states - 1] = 0
+        new_cells[survival[counts] & alive] = 1
+        new_cells[birth[counts] & (cells == 0)] = 1
+        self.cells = new_cells
+
+    def step_table(self, table):
+        """Calculate the next generation of a two-state rule in place
+
+        The 3x3 neighbourhood of every cell is turned into an index into
+        'table' all at once.
+
+        Parameters:
+        table: numpy.uint8 array like RuleTable.table
+        """
+
+        self._grow(1)
+        height, width = self.cells.shape
+        alive = numpy.pad(self.cells == 1, 1).astype(numpy.uint16)
+
+        index = numpy.zeros((height, width), dtype=numpy.uint16)
+        for bit in range(9):
+            row, column = divmod(bit, 3)
+            index |= alive[row:row + height, column:column + width] << bit
+        self.cells = table[index]
+
+
+class GolEngine():
+    """Engine for Generations and Larger than Life rules
+
+    Two-state rules like B3/S23 work too, but the other engines are faster
+    for those.
+    """
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        The cells are only put into the grid and taken out once.
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        tables = rule_tables(model.rule)
+
+        grid = StateGrid.from_cells(model.state, model.dying, tables[0] + GROW_CELLS)
+        for _ in range(generations):
+            grid.step(tables)
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.state, new_model.dying = grid.to_cells()
+        new_model.generation = model.generation + generations
+        new_model.births = len(new_model.state - model.state)
+        new_model.deaths = len(model.state) + new_model.births - len(new_model.state)
+        new_model.set_bounds(grid.bounds())
+
+        return new_model
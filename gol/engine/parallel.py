@@ -0,0 +1,253 @@
+"""Contains a multi-core engine to calculate game of life generations
+
+Must contain a GolEngine class with an 'advance' method
+
+The universe is split into square tiles. Each tile is sent to a process
+pool together with a halo of the cells around it, and the tiles are
+combined again after each exchange. Tiles with nothing in them or in their
+halo are skipped.
+"""
+
+import concurrent.futures
+import copy
+import os
+import time
+from collections import defaultdict
+
+from gol.engine import isotropic
+from gol.model import GolModel, cell_bounds
+
+# Width and height of a tile in cells
+TILE_SIZE = 256
+
+
+def advance_tile(tile, cells, rule, tile_size, generations):
+    """Calculate the cells of one tile 'generations' generations ahead
+
+    Runs in a worker process.
+
+    Parameters:
+    tile (int, int): tile coordinates
+    cells: list of alive cells in the tile and in the halo around it.
+        The halo must be 'generations' cells wide.
+    rule (Rule): the rule to use
+    tile_size (int): width and height of a tile in cells
+    generations (int): number of generations to advance
+
+    Return:
+    (list, tuple): the alive cells inside the tile and their bounding box,
+        or None if there are none
+    """
+
+    model = GolModel()
+    model.state = set(cells)
+    model.rule = rule
+
+    engine = isotropic.GolEngine()
+    for _ in range(generations):
+        model = engine.advance(model)
+
+    x_min, y_min = tile[0] * tile_size, tile[1] * tile_size
+    x_max, y_max = x_min + tile_size, y_min + tile_size
+    cells = [(x, y) for x, y in model.state if x_min <= x < x_max and y_min <= y < y_max]
+    return cells, cell_bounds(cells)
+
+
+def split_tiles(state, tile_size, halo):
+    """Split the alive cells into tiles with halos
+
+    Parameters:
+    state: set of alive cells
+    tile_size (int): width and height of a tile in cells
+    halo (int): width of the halo around each tile. Must be <= tile_size
+
+    Return:
+    dict: cells in each tile and its halo, keyed by tile coordinates.
+        Tiles with no cells in them or their halo are left out.
+    """
+
+    tiles = defaultdict(list)
+    for x, y in state:
+        tiles[(x // tile_size, y // tile_size)].append((x, y))
+
+    work = defaultdict(list)
+    for (tile_x, tile_y), cells in tiles.items():
+        work[(tile_x, tile_y)].extend(cells)
+
+        x_min, y_min = tile_x * tile_size, tile_y * tile_size
+        x_max, y_max = x_min + tile_size - 1, y_min + tile_size - 1
+
+        # Only cells close to the edge end up in a neighbouring halo
+        border = [(x, y) for x, y in cells
+                  if x < x_min + halo or x > x_max - halo
+                  or y < y_min + halo or y > y_max - halo]
+        if not border:
+            continue
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                # The neighbouring tile including its halo
+                nx_min = x_min + dx * tile_size - halo
+                ny_min = y_min + dy * tile_size - halo
+                nx_max = nx_min + tile_size + 2 * halo - 1
+                ny_max = ny_min + tile_size + 2 * halo - 1
+                in_halo = [(x, y) for x, y in border
+                           if nx_min <= x <= nx_max and ny_min <= y <= ny_max]
+                if in_halo:
+                    work[(tile_x + dx, tile_y + dy)].extend(in_halo)
+
+    return work
+
+
+class GolEngine():
+    """Multi-core tiled engine
+
+    Gives the same results as gol.engine.isotropic.GolEngine.
+
+    Parameters:
+    workers (int): number of worker processes. Defaults to the number of cores.
+    tile_size (int): width and height of a tile in cells
+    generations_per_exchange (int): number of generations each tile is advanced
+        between halo exchanges. The halo is this many cells wide, so a larger
+        number means fewer exchanges but more work repeated in the halos.
+    """
+
+    def __init__(self, workers=None, tile_size=TILE_SIZE, generations_per_exchange=1):
+        if generations_per_exchange > tile_size:
+            raise ValueError("generations_per_exchange can not be larger than tile_size")
+        self.workers = workers or os.cpu_count()
+        self.tile_size = tile_size
+        self.generations_per_exchange = generations_per_exchange
+        self.pool = None
+
+    def close(self):
+        """Shut down the worker processes
+        """
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _exchange(self, state, rule, generations):
+        """Advance all tiles 'generations' generations and combine the results
+
+        Return:
+        (set, tuple): the alive cells and their bounding box, or None if there are none
+        """
+
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+        work = split_tiles(state, self.tile_size, generations)
+        futures = [
+            self.pool.submit(advance_tile, tile, cells, rule, self.tile_size, generations)
+            for tile, cells in work.items()]
+
+        new_state = set()
+        bounds = None
+        for future in futures:
+            cells, tile_bounds = future.result()
+            new_state.update(cells)
+            if tile_bounds is None:
+                continue
+            if bounds is None:
+                bounds = tile_bounds
+            else:
+                bounds = (min(bounds[0], tile_bounds[0]), min(bounds[1], tile_bounds[1]),
+                          max(bounds[2], tile_bounds[2]), max(bounds[3], tile_bounds[3]))
+        return new_state, bounds
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        rule = model.rule
+
+        state = model.state
+        bounds = model.bounds if generations == 0 else None
+        remaining = generations
+        while remaining > 0:
+            step = min(remaining, self.generations_per_exchange)
+            state, bounds = self._exchange(state, rule, step)
+            remaining -= step
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.state = state
+        new_model.generation = model.generation + generations
+        new_model.births = len(state - model.state)
+        new_model.deaths = len(model.state) + new_model.births - len(state)
+        new_model.set_bounds(bounds)
+
+        return new_model
+
+
+def scaling_report(model, generations, worker_counts=None, **kwargs):
+    """Measure how the speed of the engine scales with the number of workers
+
+    Parameters:
+    model (GolModel): the model to advance
+    generations (int): number of generations to advance for each measurement
+    worker_counts: the numbers of workers to try. Defaults to powers of two
+        up to the number of cores.
+    kwargs: passed on to GolEngine
+
+    Return:
+    list: one dict for each worker count with the keys "workers", "seconds"
+        and "speedup". The speedup is relative to gol.engine.isotropic.GolEngine
+        on a single core, which is reported with 0 workers.
+    """
+
+    if worker_counts is None:
+        worker_counts = []
+        count = 1
+        while count < os.cpu_count():
+            worker_counts.append(count)
+            count *= 2
+        worker_counts.append(os.cpu_count())
+
+    single = isotropic.GolEngine()
+    start = time.perf_counter()
+    single_model = model
+    for _ in range(generations):
+        single_model = single.advance(single_model)
+    baseline = time.perf_counter() - start
+
+    report = [{"workers": 0, "seconds": baseline, "speedup": 1.0}]
+    for workers in worker_counts:
+        with GolEngine(workers, **kwargs) as engine:
+            # Start the worker processes before timing
+            engine.advance(model)
+            start = time.perf_counter()
+            engine.advance_by(model, generations)
+            seconds = time.perf_counter() - start
+        report.append({"workers": workers, "seconds": seconds, "speedup": baseline / seconds})
+
+    return report
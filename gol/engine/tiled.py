@@ -0,0 +1,217 @@
+"""Contains an engine that works on the tiles of a TiledState
+
+Must contain a GolEngine class with an 'advance' method
+
+Each 64x64 tile is a 4096 bit Python int. The neighbours of all cells in a
+tile are counted at once with shifts and bitwise adders, like the dense
+engine does with words, but only tiles with alive cells and the tiles next
+to them are looked at. The state stays a TiledState between generations.
+"""
+
+import copy
+
+from gol.rule import compile_rule
+from gol.tiles import TILE_CELLS, TILE_SIZE, ROW_MASK, TiledState, fold_rows
+
+# All cells of a tile
+FULL = (1 << TILE_CELLS) - 1
+
+# The first and the last column of a tile
+FIRST_COLUMN = sum(1 << (TILE_SIZE * row) for row in range(TILE_SIZE))
+LAST_COLUMN = FIRST_COLUMN << (TILE_SIZE - 1)
+
+# The last row of a tile starts at this bit
+LAST_ROW = TILE_CELLS - TILE_SIZE
+
+
+def shift_west(bits, west):
+    """Return bits where each cell holds the value of its western neighbour
+
+    Parameters:
+    bits (int): the tile
+    west (int): the tile to the west of it
+    """
+
+    return ((bits << 1) & ~FIRST_COLUMN & FULL) | ((west >> (TILE_SIZE - 1)) & FIRST_COLUMN)
+
+
+def shift_east(bits, east):
+    """Return bits where each cell holds the value of its eastern neighbour
+    """
+
+    return ((bits >> 1) & ~LAST_COLUMN) | ((east << (TILE_SIZE - 1)) & LAST_COLUMN)
+
+
+def shift_south(bits, north):
+    """Return bits where each cell holds the value of its northern neighbour
+    """
+
+    return ((bits << TILE_SIZE) & FULL) | (north >> LAST_ROW)
+
+
+def shift_north(bits, south):
+    """Return bits where each cell holds the value of its southern neighbour
+    """
+
+    return (bits >> TILE_SIZE) | ((south & ROW_MASK) << LAST_ROW)
+
+
+def candidate_tiles(tiles):
+    """Find the tiles where cells can be alive in the next generation
+
+    A tile next to a tile with alive cells is only a candidate if the
+    alive cells are on the edge between them.
+
+    Parameters:
+    tiles (dict): (tile_x, tile_y) -> bits
+
+    Return:
+    set: (tile_x, tile_y) of the candidates
+    """
+
+    candidates = set(tiles)
+    for (tile_x, tile_y), bits in tiles.items():
+        columns = fold_rows(bits)
+        west = columns & 1
+        east = columns >> (TILE_SIZE - 1)
+        north = bits & ROW_MASK
+        south = bits >> LAST_ROW
+
+        if west:
+            candidates.add((tile_x - 1, tile_y))
+        if east:
+            candidates.add((tile_x + 1, tile_y))
+        if north:
+            candidates.add((tile_x, tile_y - 1))
+            if north & 1:
+                candidates.add((tile_x - 1, tile_y - 1))
+            if north >> (TILE_SIZE - 1):
+                candidates.add((tile_x + 1, tile_y - 1))
+        if south:
+            candidates.add((tile_x, tile_y + 1))
+            if south & 1:
+                candidates.add((tile_x - 1, tile_y + 1))
+            if south >> (TILE_SIZE - 1):
+                candidates.add((tile_x + 1, tile_y + 1))
+    return candidates
+
+
+def step(tiles, rule):
+    """Calculate the next generation
+
+    Parameters:
+    tiles (dict): (tile_x, tile_y) -> bits. Left untouched.
+    rule (RuleTable): the compiled rule
+
+    Return:
+    dict: (tile_x, tile_y) -> bits of the next generation. Empty tiles are left out.
+    """
+
+    candidates = candidate_tiles(tiles)
+
+    # Each cell holding its western and its eastern neighbour. A candidate
+    # tile whose northern or southern tile is not a candidate has no alive
+    # cells around that tile, so missing planes are empty.
+    west_planes = dict()
+    east_planes = dict()
+    for tile_x, tile_y in candidates:
+        bits = tiles.get((tile_x, tile_y), 0)
+        west_planes[(tile_x, tile_y)] = shift_west(bits, tiles.get((tile_x - 1, tile_y), 0))
+        east_planes[(tile_x, tile_y)] = shift_east(bits, tiles.get((tile_x + 1, tile_y), 0))
+
+    # The counts that give an alive cell
+    births = [number for number in range(9) if rule.next_state[0][number]]
+    survivals = [number for number in range(9) if rule.next_state[1][number]]
+
+    new_tiles = dict()
+    for tile_x, tile_y in candidates:
+        north_key = (tile_x, tile_y - 1)
+        south_key = (tile_x, tile_y + 1)
+        alive = tiles.get((tile_x, tile_y), 0)
+        west = west_planes[(tile_x, tile_y)]
+        east = east_planes[(tile_x, tile_y)]
+
+        neighbours = (
+            west, east,
+            shift_south(west, west_planes.get(north_key, 0)),
+            shift_south(alive, tiles.get(north_key, 0)),
+            shift_south(east, east_planes.get(north_key, 0)),
+            shift_north(west, west_planes.get(south_key, 0)),
+            shift_north(alive, tiles.get(south_key, 0)),
+            shift_north(east, east_planes.get(south_key, 0)))
+
+        # Add the eight neighbour planes into a 4 bit count, one bit plane per bit
+        count = [0, 0, 0, 0]
+        for plane in neighbours:
+            carry = plane
+            for bit in range(4):
+                if not carry:
+                    break
+                count[bit], carry = count[bit] ^ carry, count[bit] & carry
+
+        # Pick the cells where the count matches the rule
+        new_alive = 0
+        for numbers, cells in ((births, FULL ^ alive), (survivals, alive)):
+            for number in numbers:
+                match = cells
+                for bit in range(4):
+                    match &= count[bit] if number >> bit & 1 else FULL ^ count[bit]
+                new_alive |= match
+
+        if new_alive:
+            new_tiles[(tile_x, tile_y)] = new_alive
+
+    return new_tiles
+
+
+class GolEngine():
+    """Engine that keeps the state as 64x64 bitmap tiles
+
+    Works for any two-state totalistic rule. Fast for large patterns that
+    are spread out over many tiles, or that have empty space inside them.
+    """
+
+    def advance(self, model):
+        """Calculate the next generation
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        return self.advance_by(model, 1)
+
+    def advance_by(self, model, generations):
+        """Calculate the generation 'generations' generations ahead
+
+        Parameters:
+        model (GolModel): the model containing the state and rule of the system
+        generations (int): number of generations to advance
+
+        Return:
+        model (GolModel): the model containing the state of the newly calculated system
+        """
+
+        rule = compile_rule(model.rule)
+
+        state = model.state
+        if not isinstance(state, TiledState):
+            state = TiledState(state)
+
+        tiles = state.tiles
+        for _ in range(generations):
+            tiles = step(tiles, rule)
+        new_state = TiledState.from_tiles(tiles)
+
+        # Make a shallow copy and replace the state
+        new_model = copy.copy(model)
+        new_model.state = new_state
+        new_model.generation = model.generation + generations
+        new_model.births = sum((bits & ~state.tiles.get(key, 0)).bit_count()
+                               for key, bits in new_state.tiles.items())
+        new_model.deaths = state.population + new_model.births - new_state.population
+        new_model.set_bounds(new_state.bounds())
+
+        return new_model
@@ -2,46 +2,91 @@
 Must contain a load_file function
 """
 
+import re
+from itertools import repeat
+
 from gol.model import GolModel
-from gol.rule import Rule
+from gol.rule import Rule, is_multistate, parse_rule
 from gol.coroutine import coroutine
+from gol.files.macrocell import is_macrocell, load_macrocell
+from gol.files.snapshot import is_snapshot, load_snapshot
+
+
+# A run of cells: an optional count followed by a tag. Multi-state files
+# use '.' for dead cells and 'A' to 'X', 'pA' to 'yO' for states 1 to 255.
+RLE_TOKEN = re.compile(r"(\d*)([bo$!.A-X]|[p-y][A-X])")
+
+# Everything that is not part of a run is ignored
+RLE_IGNORED = re.compile(r"[^0-9bo$!.A-Xp-y]+")
+
+# The end of a chunk that may belong to a run in the next chunk
+RLE_PENDING = re.compile(r"\d*[p-y]?$")
+
+
+def rle_state(tag):
+    """Return the state of a multi-state rle tag
+
+    >>> rle_state("A"), rle_state("C"), rle_state("pA")
+    (1, 3, 25)
+    """
+
+    if len(tag) == 1:
+        return ord(tag) - ord("A") + 1
+    return (ord(tag[0]) - ord("p") + 1) * 24 + ord(tag[1]) - ord("A") + 1
 
 
 @coroutine
-def rle_decoder(state):
+def rle_decoder(state, dying=None):
     """Coroutine to decode rle (run length encoding)
 
+    Whole chunks of the encoded string are decoded at once, and runs of
+    alive cells are added to the state in one go.
+
     Parameters:
     state: set() where alive cells are added
+    dying: dict() where cells in states 2 and up are added as
+        {(x, y): state}. If None they are read as dead.
 
     Yield:
-    s: One charater of the encoded rle string
+    chunk: Any part of the encoded rle string, e.g. a line
     """
 
-    x = y = count = 0
-
-    while True:
-        s = yield
-
-        if s in "0123456789":
-            count = count * 10 + int(s)
-        elif s == 'b':
-            count = 1 if count == 0 else count
-            x += count
-            count = 0
-        elif s == '$':
-            x = 0
-            y += 1
-            count = 0
-        elif s == '!':
-            # This is the end marker
-            break
-        elif s == 'o':
-            count = 1 if count == 0 else count
-            for _ in range(count):
-                state.add((x, y))
-                x += 1
-            count = 0
+    x = y = 0
+    pending = ""
+    add = state.add
+    update = state.update
+
+    done = False
+    while not done:
+        chunk = pending + RLE_IGNORED.sub("", (yield))
+
+        # Digits and a state prefix at the end belong to a run in the next chunk
+        pending = RLE_PENDING.search(chunk).group()
+        body = chunk[:len(chunk) - len(pending)]
+
+        for digits, tag in RLE_TOKEN.findall(body):
+            count = int(digits or 1) or 1
+
+            if tag == 'o' or tag == 'A':
+                if count == 1:
+                    add((x, y))
+                else:
+                    update(zip(range(x, x + count), repeat(y)))
+                x += count
+            elif tag == 'b' or tag == '.':
+                x += count
+            elif tag == '$':
+                x = 0
+                y += count
+            elif tag == '!':
+                # This is the end marker
+                done = True
+                break
+            else:
+                if dying is not None:
+                    dying.update(zip(zip(range(x, x + count), repeat(y)),
+                                     repeat(rle_state(tag))))
+                x += count
 
     # End marker was reached.
     # Do nothing for eternity
@@ -67,10 +112,7 @@ def life_105(model):
         if line.startswith("#C") or line.startswith("#D"):  # Comment
             model.description.append(line[2:].strip())
         elif line.startswith("#R"):  # Rule
-            split_line = line.split()[1].split("/")
-            survival = (a for a in split_line[0])
-            birth = (a for a in split_line[1])
-            model.rule = Rule(survival, birth)
+            model.rule = parse_rule(line.split()[1])
         elif line.startswith("#P"):  # Position
             split_line = line.split()
             block_x = coord_x = int(split_line[1])
@@ -114,49 +156,32 @@ def life_rle(model):
     line (str): The line from the file to decode
     """
 
-    # Initialise rle decoder
-    decoder = rle_decoder(model.state)
-
     # The first line to decode should be the header
     line = ""
     while not line.startswith("x ="):
         line = yield
 
     # Line if of the format:  x = m, y = n, rule = abc/def
-    split_line = line.split(",")
+    # Larger than Life rules contain commas themselves
+    split_line = line.split(",", 2)
     #width = int(split_line[0].split("=")[1])
     #height = int(split_line[1].split("=")[1])
 
     # Read rules if they are specified in the file
     if len(split_line) > 2:
-        rules = split_line[2].split("=")[1].split("/")
-
-        # Rule is of the form B3/S23
-        if rules[0].strip()[0] == "B":
-            birth_count = set(int(a) for a in rules[0].strip()[1:])
-            survival_count = set(int(a) for a in rules[1].strip()[1:])
-
-        # Rule is of the form S23/B3
-        elif rules[0].strip()[0] == "S":
-            survival_count = set(int(a) for a in rules[0].strip()[1:])
-            birth_count = set(int(a) for a in rules[1].strip()[1:])
-
-        # Rule is of the form 23/3
-        else:
-            survival_count = set(int(a) for a in rules[0].strip())
-            birth_count = set(int(a) for a in rules[1].strip())
-
-        model.rule = Rule(survival_count, birth_count)
+        model.rule = parse_rule(split_line[2].split("=", 1)[1])
 
     # If no rule is specified, use standard Conway rule
     else:
         model.rule = Rule((2, 3), (3,))
 
+    # Initialise rle decoder. Dying states are only kept for multi-state rules.
+    decoder = rle_decoder(model.state, model.dying if is_multistate(model.rule) else None)
+
     # The rest of the file should only contain rle
     while True:
         line = yield
-        for c in line:
-            decoder.send(c)
+        decoder.send(line)
 
 
 @coroutine
@@ -264,7 +289,7 @@ def read_line(model):
 
 def load_file(filename):
     """Load file containing a state for the Conway Game of Life
-        Can read Life1.05 and RLE files
+        Can read Life1.05, RLE, macrocell and binary snapshot files
 
     Parameters:
     filename (str): the file to load
@@ -273,6 +298,13 @@ def load_file(filename):
     model: a GolModel containing the properties of the game of life as described in the file
     """
 
+    # Binary snapshots are memory mapped instead of read line by line
+    if is_snapshot(filename):
+        return load_snapshot(filename)
+    # Macrocell files are loaded as a quadtree (TreeState), or as cells for multi-state rules
+    if is_macrocell(filename):
+        return load_macrocell(filename)
+
     model = GolModel()
 
     # Initialise read_line coroutine
@@ -0,0 +1,295 @@
+"""Macrocell files
+
+The macrocell format (.mc) stores a pattern as a quadtree where identical
+squares are only written once, so huge and regular patterns stay small.
+Patterns are loaded into a TreeState and never turned into a set of cells.
+
+Format:
+    [M2] (...)
+    #R rule
+    #G generation
+    #C comment
+    One line for each node, numbered from 1. 0 is an empty node.
+    8x8 leaves are written as rows of '.' (dead) and '*' (alive) ending
+    in '$'. Larger nodes are 'level nw ne sw se'. The last node is the
+    root, with its center at (0, 0).
+
+Generations and Larger than Life rules have no 8x8 leaves. Their smallest
+nodes are '1 nw ne sw se' with the state of each of the four cells: 0 for
+dead, 1 for alive and 2 and up for dying.
+"""
+
+from gol.engine.hashlife import TreeState, Universe
+from gol.model import GolModel
+from gol.rule import compile_rule, is_multistate, parse_rule, rule_string
+
+# The first characters of a macrocell file
+MACROCELL_MAGIC = "[M2]"
+
+# File name extension that save_file writes as a macrocell file
+MACROCELL_EXTENSION = ".mc"
+
+# Level of the nodes written as 8x8 bitmaps
+LEAF_LEVEL = 3
+
+# The line seperator. Usually \n or \r\n.
+LINESEP = "\n"
+
+
+def is_macrocell(filename):
+    """Check if a file is a macrocell file
+
+    Parameters:
+    filename (str): The name of the file
+
+    Return:
+    bool: True if the file starts with MACROCELL_MAGIC
+    """
+
+    with open(filename, "rb") as mc_file:
+        return mc_file.read(len(MACROCELL_MAGIC)).decode("ascii", "replace") == MACROCELL_MAGIC
+
+
+def load_macrocell(filename):
+    """Load a macrocell file
+
+    Parameters:
+    filename (str): The name of the file
+
+    Generations and Larger than Life patterns can not be kept in a
+    TreeState, so they are loaded into a set of cells and the dying cells.
+
+    Return:
+    model: a GolModel with a TreeState, or a set for multi-state rules
+    """
+
+    model = GolModel()
+    model.filename = filename
+    universe = None
+    multistate = None
+    # Node number -> node. 0 is an empty node of any level.
+    nodes = [None]
+
+    with open(filename, "r") as mc_file:
+        for line in mc_file:
+            line = line.strip()
+            if not line or line.startswith("[M2]"):
+                continue
+            if line.startswith("#R"):
+                model.rule = parse_rule(line[2:].strip())
+            elif line.startswith("#G"):
+                model.generation = int(line[2:])
+            elif line.startswith("#C") or line.startswith("#D"):
+                model.description.append(line[2:].strip())
+            elif line.startswith("#N"):
+                model.name = line[2:].strip()
+            elif line.startswith("#O"):
+                model.author = line[2:].strip()
+            elif line.startswith("#"):
+                continue
+            else:
+                if multistate is None:
+                    multistate = is_multistate(model.rule)
+                if multistate:
+                    # Expanded into cells when the root is known
+                    nodes.append(tuple(int(number) for number in line.split()))
+                    continue
+                if universe is None:
+                    universe = Universe(compile_rule(model.rule, totalistic=False))
+                if line[0] in ".*$":
+                    nodes.append(_read_leaf(universe, line))
+                else:
+                    level, *children = (int(number) for number in line.split())
+                    empty = universe.empty(level - 1)
+                    nodes.append(universe.node(
+                        *(nodes[child] if child else empty for child in children)))
+
+    if multistate or is_multistate(model.rule):
+        model.state = set()
+        if len(nodes) > 1:
+            _read_states(model, nodes)
+        return model
+
+    if universe is None:
+        universe = Universe(compile_rule(model.rule, totalistic=False))
+    root = nodes[-1] if len(nodes) > 1 else universe.empty(LEAF_LEVEL)
+    half = 1 << (root.level - 1)
+    model.state = TreeState(universe, root, -half, -half)
+
+    return model
+
+
+def _read_leaf(universe, line):
+    """Build an 8x8 node from a line of '.', '*' and '$'
+    """
+
+    cells = set()
+    x = y = 0
+    for character in line:
+        if character == "*":
+            cells.add((x, y))
+            x += 1
+        elif character == ".":
+            x += 1
+        elif character == "$":
+            x = 0
+            y += 1
+    return universe.build(cells, LEAF_LEVEL)
+
+
+def _read_states(model, nodes):
+    """Put the cells of the nodes of a multi-state file into a model
+
+    Parameters:
+    model (GolModel): the model to fill. The state must be an empty set.
+    nodes (list): (level, nw, ne, sw, se) for each node. The last one is the root.
+    """
+
+    level = nodes[-1][0]
+    half = 1 << (level - 1)
+    stack = [(len(nodes) - 1, -half, -half)]
+    while stack:
+        number, x, y = stack.pop()
+        level, *children = nodes[number]
+        if level == 1:
+            positions = ((x, y), (x+1, y), (x, y+1), (x+1, y+1))
+            for position, cell_state in zip(positions, children):
+                if cell_state == 1:
+                    model.state.add(position)
+                elif cell_state:
+                    model.dying[position] = cell_state
+            continue
+
+        half = 1 << (level - 1)
+        for child, (dx, dy) in zip(children, ((0, 0), (half, 0), (0, half), (half, half))):
+            if child:
+                stack.append((child, x + dx, y + dy))
+
+
+def save_macrocell(model, filename):
+    """Save game of life as a macrocell file
+
+    The nodes are written straight from the quadtree, each one only once.
+    Generations and Larger than Life rules are written with the state of
+    every cell, so the dying cells are saved too.
+
+    Parameters:
+    model (GolModel): The model to save
+    filename (str): The name of the file
+    """
+
+    if is_multistate(model.rule):
+        cells = [(x, y, 1) for x, y in model.state]
+        cells.extend((x, y, cell_state) for (x, y), cell_state in model.dying.items())
+        with open(filename, "w") as mc_file:
+            _write_headers(mc_file, model)
+            if cells:
+                # The smallest square around (0, 0) that holds every cell
+                extent = max(max(-x, x + 1, -y, y + 1) for x, y, _ in cells)
+                level = max(1, (extent - 1).bit_length() + 1)
+                half = 1 << (level - 1)
+                _write_state_node(mc_file, dict(), level, -half, -half, cells)
+        return
+
+    state = model.state
+    if not isinstance(state, TreeState):
+        state = TreeState.from_cells(state, model.rule)
+
+    root = state.root
+    while root.level < LEAF_LEVEL:
+        root = state.universe.expand(root)
+
+    with open(filename, "w") as mc_file:
+        _write_headers(mc_file, model)
+        if root.population:
+            _write_nodes(mc_file, root)
+
+
+def _write_headers(mc_file, model):
+    """Write the first line and the rule, generation, name and comments
+    """
+
+    mc_file.write("[M2] (gol)" + LINESEP)
+    mc_file.write("#R " + rule_string(model.rule) + LINESEP)
+    if model.generation:
+        mc_file.write("#G " + str(model.generation) + LINESEP)
+    if model.name:
+        mc_file.write("#N " + model.name.strip() + LINESEP)
+    for comment in model.description:
+        mc_file.write("#C " + comment + LINESEP)
+
+
+def _write_nodes(mc_file, root):
+    """Write every distinct non-empty node below and including 'root', children first
+    """
+
+    numbers = dict()
+    # (node, children written?)
+    stack = [(root, False)]
+    while stack:
+        node, children_written = stack.pop()
+        if node in numbers or node.population == 0:
+            continue
+
+        if node.level == LEAF_LEVEL:
+            mc_file.write(_leaf_line(node) + LINESEP)
+        elif not children_written:
+            stack.append((node, True))
+            stack.extend((child, False) for child in (node.se, node.sw, node.ne, node.nw))
+            continue
+        else:
+            mc_file.write(" ".join(str(number) for number in (
+                node.level, *(numbers.get(child, 0) for child in
+                              (node.nw, node.ne, node.sw, node.se)))) + LINESEP)
+        numbers[node] = len(numbers) + 1
+
+
+def _write_state_node(mc_file, numbers, level, x, y, cells):
+    """Write the node of a multi-state pattern for a square, children first
+
+    Parameters:
+    mc_file: file to write to
+    numbers (dict): node -> number of the nodes written so far
+    level (int): the square is 2**level cells wide
+    x, y (int): top left corner of the square
+    cells (list): (x, y, state) of the cells in the square
+
+    Return:
+    int: the number of the node. 0 if there are no cells.
+    """
+
+    if not cells:
+        return 0
+
+    if level == 1:
+        states = [0, 0, 0, 0]
+        for cell_x, cell_y, cell_state in cells:
+            states[(cell_y - y) * 2 + cell_x - x] = cell_state
+        node = (1, *states)
+    else:
+        half = 1 << (level - 1)
+        quarters = ([], [], [], [])
+        for cell in cells:
+            quarters[(cell[1] - y >= half) * 2 + (cell[0] - x >= half)].append(cell)
+        node = (level, *(
+            _write_state_node(mc_file, numbers, level - 1, x + dx, y + dy, quarter)
+            for quarter, (dx, dy) in zip(quarters, ((0, 0), (half, 0), (0, half), (half, half)))))
+
+    number = numbers.get(node)
+    if number is None:
+        number = numbers[node] = len(numbers) + 1
+        mc_file.write(" ".join(str(item) for item in node) + LINESEP)
+    return number
+
+
+def _leaf_line(node):
+    """Write an 8x8 node as rows of '.' and '*'
+    """
+
+    rows = [["."] * 8 for _ in range(8)]
+    for x, y in Universe.iter_cells(node, 0, 0):
+        rows[y][x] = "*"
+    lines = ["".join(row).rstrip(".") + "$" for row in rows]
+    while lines and lines[-1] == "$":
+        lines.pop()
+    return "".join(lines)
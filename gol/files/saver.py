@@ -1,98 +1,206 @@
 """Saves game of life to filesystem
 """
 
-# I would have liked to import coroutine like this, but path
-# issues with import and packages prevented it from working
-# when running this file as __main__ to run tests
+from collections import defaultdict
+from itertools import chain
 
-#from gol.coroutine import coroutine
-
-# So I had to write it again here:
-
-from functools import wraps
-
-def coroutine(func):
-    """Decorator: primes 'func' by advancing to first 'yield'"""
-    @wraps(func)
-    def primer(*args, **kwargs):
-        gen = func(*args, **kwargs)
-        next(gen)
-        return gen
-    return primer
+from gol.files.macrocell import MACROCELL_EXTENSION, save_macrocell
+from gol.files.snapshot import SNAPSHOT_EXTENSION, save_snapshot
+from gol.model import cell_bounds
+from gol.rule import Rule, is_multistate, rule_string
 
 
 # The line seperator. Usually \n or \r\n.
 LINESEP = "\n"
 
-@coroutine
-def file_writer(lif_file):
-    """Writes to file making sure no line is longer than 70 characters
-
-    Parameter:
-    lif_file: File to write to
-    """
-
-    line_length = 0
+# Lines in the rle encoding are kept shorter than this
+MAX_LINE_LENGTH = 70
 
-    while True:
-        tag = yield
-
-        if line_length + len(tag) >= 70:
-            lif_file.write(LINESEP)
-            line_length = 0
-        lif_file.write(tag)
-        line_length += len(tag)
+# Number of tokens collected before they are written to the file
+WRITE_CHUNK = 65536
 
 
 def save_file(model, filename):
     """Save game of life as an rle file
 
+    Files ending in SNAPSHOT_EXTENSION are saved as binary snapshots, and
+    files ending in MACROCELL_EXTENSION as macrocell files instead.
+
     Parameters:
     mode (GolModel): The model to save
     filename (str): The name of the file
     """
 
+    if filename.endswith(SNAPSHOT_EXTENSION):
+        save_snapshot(model, filename)
+        return
+    if filename.endswith(MACROCELL_EXTENSION):
+        save_macrocell(model, filename)
+        return
+
     with open(filename, "w") as lif_file:
         square = save_headers(lif_file, model)
-        save_rle(lif_file, model.state, square)
+        # Generations and Larger than Life rules also save the dying cells
+        dying = model.dying if is_multistate(model.rule) else None
+        save_rle(lif_file, model.state, square, dying)
+
+
+def cell_rows(state):
+    """Generate the rows of a set of cells as runs of alive cells
+
+    The cells are grouped by row and each row is sorted, so the work
+    depends on the number of alive cells and not on the size of the
+    bounding box.
+
+    Parameters:
+    state: Set with coordinates for alive cells
+
+    Yield:
+    (int, list): the y coordinate of the row and a sorted list of
+        (start, end) runs of alive cells, with 'end' not included
+    """
+
+    rows = defaultdict(list)
+    for x, y in state:
+        rows[y].append(x)
+
+    for y in sorted(rows):
+        columns = rows.pop(y)
+        columns.sort()
+        runs = []
+        start = end = columns[0]
+        for x in columns:
+            if x != end:
+                runs.append((start, end))
+                start = x
+            end = x + 1
+        runs.append((start, end))
+        yield y, runs
+
+
+def rle_tokens(state, min_x):
+    """Generate the rle encoding of alive cells one run at a time
+
+    A TreeState gives its rows straight from the quadtree, so huge
+    patterns are encoded without ever making a set of cells.
+
+    Parameters:
+    state: Set with coordinates for alive cells, or a TreeState
+    min_x (int): The left edge of the bounding box
+
+    Yield:
+    str: a run like '3o', 'b' or '2$'. The end marker is not included.
+    """
+
+    rows = state.rows() if hasattr(state, "rows") else cell_rows(state)
+
+    previous_row = None
+    for y, runs in rows:
+        if previous_row is not None:
+            yield "$" if y - previous_row == 1 else str(y - previous_row) + "$"
+        previous_row = y
+
+        # Dead cells before each run, then the run of alive cells
+        column = min_x
+        for start, end in runs:
+            if start > column:
+                yield "b" if start - column == 1 else str(start - column) + "b"
+            yield "o" if end - start == 1 else str(end - start) + "o"
+            column = end
+
+
+def state_tag(state):
+    """Return the multi-state rle tag of a state
+
+    >>> state_tag(1), state_tag(3), state_tag(25), state_tag(255)
+    ('A', 'C', 'pA', 'yO')
+    """
+
+    if state <= 24:
+        return chr(ord("A") + state - 1)
+    return chr(ord("p") + (state - 25) // 24) + chr(ord("A") + (state - 25) % 24)
+
+
+def multistate_rle_tokens(state, dying, min_x):
+    """Generate the multi-state rle encoding of alive and dying cells one run at a time
+
+    Dead cells are written as '.', alive cells as 'A' and dying cells as
+    'B' and up.
 
+    Parameters:
+    state: Set with coordinates for alive cells
+    dying (dict): {(x, y): state} for the dying cells
+    min_x (int): The left edge of the bounding box
+
+    Yield:
+    str: a run like '3A', '.' or '2$'. The end marker is not included.
+    """
 
-def save_rle(lif_file, state, square):
+    rows = defaultdict(list)
+    for x, y in state:
+        rows[y].append((x, 1))
+    for (x, y), cell_state in dying.items():
+        rows[y].append((x, cell_state))
+
+    previous_row = None
+    for y in sorted(rows):
+        if previous_row is not None:
+            yield "$" if y - previous_row == 1 else str(y - previous_row) + "$"
+        previous_row = y
+
+        cells = rows.pop(y)
+        cells.sort()
+        column = min_x
+        index = 0
+        while index < len(cells):
+            start, cell_state = cells[index]
+            end = start + 1
+            index += 1
+            while index < len(cells) and cells[index] == (end, cell_state):
+                end += 1
+                index += 1
+
+            if start > column:
+                yield "." if start - column == 1 else str(start - column) + "."
+            tag = state_tag(cell_state)
+            yield tag if end - start == 1 else str(end - start) + tag
+            column = end
+
+
+def save_rle(lif_file, state, square, dying=None):
     """Write game of life cells to rle file
 
+    The output is collected and written in large chunks.
+
     Parameters:
     lif_file: File to write to
-    state: Set with coordinates for alive cells
+    state: Set with coordinates for alive cells, or a TreeState
     square (x_min, y_min, x_max, y_max): The bound of the cells to write to the file
+    dying (dict): {(x, y): state} for the dying cells of multi-state
+        rules. If None the cells are written as 'b' and 'o'.
     """
 
-    # Prepare the file writer coroutine
-    writer = file_writer(lif_file)
-
-    for y in range(square[1], square[3]+1):
-        run_count = 0
-        life = (square[0], y) in state
-        for x in range(square[0], square[2]+1):
-            if life == ((x, y) in state):
-                run_count += 1
-            else:
-                encoding = str(run_count)
-                if life:
-                    encoding += "o"
-                else:
-                    encoding += "b"
-                writer.send(encoding)
-                run_count = 1
-                life = not life
-            if x == square[2]:  # Last cell in row
-                # Only write if cells are alive
-                if life:
-                    writer.send(str(run_count) + "o")
-                # Write end of line marker - or end of file marker
-                if y < square[3]:
-                    writer.send("$")
-                else:
-                    writer.send("!"+LINESEP)
+    buffer = []
+    line_length = 0
+
+    if dying is None:
+        tokens = rle_tokens(state, square[0])
+    else:
+        tokens = multistate_rle_tokens(state, dying, square[0])
+
+    for tag in chain(tokens, ("!",)):
+        if line_length + len(tag) >= MAX_LINE_LENGTH:
+            buffer.append(LINESEP)
+            line_length = 0
+        buffer.append(tag)
+        line_length += len(tag)
+
+        if len(buffer) >= WRITE_CHUNK:
+            lif_file.write("".join(buffer))
+            buffer.clear()
+
+    buffer.append(LINESEP)
+    lif_file.write("".join(buffer))
 
 
 def number_iterable_to_string(iterable):
@@ -139,20 +247,16 @@ def save_headers(lif_file, model):
             comment = "#C " + comment
             lif_file.write(comment + LINESEP)
 
-    # Get any cell in the set as a starting point
-    sample_x = sample_y = 0
-    for sample_x, sample_y in model.state:
-        break
-
-    min_x = max_x = sample_x
-    min_y = max_y = sample_y
-    
-    # Find minimum and maximum
-    for x, y in model.state:
-        max_x = max(x, max_x)
-        max_y = max(y, max_y)
-        min_x = min(x, min_x)
-        min_y = min(y, min_y)
+    # The engines keep track of the bounding box
+    bounds = model.bounds
+    if is_multistate(model.rule) and model.dying:
+        dying_bounds = cell_bounds(model.dying)
+        if bounds:
+            bounds = (min(bounds[0], dying_bounds[0]), min(bounds[1], dying_bounds[1]),
+                      max(bounds[2], dying_bounds[2]), max(bounds[3], dying_bounds[3]))
+        else:
+            bounds = dying_bounds
+    min_x, min_y, max_x, max_y = bounds or (0, 0, 0, 0)
 
     # Find width and prepare header
     width = 1 + max_x - min_x
@@ -160,13 +264,17 @@ def save_headers(lif_file, model):
     header = "x = " + str(width) + ", y = " + str(height)
 
     # Rules (saved with size). 
-    survival_count = number_iterable_to_string(model.rule.survival)
-    birth_count = number_iterable_to_string(model.rule.birth)
-
-    # Rules are not needed if they are Conway rules
-    if survival_count != "23" or birth_count != "3":
-        rule = survival_count + "/" + birth_count
-        header += ", r = " + rule
+    if isinstance(model.rule, Rule):
+        survival_count = number_iterable_to_string(model.rule.survival)
+        birth_count = number_iterable_to_string(model.rule.birth)
+
+        # Rules are not needed if they are Conway rules
+        if survival_count != "23" or birth_count != "3":
+            rule = survival_count + "/" + birth_count
+            header += ", r = " + rule
+    else:
+        # Generations and Larger than Life rules
+        header += ", rule = " + rule_string(model.rule)
 
     # Write header to the file
     lif_file.write(header + LINESEP)
@@ -0,0 +1,230 @@
+"""Binary snapshots of a game of life
+
+A snapshot is a small header followed by the coordinates of the alive cells
+as little-endian 64 bit integers (x, y, x, y, ...), sorted by row and then
+column. The coordinates can be used straight from a memory mapped file
+without copying, e.g. as a NumPy array for the dense engine.
+
+Layout:
+    header (SNAPSHOT_HEADER)
+    rule, name, author and description as UTF-8 (lengths in the header)
+    zero padding to a multiple of 8 bytes
+    coordinates: 2 * population 64 bit integers
+    dying cells of multi-state rules, if there are any: a 64 bit count,
+        then x, y and state of each cell as 64 bit integers
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from itertools import chain
+
+import numpy
+
+from gol.model import GolModel
+from gol.rule import parse_rule, rule_string
+
+# The first bytes of a snapshot file
+SNAPSHOT_MAGIC = b"GOLSNAP1"
+
+# File name extension that save_file writes as a snapshot
+SNAPSHOT_EXTENSION = ".golsnap"
+
+# magic, generation, min_x, min_y, max_x, max_y, population,
+# and the lengths of the rule, name, author and description
+SNAPSHOT_HEADER = struct.Struct("<8sqqqqqqIIII")
+
+SnapshotHeader = namedtuple(
+    "SnapshotHeader",
+    "generation bounds population rule name author description offset")
+
+
+def save_snapshot(model, filename):
+    """Save game of life as a binary snapshot
+
+    Parameters:
+    model (GolModel): The model to save
+    filename (str): The name of the file
+    """
+
+    with open(filename, "wb") as snapshot_file:
+        write_snapshot(model, snapshot_file)
+
+
+def write_snapshot(model, snapshot_file):
+    """Write game of life as a binary snapshot to an open file
+
+    Parameters:
+    model (GolModel): The model to save
+    snapshot_file: binary file to write to
+    """
+
+    state = model.state
+    if hasattr(state, "coordinates"):
+        # Packed states, like the GridState of the dense engine, are already sorted
+        xs, ys = state.coordinates()
+    else:
+        cells = numpy.fromiter(chain.from_iterable(state), dtype=numpy.int64).reshape(-1, 2)
+        order = numpy.lexsort((cells[:, 0], cells[:, 1]))
+        xs = cells[order, 0]
+        ys = cells[order, 1]
+        del cells, order
+    population = len(xs)
+    if population:
+        bounds = (int(xs.min()), int(ys[0]), int(xs.max()), int(ys[-1]))
+    else:
+        bounds = (0, 0, -1, -1)
+
+    coordinates = numpy.empty((population, 2), dtype="<i8")
+    coordinates[:, 0] = xs
+    coordinates[:, 1] = ys
+    del xs, ys
+
+    strings = [s.encode("utf-8") for s in (
+        rule_string(model.rule), model.name, model.author, "\n".join(model.description))]
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, model.generation, *bounds, population, *(len(s) for s in strings))
+    length = len(header) + sum(len(s) for s in strings)
+
+    snapshot_file.write(header)
+    for string in strings:
+        snapshot_file.write(string)
+    snapshot_file.write(bytes(-length % 8))
+    # Written from the array's own memory, so this works for any binary file
+    snapshot_file.write(coordinates.data)
+
+    if model.dying:
+        dying = array("q", [len(model.dying)])
+        dying.extend(chain.from_iterable(
+            (x, y, state) for (x, y), state in sorted(model.dying.items())))
+        if sys.byteorder != "little":
+            dying.byteswap()
+        dying.tofile(snapshot_file)
+
+
+def is_snapshot(filename):
+    """Check if a file is a snapshot
+
+    Parameters:
+    filename (str): The name of the file
+
+    Return:
+    bool: True if the file starts with SNAPSHOT_MAGIC
+    """
+
+    with open(filename, "rb") as snapshot_file:
+        return snapshot_file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def read_header(buffer):
+    """Read the header of a snapshot
+
+    Parameters:
+    buffer: the snapshot file contents, e.g. an mmap
+
+    Return:
+    SnapshotHeader: the header. 'offset' is where the coordinates start.
+    """
+
+    magic, generation, min_x, min_y, max_x, max_y, population, *lengths = \
+        SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a snapshot")
+
+    strings = []
+    offset = SNAPSHOT_HEADER.size
+    for length in lengths:
+        strings.append(bytes(buffer[offset:offset + length]).decode("utf-8"))
+        offset += length
+    offset += -offset % 8
+
+    rule, name, author, description = strings
+    return SnapshotHeader(generation, (min_x, min_y, max_x, max_y), population,
+                          parse_rule(rule), name, author,
+                          description.split("\n") if description else [], offset)
+
+
+def read_dying(buffer, header):
+    """Read the dying cells that follow the coordinates of a snapshot
+
+    Parameters:
+    buffer: the snapshot file contents, e.g. an mmap
+    header (SnapshotHeader): the header of the snapshot
+
+    Return:
+    dict: {(x, y): state} for the dying cells. Empty if there are none.
+    """
+
+    start = header.offset + header.population * 16
+    if len(buffer) < start + 8:
+        return dict()
+
+    dying = array("q", bytes(buffer[start:start + 8]))
+    if sys.byteorder != "little":
+        dying.byteswap()
+    count = dying[0]
+
+    dying = array("q", bytes(buffer[start + 8:start + 8 + count * 24]))
+    if sys.byteorder != "little":
+        dying.byteswap()
+    return dict(zip(zip(dying[0::3], dying[1::3]), dying[2::3]))
+
+
+def open_snapshot(filename):
+    """Memory map a snapshot
+
+    The coordinates are not copied. Close the returned mmap when done with them.
+
+    Parameters:
+    filename (str): The name of the file
+
+    Return:
+    (SnapshotHeader, memoryview, mmap): the header, the coordinates as a
+        flat view of 64 bit integers (x, y, x, y, ...) and the mmap behind them
+    """
+
+    with open(filename, "rb") as snapshot_file:
+        mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    header = read_header(mapped)
+    end = header.offset + header.population * 16
+    coordinates = memoryview(mapped)[header.offset:end].cast("q")
+    if sys.byteorder != "little":
+        # Native byte order is needed, so this is the one case that copies
+        swapped = array("q", coordinates)
+        swapped.byteswap()
+        coordinates = memoryview(swapped)
+    return header, coordinates, mapped
+
+
+def load_snapshot(filename):
+    """Load a snapshot into a GolModel
+
+    Parameters:
+    filename (str): The name of the file
+
+    Return:
+    model: a GolModel with the state, rule and generation from the snapshot
+    """
+
+    header, coordinates, mapped = open_snapshot(filename)
+    try:
+        model = GolModel()
+        model.state = set(zip(coordinates[0::2], coordinates[1::2]))
+        model.dying = read_dying(mapped, header)
+        model.rule = header.rule
+        model.generation = header.generation
+        model.name = header.name
+        model.author = header.author
+        model.description = header.description
+        model.filename = filename
+        if header.population:
+            model.set_bounds(header.bounds)
+    finally:
+        coordinates.release()
+        mapped.close()
+
+    return model
@@ -0,0 +1,37 @@
+"""Generations handed from the controller to the views
+
+A frame is a generation, its set of alive cells and their bounding box. Once a state has been
+put in a frame it is never changed again: the engines always return a new
+set for the next generation, and cells are toggled on a copy. The views can
+therefore read a frame while the controller works on the next generation,
+without copying it and without locks.
+"""
+
+from collections import namedtuple
+
+# A generation shown by the views
+#   generation (int): the generation number
+#   state: set of alive cells. Must not be changed.
+#   bounds (min_x, min_y, max_x, max_y): bounding box of the cells, or None if there are none
+Frame = namedtuple("Frame", "generation state bounds")
+
+
+def toggled(state, cell):
+    """Turn a cell on or off in a copy of a state
+
+    The state itself is left alone, since it may be in a frame.
+
+    Parameters:
+    state: set of alive cells
+    cell (int, int): the cell to turn on or off
+
+    Return:
+    set: a new state of the same type
+    """
+
+    new_state = state.copy()
+    if cell in new_state:
+        new_state.remove(cell)
+    else:
+        new_state.add(cell)
+    return new_state
@@ -0,0 +1,191 @@
+"""Runs the game of life without any windows
+
+Loads a pattern, advances it a number of generations and saves the result.
+No GUI modules are imported, so this works on machines without a display.
+
+Usage:
+python -m gol.headless pattern.rle --generations 1000 --engine hashlife --output result.rle
+python -m gol.headless pattern.rle --generations 1000000 --checkpoint run.golsnap --resume
+"""
+
+import argparse
+import math
+import sys
+import time
+
+from gol.checkpoint import Checkpointer, resume
+from gol.cycle import CycleDetector, describe_cycle
+from gol.engine import ENGINES, get_engine
+from gol.files.loader import load_file
+from gol.files.saver import save_file
+from gol.files.snapshot import is_snapshot
+
+
+def run(model, engine, generations, report_every=0, out=sys.stdout, detector=None,
+        checkpointer=None):
+    """Advance a model and print statistics along the way
+
+    Parameters:
+    model (GolModel): the model to advance
+    engine: the engine to use
+    generations (int): number of generations to advance
+    report_every (int): print statistics every this many generations. 0 for only at the end.
+    out: file to print the statistics to
+    detector (CycleDetector): stop early when the pattern has stabilised
+    checkpointer (Checkpointer): write checkpoints along the way
+
+    Return:
+    model (GolModel): the advanced model
+    """
+
+    start = time.perf_counter()
+    chunk = report_every if report_every > 0 else generations
+    if checkpointer and checkpointer.every_generations:
+        # Jumps ahead with advance_by must not skip a checkpoint or a report
+        every = checkpointer.every_generations
+        chunk = math.gcd(chunk, every) if report_every > 0 else min(chunk, every)
+    remaining = generations
+
+    # With checkpoints every so many seconds, advance_by is called with
+    # steps that take about that long, so checkpoints are written during the run
+    timed = checkpointer is not None and checkpointer.every_seconds > 0 and \
+        hasattr(engine, "advance_by") and not detector
+    timed_step = 1
+
+    if detector:
+        detector.update(model.state, model.generation, model.bounds)
+
+    while remaining > 0:
+        # Up to the next report or checkpoint, which are at multiples of chunk
+        step = min(chunk - (generations - remaining) % chunk, remaining)
+        if timed:
+            step = min(step, timed_step)
+        cycle = None
+        if detector:
+            # Look at every generation to find the exact period
+            for _ in range(step):
+                model = engine.advance(model)
+                remaining -= 1
+                cycle = detector.update(model.state, model.generation, model.bounds)
+                if checkpointer:
+                    checkpointer.update(model)
+                if cycle:
+                    break
+        elif hasattr(engine, "advance_by"):
+            step_start = time.perf_counter()
+            model = engine.advance_by(model, step)
+            remaining -= step
+            if checkpointer:
+                checkpointer.update(model)
+            if timed:
+                # Size the next step from the measured speed. It grows at most
+                # twice as large, since hashlife is not linear in the generations.
+                step_time = time.perf_counter() - step_start
+                wanted = step * checkpointer.every_seconds / step_time if step_time > 0 \
+                    else 2 * step
+                timed_step = max(1, min(2 * step, int(wanted)))
+        else:
+            for _ in range(step):
+                model = engine.advance(model)
+                if checkpointer:
+                    checkpointer.update(model)
+            remaining -= step
+
+        done = generations - remaining
+        if remaining > 0 and not cycle and (report_every == 0 or done % report_every):
+            # Stopped for a checkpoint, not for a report
+            continue
+
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else float("inf")
+        print("generation {}: population {}, {:.3f} s, {:.1f} generations/s".format(
+            model.generation, model.population, elapsed, rate), file=out)
+
+        if cycle:
+            print(describe_cycle(cycle), file=out)
+            break
+
+    return model
+
+
+def main(argv=None):
+    """Command line entry point
+
+    Parameters:
+    argv: command line arguments. Defaults to sys.argv[1:]
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m gol.headless", description="Run the game of life without a window")
+    parser.add_argument("pattern", help="pattern file to load")
+    parser.add_argument("-g", "--generations", type=int, default=1,
+                        help="number of generations to advance (default: 1)")
+    parser.add_argument("-e", "--engine", choices=sorted(ENGINES), default="isotropic",
+                        help="engine to use (default: isotropic)")
+    parser.add_argument("-o", "--output", help="file to save the result to (rle)")
+    parser.add_argument("-r", "--report-every", type=int, default=0,
+                        help="print statistics every this many generations")
+    parser.add_argument("-c", "--stop-on-cycle", action="store_true",
+                        help="stop when the pattern has stabilised")
+    parser.add_argument("--checkpoint", help="file to write checkpoints to (binary snapshot)")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="write a checkpoint every this many generations")
+    parser.add_argument("--checkpoint-seconds", type=float, default=0,
+                        help="write a checkpoint every this many seconds "
+                             "(default: 600 if --checkpoint-every is not given)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the checkpoint if there is one. "
+                             "--generations then counts from the start of the run.")
+    args = parser.parse_args(argv)
+
+    engine = get_engine(args.engine)
+
+    start = time.perf_counter()
+    model = None
+    if args.resume and args.checkpoint:
+        model = resume(args.checkpoint, engine)
+    generations = args.generations
+    if model is not None:
+        generations = max(0, args.generations - model.generation)
+        print("resumed {} at generation {}: population {}, {:.3f} s".format(
+            args.checkpoint, model.generation, model.population, time.perf_counter() - start))
+    else:
+        try:
+            if hasattr(engine, "load_snapshot") and is_snapshot(args.pattern):
+                # The dense engine reads the coordinates straight from the file
+                model = engine.load_snapshot(args.pattern)
+            else:
+                model = load_file(args.pattern)
+        except FileNotFoundError:
+            parser.exit(1, "Could not load file: " + args.pattern + "\n")
+        print("loaded {}: population {}, {:.3f} s".format(
+            args.pattern, model.population, time.perf_counter() - start))
+
+    checkpointer = None
+    if args.checkpoint:
+        every_seconds = args.checkpoint_seconds
+        if not args.checkpoint_every and not every_seconds:
+            every_seconds = 600
+        checkpointer = Checkpointer(args.checkpoint, args.checkpoint_every, every_seconds,
+                                    model.generation)
+
+    try:
+        detector = CycleDetector() if args.stop_on_cycle else None
+        model = run(model, engine, generations, args.report_every, detector=detector,
+                    checkpointer=checkpointer)
+        if checkpointer:
+            checkpointer.finish(model)
+    finally:
+        if hasattr(engine, "close"):
+            engine.close()
+        if checkpointer:
+            checkpointer.close()
+
+    if args.output:
+        start = time.perf_counter()
+        save_file(model, args.output)
+        print("saved {}: {:.3f} s".format(args.output, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Keeps recent generations so the controller can step back in time
+
+Every 'keyframe_interval' generations the whole state is stored. For the
+generations in between only the births and deaths are stored. Coordinates
+are kept in compact arrays of 64 bit integers. When the history uses more
+memory than allowed, the oldest keyframes are thrown away with their deltas.
+
+The dying cells of multi-state rules are stored whole for each generation
+that has any.
+"""
+
+from array import array
+from collections import deque
+from itertools import chain
+
+
+def encode(cells):
+    """Pack cells into an array of interleaved x and y coordinates
+    """
+
+    return array("q", chain.from_iterable(cells))
+
+
+def decode(packed):
+    """Unpack an array of interleaved x and y coordinates into a set of cells
+    """
+
+    return set(zip(packed[0::2], packed[1::2]))
+
+
+def encode_dying(dying):
+    """Pack dying cells into an array of interleaved x, y and state
+    """
+
+    return array("q", chain.from_iterable((x, y, state) for (x, y), state in dying.items()))
+
+
+def decode_dying(packed):
+    """Unpack an array of interleaved x, y and state into {(x, y): state}
+    """
+
+    return dict(zip(zip(packed[0::3], packed[1::3]), packed[2::3]))
+
+
+class Segment():
+    """A keyframe and the deltas that follow it
+
+    Parameters:
+    generation (int): generation of the keyframe
+    state: set of alive cells in the keyframe
+    """
+
+    def __init__(self, generation, state):
+        self.generation = generation
+        self.keyframe = encode(state)
+        # (generation, births, deaths) for each recorded change
+        self.deltas = []
+        # generation -> packed dying cells, for the generations that have any
+        self.dying = dict()
+        self.nbytes = self.keyframe.buffer_info()[1] * self.keyframe.itemsize
+
+    @property
+    def last_generation(self):
+        """The last generation in this segment
+        """
+
+        return self.deltas[-1][0] if self.deltas else self.generation
+
+    def add_delta(self, generation, births, deaths):
+        births, deaths = encode(births), encode(deaths)
+        self.deltas.append((generation, births, deaths))
+        self.nbytes += (len(births) + len(deaths)) * births.itemsize
+
+    def add_dying(self, generation, dying):
+        packed = encode_dying(dying)
+        self.dying[generation] = packed
+        self.nbytes += len(packed) * packed.itemsize
+
+    def truncate(self, generation):
+        """Forget the deltas and dying cells after a generation
+
+        Return:
+        int: the number of bytes freed
+        """
+
+        before = self.nbytes
+        while self.deltas and self.deltas[-1][0] > generation:
+            _, births, deaths = self.deltas.pop()
+            self.nbytes -= (len(births) + len(deaths)) * births.itemsize
+        for dying_generation in [g for g in self.dying if g > generation]:
+            packed = self.dying.pop(dying_generation)
+            self.nbytes -= len(packed) * packed.itemsize
+        return before - self.nbytes
+
+    def state_at(self, generation):
+        """Rebuild the state of the latest recorded generation <= 'generation'
+
+        Return:
+        (int, set, dict): the generation found, its alive cells and its dying cells
+        """
+
+        state = decode(self.keyframe)
+        found = self.generation
+        for delta_generation, births, deaths in self.deltas:
+            if delta_generation > generation:
+                break
+            state.difference_update(decode(deaths))
+            state.update(decode(births))
+            found = delta_generation
+        return found, state, decode_dying(self.dying.get(found, ()))
+
+
+class GolHistory():
+    """Ring buffer of recent generations
+
+    Parameters:
+    keyframe_interval (int): number of deltas between two keyframes
+    memory_budget (int): bytes the stored coordinates may use. The newest
+        keyframe is always kept, even if it is larger than this.
+    """
+
+    def __init__(self, keyframe_interval=100, memory_budget=64 * 1024 * 1024):
+        self.keyframe_interval = keyframe_interval
+        self.memory_budget = memory_budget
+        self.segments = deque()
+        self.nbytes = 0
+        self._last_state = None
+
+    def clear(self):
+        """Forget all generations
+        """
+
+        self.segments.clear()
+        self.nbytes = 0
+        self._last_state = None
+
+    @property
+    def first_generation(self):
+        """The oldest generation that can be restored, or None if empty
+        """
+
+        return self.segments[0].generation if self.segments else None
+
+    @property
+    def last_generation(self):
+        """The newest recorded generation, or None if empty
+        """
+
+        return self.segments[-1].last_generation if self.segments else None
+
+    def record(self, model):
+        """Store the state of a model
+
+        Generations must be recorded in increasing order.
+
+        Parameters:
+        model (GolModel): the model to store
+        """
+
+        state = model.state
+        last = self.segments[-1] if self.segments else None
+
+        if last is None or len(last.deltas) >= self.keyframe_interval:
+            segment = Segment(model.generation, state)
+            self.segments.append(segment)
+            self.nbytes += segment.nbytes
+        else:
+            before = last.nbytes
+            last.add_delta(model.generation, state - self._last_state, self._last_state - state)
+            self.nbytes += last.nbytes - before
+
+        if model.dying:
+            segment = self.segments[-1]
+            before = segment.nbytes
+            segment.add_dying(model.generation, model.dying)
+            self.nbytes += segment.nbytes - before
+
+        self._last_state = state
+        self._evict()
+
+    def toggle(self, model, cell):
+        """Store a cell that was turned on or off in the current generation
+
+        Parameters:
+        model (GolModel): the model after the change
+        cell (int, int): the cell that was changed
+        """
+
+        if not self.segments:
+            self.record(model)
+            return
+
+        last = self.segments[-1]
+        before = last.nbytes
+        if cell in model.state:
+            last.add_delta(model.generation, (cell,), ())
+        else:
+            last.add_delta(model.generation, (), (cell,))
+        self.nbytes += last.nbytes - before
+        self._last_state = model.state
+
+    def _evict(self):
+        """Throw away the oldest segments until the history fits the memory budget
+        """
+
+        while self.nbytes > self.memory_budget and len(self.segments) > 1:
+            self.nbytes -= self.segments.popleft().nbytes
+
+    def seek(self, generation):
+        """Rebuild a recent generation
+
+        Parameters:
+        generation (int): the generation to rebuild
+
+        Return:
+        (int, set, dict): the latest recorded generation <= 'generation', its
+            alive cells and its dying cells, or None if it is older than the history
+        """
+
+        for segment in reversed(self.segments):
+            if segment.generation <= generation:
+                return segment.state_at(generation)
+        return None
+
+    def truncate(self, generation, state):
+        """Forget everything after a generation, e.g. after stepping back
+
+        Parameters:
+        generation (int): the last generation to keep
+        state: the alive cells of that generation
+        """
+
+        while self.segments and self.segments[-1].generation > generation:
+            self.nbytes -= self.segments.pop().nbytes
+
+        if self.segments:
+            self.nbytes -= self.segments[-1].truncate(generation)
+
+        self._last_state = state
@@ -1,8 +1,27 @@
 """Minimal module to keep track of attributes of GolModel
 """
 
+from operator import itemgetter
+
 from gol.rule import Rule
 
+
+def cell_bounds(cells):
+    """Find the bounding box of a set of cells
+
+    Parameters:
+    cells: set of (x, y) coordinates
+
+    Return:
+    (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+    """
+
+    if not cells:
+        return None
+    by_y = itemgetter(1)
+    return (min(cells)[0], min(cells, key=by_y)[1], max(cells)[0], max(cells, key=by_y)[1])
+
+
 class GolModel:
     """Mostly to remind myself what things are called in the model
     """
@@ -14,3 +33,60 @@ class GolModel:
         self.filename = ""
         self.name = ""
         self.author = ""
+        self.generation = 0
+        # Cells in the dying states of Generations and Larger than Life
+        # rules, as {(x, y): state}. 'state' is 2 or more; alive cells are
+        # in 'state' and are state 1.
+        self.dying = dict()
+        # Number of cells born and cells that died in the last advance,
+        # compared with the state before it. None when not known.
+        self.births = None
+        self.deaths = None
+        # The bounding box and the state it belongs to
+        self._bounds = None
+        self._bounds_state = None
+
+    def __copy__(self):
+        """Make a shallow copy that does not share the dying cells
+
+        Engines copy the model and replace what changes, so the dict of
+        dying cells is copied too.
+        """
+
+        model = self.__class__.__new__(self.__class__)
+        model.__dict__.update(self.__dict__)
+        model.dying = dict(self.dying)
+        return model
+
+    @property
+    def population(self):
+        """Number of alive cells
+        """
+
+        # A TreeState can hold more cells than len() allows
+        population = getattr(self.state, "population", None)
+        return len(self.state) if population is None else population
+
+    @property
+    def bounds(self):
+        """(min_x, min_y, max_x, max_y) of the alive cells, or None if there are none
+
+        Engines set the bounding box when it comes cheap. Otherwise it is
+        found from the state the first time it is asked for.
+        """
+
+        if self._bounds_state is not self.state:
+            # A TreeState finds its own bounding box without looking at every cell
+            bounds = getattr(self.state, "bounds", None)
+            self.set_bounds(bounds() if bounds else cell_bounds(self.state))
+        return self._bounds
+
+    def set_bounds(self, bounds):
+        """Set the bounding box of the current state
+
+        Parameters:
+        bounds (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        self._bounds = bounds
+        self._bounds_state = self.state
@@ -0,0 +1,560 @@
+"""Runs the game of life on a server and views it from elsewhere
+
+The server stands in for the grid and info views of a GolController, so
+remote clients use the same messages as the views: 'open', 'save', 'step',
+'run', 'toggle_cell' and so on. Each client tells the server which part of
+the universe it shows with a 'viewport' message, and is only sent the cells
+born and died inside it since the last frame it got. The amount of data
+depends on what happens in the viewport, not on the population.
+
+'open' and 'save' are only allowed when the server is given a directory,
+and only for files inside it. Messages longer than MAX_MESSAGE bytes
+disconnect the client.
+
+Every message is a 4 byte little-endian length followed by the payload.
+The first byte of the payload is the kind:
+    J: JSON {"msg": msg, "attr": attr}, in either direction
+    D: a delta from the server. DELTA_HEADER, then the zlib compressed
+        births and deaths as little-endian uint16 (x, y) pairs relative to
+        the top left corner of the viewport, sorted by row.
+
+Usage:
+python -m gol.remote pattern.rle --engine hashlife --port 7654 --frame-rate 30
+python -m gol.remote --directory patterns --host 0.0.0.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from itertools import chain
+from operator import itemgetter
+
+from gol.controller import GolController
+from gol.cycle import describe_cycle
+from gol.engine import ENGINES, get_engine
+from gol.files.loader import load_file
+from gol.model import GolModel
+from gol.rule import rule_string
+from gol.tiles import TiledState
+
+DEFAULT_PORT = 7654
+
+# Length of each message
+MESSAGE_HEADER = struct.Struct("<I")
+
+# Longest message a client may send
+MAX_MESSAGE = 64 * 1024
+
+# generation, x and y of the viewport, number of births, number of deaths,
+# and 1 if the client should forget its cells first (a key frame)
+DELTA_HEADER = struct.Struct("<qqqIIB")
+
+# Largest width and height of a viewport, so offsets fit in 16 bits
+MAX_VIEWPORT = 1 << 16
+
+# zlib compression level of the deltas
+DELTA_COMPRESSION = 6
+
+# Messages clients may send on to the controller
+CLIENT_MESSAGES = frozenset((
+    "open", "save", "step", "step_back", "seek", "run", "faster", "slower",
+    "frame_rate", "toggle_cell", "stats"))
+
+_BY_ROW = itemgetter(1, 0)
+
+
+def encode_message(msg, attr=None):
+    """Encode a JSON message
+
+    Parameters:
+    msg (str): the message
+    attr: anything JSON can hold
+
+    Return:
+    bytes: the message with its length in front
+    """
+
+    payload = b"J" + json.dumps({"msg": msg, "attr": attr}).encode("utf-8")
+    return MESSAGE_HEADER.pack(len(payload)) + payload
+
+
+def encode_delta(generation, viewport, births, deaths, key_frame=False):
+    """Encode the cells born and died inside a viewport
+
+    Parameters:
+    generation (int): the generation of the frame
+    viewport (x_min, y_min, x_max, y_max): the viewport of the client
+    births, deaths: sets of (x, y) coordinates inside the viewport
+    key_frame (bool): the client should forget its cells first
+
+    Return:
+    bytes: the message with its length in front
+    """
+
+    x_min, y_min = viewport[0], viewport[1]
+    offsets = array("H", chain.from_iterable(
+        (x - x_min, y - y_min) for x, y in chain(
+            sorted(births, key=_BY_ROW), sorted(deaths, key=_BY_ROW))))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    payload = b"D" + DELTA_HEADER.pack(
+        generation, x_min, y_min, len(births), len(deaths), key_frame) + \
+        zlib.compress(offsets.tobytes(), DELTA_COMPRESSION)
+    return MESSAGE_HEADER.pack(len(payload)) + payload
+
+
+def decode_delta(payload):
+    """Decode a delta
+
+    Parameters:
+    payload (bytes): the message without its length, starting with b"D"
+
+    Return:
+    (int, list, list, bool): the generation, the births and the deaths as
+        (x, y) coordinates, and whether it is a key frame
+    """
+
+    generation, x_min, y_min, birth_count, death_count, key_frame = \
+        DELTA_HEADER.unpack_from(payload, 1)
+    offsets = array("H", zlib.decompress(payload[1 + DELTA_HEADER.size:]))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    cells = list(zip((x + x_min for x in offsets[0::2]), (y + y_min for y in offsets[1::2])))
+    return generation, cells[:birth_count], cells[birth_count:birth_count + death_count], \
+        bool(key_frame)
+
+
+def check_viewport(viewport):
+    """Check a viewport sent by a client
+
+    Parameters:
+    viewport: [x_min, y_min, x_max, y_max]
+
+    Return:
+    (int, int, int, int): the viewport as a tuple of ints
+    """
+
+    x_min, y_min, x_max, y_max = (int(value) for value in viewport)
+    if not (0 <= x_max - x_min < MAX_VIEWPORT and 0 <= y_max - y_min < MAX_VIEWPORT):
+        raise ValueError("Viewport must be 1 to {} cells wide and high".format(MAX_VIEWPORT))
+    return x_min, y_min, x_max, y_max
+
+
+def visible_cells(state, viewport):
+    """Return the alive cells inside a viewport
+
+    Parameters:
+    state: set of alive cells, or a TiledState
+    viewport (x_min, y_min, x_max, y_max): the viewport, edges included
+
+    Return:
+    set: the alive cells inside the viewport
+    """
+
+    x_min, y_min, x_max, y_max = viewport
+    if hasattr(state, "region"):
+        # Only the tiles inside the viewport are looked at
+        return set(state.region(x_min, y_min, x_max, y_max))
+    return {(x, y) for x, y in state if x_min <= x <= x_max and y_min <= y <= y_max}
+
+
+def served_path(directory, filename):
+    """Find a file inside the served directory
+
+    Parameters:
+    directory (str): the served directory, or None if files are not served
+    filename (str): the file name a client sent, relative to the directory
+
+    Return:
+    str: the path of the file
+
+    Raises ValueError if files are not served or the file is outside the directory.
+    """
+
+    if directory is None:
+        raise ValueError("Files are not served")
+    if not isinstance(filename, str):
+        raise ValueError("Not a file name")
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, filename))
+    if path == root or os.path.commonpath((root, path)) != root:
+        raise ValueError("File is outside the served directory")
+    return path
+
+
+def describe_model(model):
+    """The information about a model that is sent to clients
+
+    Return:
+    dict: name, author, description, rule and generation
+    """
+
+    return {
+        "name": model.name,
+        "author": model.author,
+        "description": list(model.description),
+        "rule": rule_string(model.rule),
+        "generation": model.generation,
+    }
+
+
+class _Client():
+    """A connected client
+
+    Parameters:
+    writer (asyncio.StreamWriter): the connection to the client
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        # The task reading the messages of the client
+        self.task = asyncio.current_task()
+        # The viewport, or None until the client has sent one
+        self.viewport = None
+        # The alive cells in the viewport that the client knows about
+        self.visible = set()
+
+
+class _ViewQueue():
+    """The queue of a view, as seen by the controller
+
+    Messages are handed to the server's event loop.
+    """
+
+    def __init__(self, server, role):
+        self.server = server
+        self.role = role
+
+    def put(self, message):
+        try:
+            self.server.loop.call_soon_threadsafe(self.server.handle_view_message,
+                                                  self.role, message)
+        except RuntimeError:
+            # The server has stopped
+            pass
+
+
+class _RemoteView():
+    """Takes the place of the grid or info view in the controller
+    """
+
+    def __init__(self, server, role):
+        self.queue = _ViewQueue(server, role)
+
+
+class GolServer(threading.Thread):
+    """Serves a GolController to remote clients over TCP
+
+    Pass 'grid_view' and 'info_view' to the controller in place of the
+    view classes. The server starts when the controller makes its grid view.
+
+    Parameters:
+    host (str): the address to listen on. Only this machine by default.
+    port (int): the port to listen on. 0 picks a free port.
+    directory (str): clients may open and save files inside this directory.
+        None to refuse 'open' and 'save'.
+    """
+
+    def __init__(self, host="localhost", port=DEFAULT_PORT, directory=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.loop = asyncio.new_event_loop()
+        self.hub_queue = None
+        self.clients = set()
+        # The latest frame from the controller
+        self.frame = None
+        # Set once the server is listening, or failed to
+        self.listening = threading.Event()
+        self.error = None
+        self._stopped = None
+
+    def grid_view(self, hub_queue):
+        """Make the grid view for the controller and start the server
+        """
+
+        self.hub_queue = hub_queue
+        self.start()
+        self.listening.wait()
+        if self.error:
+            raise self.error
+        return _RemoteView(self, "grid")
+
+    def info_view(self, hub_queue):
+        """Make the info view for the controller
+        """
+
+        self.hub_queue = hub_queue
+        return _RemoteView(self, "info")
+
+    def run(self):
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        """Disconnect the clients and stop the server. Safe to call from any thread.
+        """
+
+        try:
+            self.loop.call_soon_threadsafe(self._stop)
+        except RuntimeError:
+            # Already stopped
+            pass
+
+    def _stop(self):
+        if not self._stopped.done():
+            self._stopped.set_result(None)
+
+    async def serve(self):
+        """Accept clients until stopped
+        """
+
+        self._stopped = self.loop.create_future()
+        try:
+            server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        except OSError as error:
+            self.error = error
+            self.listening.set()
+            return
+
+        self.port = server.sockets[0].getsockname()[1]
+        self.listening.set()
+        async with server:
+            await self._stopped
+            clients = list(self.clients)
+            for client in clients:
+                client.writer.close()
+            await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+
+    def handle_view_message(self, role, message):
+        """Handle a message from the controller to one of the views
+
+        Parameters:
+        role (str): "grid" or "info"
+        message: (msg, attr)
+        """
+
+        msg, attr = message
+        if msg == "quit":
+            self._stop()
+        elif msg == "update":
+            self.frame = attr
+            self.loop.create_task(self.send_frame(attr))
+        elif msg == "model":
+            self.broadcast(encode_message(msg, describe_model(attr)))
+        elif msg == "stabilised":
+            self.broadcast(encode_message(msg, describe_cycle(attr)))
+        else:
+            self.broadcast(encode_message(msg, attr))
+
+    def broadcast(self, data):
+        """Send a message to every client
+        """
+
+        for client in self.clients:
+            client.writer.write(data)
+
+    async def send_frame(self, frame):
+        """Send each client the changes in its viewport, and tell the controller when done
+
+        Parameters:
+        frame (Frame): the frame from the controller
+        """
+
+        start = time.perf_counter()
+        for client in list(self.clients):
+            if client.viewport is not None:
+                self.send_delta(client, frame)
+
+        # Wait for slow clients, so the simulation does not run away from them
+        await asyncio.gather(*(client.writer.drain() for client in list(self.clients)),
+                             return_exceptions=True)
+        self.hub_queue.put(("view_idle", time.perf_counter() - start))
+
+    def send_delta(self, client, frame, key_frame=False):
+        """Send a client the cells born and died in its viewport since its last frame
+        """
+
+        visible = visible_cells(frame.state, client.viewport)
+        if key_frame:
+            births, deaths = visible, ()
+        else:
+            births = visible - client.visible
+            deaths = client.visible - visible
+        client.visible = visible
+        client.writer.write(encode_delta(frame.generation, client.viewport, births, deaths,
+                                         key_frame))
+
+    async def handle_client(self, reader, writer):
+        """Read the messages of a client until it disconnects
+        """
+
+        client = _Client(writer)
+        self.clients.add(client)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(MESSAGE_HEADER.size)
+                    length = MESSAGE_HEADER.unpack(header)[0]
+                    if length > MAX_MESSAGE:
+                        # Do not buffer whatever the client claims to send
+                        break
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break
+                self.handle_client_message(client, payload)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    def handle_client_message(self, client, payload):
+        """Handle a message from a client
+
+        Parameters:
+        client (_Client): the client
+        payload (bytes): the message without its length
+        """
+
+        try:
+            message = json.loads(payload[1:].decode("utf-8")) if payload[:1] == b"J" else {}
+            msg = message.get("msg")
+            attr = message.get("attr")
+
+            if msg == "viewport":
+                client.viewport = check_viewport(attr)
+                if self.frame is not None:
+                    self.send_delta(client, self.frame, key_frame=True)
+            elif msg in CLIENT_MESSAGES:
+                if msg == "toggle_cell":
+                    attr = (int(attr[0]), int(attr[1]))
+                elif msg in ("open", "save"):
+                    attr = served_path(self.directory, attr)
+                self.hub_queue.put((msg, attr))
+            else:
+                client.writer.write(encode_message("error_message", "Unknown message"))
+        except (ValueError, TypeError, IndexError, AttributeError) as error:
+            client.writer.write(encode_message("error_message", str(error)))
+
+
+class GolClient():
+    """Connects to a GolServer and keeps track of the cells in a viewport
+
+    Parameters:
+    host (str): the address of the server
+    port (int): the port of the server
+    """
+
+    def __init__(self, host="localhost", port=DEFAULT_PORT):
+        self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile("rb")
+        # The alive cells in the viewport
+        self.cells = set()
+        self.generation = None
+
+    def send(self, msg, attr=None):
+        """Send a message to the controller, e.g. ("step", None) or ("toggle_cell", (3, 4))
+        """
+
+        self.socket.sendall(encode_message(msg, attr))
+
+    def set_viewport(self, viewport):
+        """Ask for the cells in a viewport
+
+        Parameters:
+        viewport (x_min, y_min, x_max, y_max): the viewport, edges included
+        """
+
+        self.send("viewport", list(viewport))
+
+    def receive(self):
+        """Wait for the next message from the server
+
+        Deltas are applied to 'cells'.
+
+        Return:
+        (str, attr): ("update", generation) for a delta, otherwise the message
+        """
+
+        header = self.file.read(MESSAGE_HEADER.size)
+        if len(header) < MESSAGE_HEADER.size:
+            raise ConnectionError("Connection closed by the server")
+        payload = self.file.read(MESSAGE_HEADER.unpack(header)[0])
+
+        if payload[:1] == b"D":
+            generation, births, deaths, key_frame = decode_delta(payload)
+            if key_frame:
+                self.cells.clear()
+            self.cells.difference_update(deaths)
+            self.cells.update(births)
+            self.generation = generation
+            return "update", generation
+
+        message = json.loads(payload[1:].decode("utf-8"))
+        return message["msg"], message["attr"]
+
+    def close(self):
+        """Disconnect from the server
+        """
+
+        self.file.close()
+        self.socket.close()
+
+
+def main(argv=None):
+    """Serve a pattern to remote clients
+
+    Parameters:
+    argv (list): the command line arguments. sys.argv[1:] if None.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Run the game of life on this machine and view it from elsewhere.")
+    parser.add_argument("pattern", nargs="?", help="pattern file to load")
+    parser.add_argument("-e", "--engine", choices=sorted(ENGINES), default="tiled",
+                        help="engine to use (default: tiled, which keeps the state a TiledState)")
+    parser.add_argument("--host", default="localhost",
+                        help="address to listen on. Use 0.0.0.0 for every network.")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("-f", "--frame-rate", type=float, default=0,
+                        help="frames per second while running. 0 to wait for the clients.")
+    parser.add_argument("-d", "--directory",
+                        help="let clients open and save files in this directory")
+    args = parser.parse_args(argv)
+
+    if args.pattern:
+        model = load_file(args.pattern)
+        # Clients only get the cells in their viewport, which a TiledState
+        # finds without going through all of them
+        model.state = TiledState(model.state)
+    else:
+        model = GolModel()
+        model.state = TiledState()
+
+    server = GolServer(args.host, args.port, args.directory)
+    try:
+        GolController(model, get_engine(args.engine), server.grid_view, server.info_view,
+                      frame_rate=args.frame_rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
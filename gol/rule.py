@@ -1,6 +1,406 @@
-"""Defines the 'Rule' named tuple
+"""Defines the 'Rule' named tuple and the multi-state rule families
+
+Rules are compiled once into lookup tables that the engines use instead of
+checking the neighbour count against the survival and birth iterables for
+every cell.
+
+Besides two-state rules like B3/S23 there are:
+    Generations rules (B2/S345/C4 or 345/2/4): a cell that does not survive
+        goes through 'states' - 2 dying states before it is dead.
+    Larger than Life rules (R5,C0,M1,S34..58,B34..45,NM): the neighbours
+        are counted in a square of radius 'radius'.
+    Isotropic non-totalistic rules in Hensel notation (B2-a3/S12): the
+        letters after a count pick out how the neighbours are arranged.
 """
 
+import re
 from collections import namedtuple
+from functools import lru_cache
 
 Rule = namedtuple("Rule", "survival birth")
+
+# A Generations rule
+#   survival, birth: tuples with the neighbour counts as ints
+#   states (int): number of states, including dead and alive. At least 3.
+GenerationsRule = namedtuple("GenerationsRule", "survival birth states")
+
+# A Larger than Life rule
+#   radius (int): the neighbours are in a square of (2*radius + 1)^2 cells
+#   states (int): number of states as for Generations. 2 for no dying states.
+#   middle (bool): the cell itself is counted as a neighbour
+#   survival, birth (int, int): the lowest and highest counts, both included
+LtlRule = namedtuple("LtlRule", "radius states middle survival birth")
+
+# An isotropic non-totalistic rule
+#   survival, birth: sorted tuples with the neighbourhoods in Hensel
+#       notation, like ('1c', '1e', '2a'). Counts 0 and 8 are '0' and '8'.
+IsotropicRule = namedtuple("IsotropicRule", "survival birth")
+
+# Hensel notation: the letters for 0 to 4 neighbours. 5 to 8 neighbours use
+# the letters of 3 to 0, for the neighbourhood with dead and alive swapped.
+HENSEL_LETTERS = ("", "ce", "ceaikn", "ceaiknjqry", "ceaiknjqrtwyz")
+
+# One neighbourhood for each letter in HENSEL_LETTERS, as a 3x3 index like
+# the one of RuleTable.table
+HENSEL_NEIGHBOURHOODS = (
+    (0,),
+    (1, 2),
+    (5, 10, 3, 40, 33, 68),
+    (69, 42, 11, 7, 98, 13, 14, 70, 41, 97),
+    (325, 170, 15, 45, 99, 71, 106, 102, 43, 101, 105, 78, 108))
+
+# A neighbour count in Hensel notation, e.g. '2-ak', and a list of them
+HENSEL_COUNT = re.compile(r"([0-8])(-?)([a-z]*)")
+HENSEL_COUNTS = re.compile(r"(?:[0-8]-?[a-z]*)*")
+
+# The bits of the eight neighbours in a 3x3 index
+NEIGHBOUR_BITS = 0b111101111
+
+# Largest radius for Larger than Life rules
+MAX_RADIUS = 500
+
+# Largest number of states for multi-state rules
+MAX_STATES = 256
+
+# A rule compiled into lookup tables
+#   survival, birth: frozensets with the neighbour counts as ints, or with
+#       the neighbourhoods in Hensel notation for an IsotropicRule
+#   next_state: next_state[alive][count] is True if the cell is alive in the
+#       next generation. 'alive' is 0 or 1 and 'count' is 0 to 8. None for
+#       an IsotropicRule, where the count is not enough.
+#   table: 512 bytes indexed by the 3x3 neighbourhood of a cell. Bit
+#       3*row + column is set if that cell is alive, so bit 4 is the cell
+#       itself. The byte is 1 if the cell is alive in the next generation.
+RuleTable = namedtuple("RuleTable", "survival birth next_state table")
+
+
+def rule_string(rule):
+    """Return the rule in B/S notation
+
+    Generations rules are written as B/S/C and Larger than Life rules as
+    R,C,M,S,B,N.
+
+    Parameters:
+    rule: the Rule, GenerationsRule or LtlRule to convert
+
+    Return:
+    str: the rule as a string
+
+    >>> rule_string(Rule((3, 2), (3,)))
+    'B3/S23'
+    >>> rule_string(GenerationsRule((3, 4, 5), (2,), 4))
+    'B2/S345/C4'
+    >>> rule_string(LtlRule(5, 2, True, (34, 58), (34, 45)))
+    'R5,C0,M1,S34..58,B34..45,NM'
+    >>> rule_string(parse_rule("B2cekin3/S1c1e2"))
+    'B2-a3/S12'
+    """
+
+    if isinstance(rule, IsotropicRule):
+        return "B" + _hensel_string(rule.birth) + "/S" + _hensel_string(rule.survival)
+    if isinstance(rule, LtlRule):
+        return "R{},C{},M{},S{}..{},B{}..{},NM".format(
+            rule.radius, rule.states if rule.states > 2 else 0, int(rule.middle),
+            rule.survival[0], rule.survival[1], rule.birth[0], rule.birth[1])
+
+    survival = sorted(set(int(a) for a in rule.survival))
+    birth = sorted(set(int(a) for a in rule.birth))
+    string = "B" + "".join(str(a) for a in birth) + "/S" + "".join(str(a) for a in survival)
+    if isinstance(rule, GenerationsRule):
+        string += "/C" + str(rule.states)
+    return string
+
+
+def is_multistate(rule):
+    """Check if a rule has dying states
+
+    Parameters:
+    rule: the Rule, GenerationsRule or LtlRule
+
+    Return:
+    bool: True if cells can be in other states than dead and alive
+    """
+
+    return getattr(rule, "states", 2) > 2
+
+
+def _symmetries(index):
+    """Generate the 3x3 index rotated and reflected in the 8 ways of a square
+    """
+
+    cells = [(bit % 3, bit // 3) for bit in range(9) if index >> bit & 1]
+    for _ in range(4):
+        cells = [(2 - y, x) for x, y in cells]
+        yield sum(1 << (3 * y + x) for x, y in cells)
+        yield sum(1 << (3 * y + 2 - x) for x, y in cells)
+
+
+@lru_cache(maxsize=None)
+def hensel_names():
+    """Name the neighbourhood of every 3x3 index in Hensel notation
+
+    The cell itself (bit 4) is ignored. Counts 5 to 8 are the complements
+    of counts 3 to 0 and keep their letters. Count 4 is its own complement,
+    so it is only named from its own neighbourhoods.
+
+    Return:
+    tuple: 512 names like '2a' or '8'
+
+    >>> hensel_names()[0b000000011], hensel_names()[0b111111110], hensel_names()[16]
+    ('2a', '7c', '0')
+    >>> None in hensel_names()
+    False
+    >>> from collections import Counter
+    >>> sizes = Counter(name for index, name in enumerate(hensel_names())
+    ...                 if name[0] == "4" and not index & 16)
+    >>> "".join(sorted(letter for letter in "ceaiknjqrtwyz" if sizes["4" + letter] == 8))
+    'ajknrt'
+    >>> sorted(sizes["4" + letter] for letter in "ceiqwyz")
+    [1, 1, 4, 4, 4, 4, 4]
+    """
+
+    names = [None] * 512
+    for count, letters in enumerate(HENSEL_LETTERS):
+        for letter, neighbourhood in zip(letters or ("",), HENSEL_NEIGHBOURHOODS[count]):
+            for index in _symmetries(neighbourhood):
+                inverse = ~index & NEIGHBOUR_BITS
+                for centre in (0, 16):
+                    names[index | centre] = str(count) + letter
+                    if count < 4:
+                        names[inverse | centre] = str(8 - count) + letter
+    return tuple(names)
+
+
+def _hensel_letters(count):
+    """Return the letters of a neighbour count in Hensel notation
+    """
+
+    return HENSEL_LETTERS[min(count, 8 - count)]
+
+
+def _hensel_string(names):
+    """Write neighbourhoods in Hensel notation, e.g. '2-a3'
+
+    A count is written with the letters it has, or with a '-' and the
+    letters it does not have if that is shorter.
+    """
+
+    string = ""
+    for count in range(9):
+        letters = _hensel_letters(count)
+        present = "".join(letter for letter in letters if str(count) + letter in names)
+        absent = "".join(letter for letter in letters if str(count) + letter not in names)
+        if (count == 0 or count == 8) and str(count) in names or present and not absent:
+            string += str(count)
+        elif present and len(present) <= len(absent):
+            string += str(count) + present
+        elif present:
+            string += str(count) + "-" + absent
+    return string
+
+
+def _parse_hensel(string, original):
+    """Parse neighbourhoods in Hensel notation like '2-a3'
+
+    Return:
+    tuple: sorted names of the neighbourhoods, like ('2c', '2e', '3c')
+    """
+
+    string = string.lower()
+    if not HENSEL_COUNTS.fullmatch(string):
+        raise ValueError("Unknown rule: " + original)
+
+    names = set()
+    for count, minus, letters in HENSEL_COUNT.findall(string):
+        all_letters = _hensel_letters(int(count))
+        if any(letter not in all_letters for letter in letters) or minus and not letters:
+            raise ValueError("Unknown rule: " + original)
+        if minus:
+            letters = "".join(letter for letter in all_letters if letter not in letters)
+        elif not letters:
+            letters = all_letters or [""]
+        names.update(count + letter for letter in letters)
+    return tuple(sorted(names))
+
+
+def _counts(string, original):
+    """Parse a string of neighbour counts like '236'
+    """
+
+    if any(a not in "012345678" for a in string):
+        raise ValueError("Unknown rule: " + original)
+    return tuple(int(a) for a in string)
+
+
+def _parse_ltl(string):
+    """Parse a Larger than Life rule like R5,C0,M1,S34..58,B34..45,NM
+    """
+
+    values = dict()
+    for part in string.strip().upper().split(","):
+        part = part.strip()
+        if part[:1] in ("R", "C", "M", "N") and part[:1] not in values:
+            values[part[0]] = part[1:]
+        elif part[:1] in ("S", "B") and ".." in part and part[:1] not in values:
+            values[part[0]] = part[1:].split("..")
+        else:
+            raise ValueError("Unknown rule: " + string)
+
+    try:
+        radius = int(values["R"])
+        states = int(values.get("C", "0"))
+        middle = int(values.get("M", "0"))
+        survival = tuple(int(a) for a in values["S"])
+        birth = tuple(int(a) for a in values["B"])
+    except (KeyError, ValueError):
+        raise ValueError("Unknown rule: " + string)
+
+    # Only the Moore (square) neighbourhood is supported
+    if values.get("N", "M") != "M":
+        raise ValueError("Unsupported neighbourhood: " + string)
+    if not 1 <= radius <= MAX_RADIUS or not 0 <= states <= MAX_STATES or middle not in (0, 1):
+        raise ValueError("Unknown rule: " + string)
+
+    return LtlRule(radius, max(states, 2), bool(middle), survival, birth)
+
+
+def parse_rule(string):
+    """Parse a rule in B3/S23, S23/B3 or 23/3 notation
+
+    Generations rules in B2/S345/C4 or 345/2/4 (S/B/C) notation, Larger
+    than Life rules like R5,C0,M1,S34..58,B34..45,NM and isotropic
+    non-totalistic rules like B2-a3/S12 are parsed too.
+
+    Parameters:
+    string (str): the rule to parse
+
+    Return:
+    Rule: the rule with the neighbour counts as tuples of ints. A
+        GenerationsRule, LtlRule or IsotropicRule for those rule families.
+
+    >>> parse_rule("23/36")
+    Rule(survival=(2, 3), birth=(3, 6))
+    >>> parse_rule("345/2/4")
+    GenerationsRule(survival=(3, 4, 5), birth=(2,), states=4)
+    """
+
+    if "," in string:
+        return _parse_ltl(string)
+
+    parts = [part.strip() for part in string.strip().split("/")]
+    if len(parts) not in (2, 3):
+        raise ValueError("Unknown rule: " + string)
+
+    survival = birth = states = None
+    for part in parts:
+        if part[:1] in ("B", "b"):
+            birth = part[1:]
+        elif part[:1] in ("S", "s"):
+            survival = part[1:]
+        elif part[:1] in ("C", "c", "G", "g"):
+            states = part[1:]
+
+    # Rule is of the form 23/3 or 345/2/4
+    if survival is None and birth is None:
+        survival, birth = parts[:2]
+        if len(parts) == 3:
+            states = parts[2]
+    elif len(parts) == 3 and states is None:
+        # B2/S345/4
+        states = parts[2]
+
+    if survival is None or birth is None or (len(parts) == 3) != (states is not None):
+        raise ValueError("Unknown rule: " + string)
+
+    # Letters after the counts make it an isotropic non-totalistic rule
+    if states is None and not (survival + birth).isdigit() and survival + birth:
+        rule = IsotropicRule(_parse_hensel(survival, string), _parse_hensel(birth, string))
+        survival = _hensel_string(rule.survival)
+        birth = _hensel_string(rule.birth)
+        if any(character.isalpha() for character in survival + birth):
+            return rule
+
+    survival = _counts(survival, string)
+    birth = _counts(birth, string)
+    if states is None:
+        return Rule(survival, birth)
+
+    if not states.isdigit() or not 2 <= int(states) <= MAX_STATES:
+        raise ValueError("Unknown rule: " + string)
+    if int(states) == 2:
+        return Rule(survival, birth)
+    return GenerationsRule(survival, birth, int(states))
+
+
+def compile_rule(rule, totalistic=True):
+    """Compile a rule into lookup tables
+
+    Compiled rules are cached, so compiling the same rule again is cheap.
+
+    Only two-state rules can be compiled. Generations and Larger than Life
+    rules have their own engines.
+
+    Parameters:
+    rule: the Rule or IsotropicRule to compile, or a rule string
+    totalistic (bool): the caller needs RuleTable.next_state, so an
+        IsotropicRule is refused
+
+    Return:
+    RuleTable: the compiled rule
+    """
+
+    if isinstance(rule, str):
+        rule = parse_rule(rule)
+    if isinstance(rule, (GenerationsRule, LtlRule)):
+        raise ValueError("Rule needs the generations or ltl engine: " + rule_string(rule))
+    if totalistic and isinstance(rule, IsotropicRule):
+        raise ValueError("Rule needs the lookup or hashlife engine: " + rule_string(rule))
+    return _compile(rule_string(rule))
+
+
+def isotropic_table(survival, birth):
+    """Make the 512 byte table of RuleTable from neighbourhoods in Hensel notation
+
+    Parameters:
+    survival, birth: collections of names like '2a' or '8'
+
+    Return:
+    bytes: the table
+
+    With every letter of a count the table is the one of the totalistic rule:
+
+    >>> names = sorted(set(hensel_names()))
+    >>> table = isotropic_table([name for name in names if name[0] in "048"],
+    ...                         [name for name in names if name[0] == "3"])
+    >>> table == compile_rule("B3/S048").table
+    True
+    """
+
+    names = hensel_names()
+    return bytes((names[index] in survival) if index & 16 else (names[index] in birth)
+                 for index in range(512))
+
+
+@lru_cache(maxsize=None)
+def _compile(string):
+    """Compile a rule in canonical B/S notation
+    """
+
+    rule = parse_rule(string)
+    survival = frozenset(rule.survival)
+    birth = frozenset(rule.birth)
+
+    if isinstance(rule, IsotropicRule):
+        return RuleTable(survival, birth, None, isotropic_table(survival, birth))
+
+    next_state = (
+        tuple(count in birth for count in range(9)),
+        tuple(count in survival for count in range(9)))
+
+    table = bytearray(512)
+    for index in range(512):
+        alive = index >> 4 & 1
+        count = bin(index).count("1") - alive
+        table[index] = next_state[alive][count]
+
+    return RuleTable(survival, birth, next_state, bytes(table))
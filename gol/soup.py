@@ -0,0 +1,318 @@
+"""Searches random soups for the objects they leave behind
+
+Each soup is a random square of cells. The soup is run until every separate
+object in it repeats (or a generation cap is reached). The objects are then
+classified as still lifes, oscillators and spaceships.
+Soups are run on a process pool and the results are written to a JSON lines
+file as they come in.
+
+Usage:
+python -m gol.soup --soups 10000 --output census.jsonl
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from gol.cycle import find_cycle
+from gol.engine import ENGINES, get_engine
+from gol.model import GolModel
+from gol.rule import parse_rule, rule_string
+
+# Offsets to the cells less than three cells away. Cells this close can have a
+# neighbour in common, so they can change each other.
+NEARBY = tuple((dx, dy) for dy in range(-2, 3) for dx in range(-2, 3) if dx or dy)
+
+# The eight rotations and reflections of a pattern
+SYMMETRIES = (
+    lambda x, y: (x, y), lambda x, y: (-x, y), lambda x, y: (x, -y), lambda x, y: (-x, -y),
+    lambda x, y: (y, x), lambda x, y: (-y, x), lambda x, y: (y, -x), lambda x, y: (-y, -x))
+
+
+def random_soup(seed, size=16, density=0.5):
+    """Create a reproducible random soup
+
+    Parameters:
+    seed: seed for the random number generator
+    size (int): width and height of the soup
+    density (float): chance of each cell being alive
+
+    Return:
+    set: set of (x, y) coordinates of alive cells
+    """
+
+    generator = random.Random(seed)
+    return set((x, y) for y in range(size) for x in range(size)
+               if generator.random() < density)
+
+
+def normalise(cells):
+    """Move cells so the top left corner of their bounding box is at (0, 0)
+
+    Return:
+    (frozenset, int, int): the moved cells and the original top left corner
+    """
+
+    if not cells:
+        return frozenset(), 0, 0
+    min_x = min(x for x, _ in cells)
+    min_y = min(y for _, y in cells)
+    return frozenset((x - min_x, y - min_y) for x, y in cells), min_x, min_y
+
+
+def canonical(cells):
+    """Return the same tuple of cells for every rotation and reflection of a pattern
+    """
+
+    return min(tuple(sorted(normalise([symmetry(x, y) for x, y in cells])[0]))
+               for symmetry in SYMMETRIES)
+
+
+def split_objects(cells):
+    """Split cells into groups of cells that can interact
+
+    Cells with at most one empty cell between them are in the same group,
+    so an oscillator that comes apart in some phases, like a beacon, stays
+    one object.
+
+    Parameters:
+    cells: set of alive cells
+
+    Return:
+    list: one set of cells for each object
+    """
+
+    remaining = set(cells)
+    objects = []
+    while remaining:
+        start = remaining.pop()
+        found = {start}
+        stack = [start]
+        while stack:
+            x, y = stack.pop()
+            for dx, dy in NEARBY:
+                position = (x+dx, y+dy)
+                if position in remaining:
+                    remaining.remove(position)
+                    found.add(position)
+                    stack.append(position)
+        objects.append(found)
+    return objects
+
+
+def classify(cells, rule, max_period=30):
+    """Name an object by running it on its own
+
+    The names are similar to apgcodes: 'xs' for still lifes followed by the
+    population, 'xp' for oscillators and 'xq' for spaceships followed by the
+    period, then a hash of the object. Objects that do not repeat within
+    'max_period' generations are named 'zz'.
+
+    Parameters:
+    cells: set of alive cells of the object
+    rule (Rule): the rule to use
+    max_period (int): longest period to look for
+
+    Return:
+    str: the name of the object
+    """
+
+    start = GolModel()
+    start.state = set(cells)
+    start.rule = rule
+    engine = get_engine("isotropic")
+
+    # The cycle detector finds a cycle one period after it first repeats
+    _, cycle = find_cycle(start, engine, 2 * max_period + 1)
+    if cycle is None or cycle.period > max_period:
+        return "zz_" + str(len(cells))
+
+    # The object itself must be in the cycle, not turn into something that is
+    model = start
+    phases = []
+    for _ in range(cycle.period):
+        phases.append(model.state)
+        model = engine.advance(model)
+    moved, min_x, min_y = normalise(model.state)
+    original, start_x, start_y = normalise(cells)
+    if moved != original or (min_x - start_x, min_y - start_y) != cycle.displacement:
+        return "zz_" + str(len(cells))
+
+    # The same name for every phase of the object
+    form = min(canonical(phase) for phase in phases)
+    digest = hashlib.sha1(repr(form).encode()).hexdigest()[:12]
+
+    if cycle.displacement != (0, 0):
+        return "xq" + str(cycle.period) + "_" + digest
+    if cycle.period == 1:
+        return "xs" + str(len(cells)) + "_" + digest
+    return "xp" + str(cycle.period) + "_" + digest
+
+
+def is_periodic(populations, max_period=30, repeats=3):
+    """Check if the last populations repeat with some period
+
+    A periodic population is only a hint that the pattern has stabilised,
+    so it is used to decide when to look closer.
+
+    Parameters:
+    populations: list of populations, one for each generation
+    max_period (int): longest period to look for
+    repeats (int): number of times the period must repeat
+
+    Return:
+    bool: True if the populations are periodic
+    """
+
+    for period in range(1, max_period + 1):
+        window = period * repeats
+        if len(populations) < window:
+            break
+        recent = populations[-window:]
+        if all(recent[i] == recent[i - period] for i in range(period, window)):
+            return True
+    return False
+
+
+def run_soup(seed, size=16, density=0.5, rule="B3/S23", max_generations=10000,
+             engine="isotropic", check_every=61):
+    """Run a single soup and classify what is left
+
+    Runs in a worker process.
+
+    Parameters:
+    seed: seed for the soup
+    size (int): width and height of the soup
+    density (float): chance of each cell being alive
+    rule (str): the rule to use
+    max_generations (int): give up after this many generations
+    engine (str): name of the engine to use
+    check_every (int): look for a periodic population this often. A prime, so
+        oscillators with short periods are not always looked at in the same phase.
+
+    The soup has stabilised when every object in it repeats on its own,
+    found with a cycle detector. Escaping spaceships never let the whole
+    state repeat, so the objects are checked one by one. Objects that are
+    still going to collide are not noticed.
+
+    Return:
+    dict: the seed, the number of generations, whether the soup stabilised
+        and the number of each kind of object
+    """
+
+    model = GolModel()
+    model.state = random_soup(seed, size, density)
+    model.rule = parse_rule(rule)
+    soup_engine = get_engine(engine)
+
+    populations = []
+    stabilised = False
+    objects = None
+    while model.generation < max_generations:
+        model = soup_engine.advance(model)
+        populations.append(len(model.state))
+        if model.generation % check_every == 0 and is_periodic(populations):
+            # Only stop when no object is still changing ('zz')
+            objects = Counter(classify(cells, model.rule) for cells in split_objects(model.state))
+            if not any(name.startswith("zz") for name in objects):
+                stabilised = True
+                break
+            objects = None
+
+    if objects is None:
+        objects = Counter(classify(cells, model.rule) for cells in split_objects(model.state))
+
+    return {
+        "seed": seed,
+        "generations": model.generation,
+        "stabilised": stabilised,
+        "objects": dict(objects),
+    }
+
+
+def search(soups, output, workers=None, seed="", max_pending=None, **kwargs):
+    """Run many soups on a process pool and write the results as they come in
+
+    Parameters:
+    soups (int): number of soups to run
+    output: file to write one JSON line for each soup to
+    workers (int): number of worker processes. Defaults to the number of cores.
+    seed (str): prefix for the seed of each soup. Soup i uses seed + str(i).
+    max_pending (int): most soups waiting in the pool at one time
+    kwargs: passed on to run_soup
+
+    Return:
+    Counter: total number of each kind of object
+    """
+
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or workers * 4
+    census = Counter()
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        next_soup = 0
+        while next_soup < soups or pending:
+            # Keep the pool busy without queueing every soup at once
+            while next_soup < soups and len(pending) < max_pending:
+                pending.add(pool.submit(run_soup, seed + str(next_soup), **kwargs))
+                next_soup += 1
+
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                census.update(result["objects"])
+                output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    return census
+
+
+def main(argv=None):
+    """Command line entry point
+
+    Parameters:
+    argv: command line arguments. Defaults to sys.argv[1:]
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m gol.soup", description="Search random soups for objects")
+    parser.add_argument("-n", "--soups", type=int, default=1000, help="number of soups")
+    parser.add_argument("-o", "--output", default="census.jsonl",
+                        help="JSON lines file for the results (default: census.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes")
+    parser.add_argument("-s", "--seed", default="", help="prefix for the seed of each soup")
+    parser.add_argument("--size", type=int, default=16, help="width and height of a soup")
+    parser.add_argument("--density", type=float, default=0.5, help="chance of a cell being alive")
+    parser.add_argument("--rule", default="B3/S23", help="rule to use (default: B3/S23)")
+    parser.add_argument("--max-generations", type=int, default=10000,
+                        help="give up on a soup after this many generations")
+    parser.add_argument("-e", "--engine", choices=sorted(ENGINES), default="isotropic",
+                        help="engine to use (default: isotropic)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count()
+    start = time.perf_counter()
+    with open(args.output, "a") as output:
+        census = search(
+            args.soups, output, workers, args.seed, size=args.size, density=args.density,
+            rule=rule_string(parse_rule(args.rule)), max_generations=args.max_generations,
+            engine=args.engine)
+    elapsed = time.perf_counter() - start
+
+    for name, count in census.most_common():
+        print(name, count)
+    print("{} soups in {:.1f} s: {:.1f} soups/s, {:.1f} soups/s per core".format(
+        args.soups, elapsed, args.soups / elapsed, args.soups / elapsed / workers),
+        file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Statistics about where the time goes while running the game of life
+
+Records the time spent in the engine and the population changes for each
+update, the time the grid view spends drawing, the time the controller
+spends waiting for messages, and the number of messages of each kind.
+Nothing is recorded until the controller is sent a ("stats", True) message,
+so the statistics cost nothing when they are turned off.
+"""
+
+import csv
+import json
+import time
+from collections import Counter, deque
+
+# The columns of a generation record
+GENERATION_FIELDS = ("time", "generation", "generations", "population", "births", "deaths",
+                     "engine_seconds")
+
+
+class GolStats():
+    """Collects statistics of the controller loop
+
+    Parameters:
+    max_records (int): number of generation and frame records to keep.
+        The oldest are thrown away first.
+    """
+
+    def __init__(self, max_records=100000):
+        self.start = time.perf_counter()
+        # One dict with GENERATION_FIELDS for each update of the model
+        self.generations = deque(maxlen=max_records)
+        # (time, seconds) for each frame drawn by the grid view
+        self.frames = deque(maxlen=max_records)
+        self.engine_seconds = 0.0
+        self.generations_advanced = 0
+        self.frames_drawn = 0
+        self.render_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.messages = Counter()
+
+    def record_generation(self, old_state, model, generations, engine_seconds):
+        """Record an update of the model
+
+        Parameters:
+        old_state: set of alive cells before the update
+        model (GolModel): the model after the update
+        generations (int): number of generations advanced
+        engine_seconds (float): time spent in the engine
+        """
+
+        population = model.population
+        births = model.births
+        if births is None:
+            births = len(model.state - old_state)
+        self.engine_seconds += engine_seconds
+        self.generations_advanced += generations
+        self.generations.append({
+            "time": time.perf_counter() - self.start,
+            "generation": model.generation,
+            "generations": generations,
+            "population": population,
+            "births": births,
+            "deaths": len(old_state) + births - population,
+            "engine_seconds": engine_seconds,
+        })
+
+    def record_frame(self, seconds):
+        """Record the time the grid view spent drawing a frame
+        """
+
+        self.render_seconds += seconds
+        self.frames_drawn += 1
+        self.frames.append((time.perf_counter() - self.start, seconds))
+
+    def record_message(self, msg, wait_seconds):
+        """Record a message taken from the controller queue
+
+        Parameters:
+        msg (str): the message. None if the controller did not wait for one.
+        wait_seconds (float): time spent waiting for the message
+        """
+
+        self.queue_wait_seconds += wait_seconds
+        if msg is not None:
+            self.messages[msg] += 1
+
+    def summary(self):
+        """Summarise the statistics
+
+        Return:
+        dict: totals, the latest generation and the average times
+        """
+
+        elapsed = time.perf_counter() - self.start
+        generations = self.generations_advanced
+        latest = self.generations[-1] if self.generations else {}
+        return {
+            "seconds": elapsed,
+            "generation": latest.get("generation"),
+            "population": latest.get("population"),
+            "births": latest.get("births"),
+            "deaths": latest.get("deaths"),
+            "engine_seconds": self.engine_seconds,
+            "engine_seconds_per_generation":
+                self.engine_seconds / generations if generations else None,
+            "render_seconds": self.render_seconds,
+            "render_seconds_per_frame":
+                self.render_seconds / self.frames_drawn if self.frames_drawn else None,
+            "generations": generations,
+            "frames": self.frames_drawn,
+            "queue_wait_seconds": self.queue_wait_seconds,
+            "messages": sum(self.messages.values()),
+            "messages_by_kind": dict(self.messages),
+        }
+
+    def export(self, filename):
+        """Write the statistics to a file
+
+        Files ending in '.csv' get one row for each generation record.
+        Any other file gets everything as JSON.
+
+        Parameters:
+        filename (str): the file to write
+        """
+
+        with open(filename, "w", newline="") as stats_file:
+            if filename.lower().endswith(".csv"):
+                writer = csv.DictWriter(stats_file, GENERATION_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.generations)
+            else:
+                json.dump({
+                    "summary": self.summary(),
+                    "generations": list(self.generations),
+                    "frames": [{"time": at, "render_seconds": seconds}
+                               for at, seconds in self.frames],
+                }, stats_file, indent=2)
+
+
+def describe_stats(summary):
+    """Describe a summary of the statistics in a few lines
+
+    Parameters:
+    summary (dict): from GolStats.summary()
+
+    Return:
+    str: the description
+    """
+
+    def milliseconds(seconds):
+        return "-" if seconds is None else "{:.2f} ms".format(seconds * 1000)
+
+    return "\n".join((
+        "Generation {}, population {} (+{} -{})".format(
+            summary["generation"], summary["population"], summary["births"],
+            summary["deaths"]),
+        "Engine: {} per generation, {:.1f} s in total".format(
+            milliseconds(summary["engine_seconds_per_generation"]), summary["engine_seconds"]),
+        "Render: {} per frame, {} frames".format(
+            milliseconds(summary["render_seconds_per_frame"]), summary["frames"]),
+        "Queue wait: {:.1f} s of {:.1f} s, {} messages".format(
+            summary["queue_wait_seconds"], summary["seconds"], summary["messages"]),
+    ))
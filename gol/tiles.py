@@ -0,0 +1,379 @@
+"""A state of alive cells kept in 64x64 bitmap tiles
+
+TiledState can be used wherever a set of cells is expected, but also knows
+which cells are where. Each tile is a Python int of 4096 bits, where bit
+64*row + column is the cell (64*tile_x + column, 64*tile_y + row). Only
+tiles with alive cells are kept.
+
+Region queries only look at the tiles that overlap the region, so a view or
+a server can get the cells it shows without going through all of them.
+"""
+
+from collections.abc import MutableSet, Set
+from functools import lru_cache
+
+# log2 of the width and height of a tile
+TILE_SHIFT = 6
+
+# Width and height of a tile
+TILE_SIZE = 1 << TILE_SHIFT
+
+# Number of cells in a tile
+TILE_CELLS = TILE_SIZE * TILE_SIZE
+
+# One row of a tile
+ROW_MASK = (1 << TILE_SIZE) - 1
+
+# Positions of the set bits in each byte
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+def tile_of(cell):
+    """Return the tile coordinates of a cell
+
+    >>> tile_of((70, -1))
+    (1, -1)
+    """
+
+    return cell[0] >> TILE_SHIFT, cell[1] >> TILE_SHIFT
+
+
+def bit_indices(bits):
+    """Generate the indices of the set bits of a tile, lowest first
+    """
+
+    for byte_index, byte in enumerate(bits.to_bytes(TILE_CELLS // 8, "little")):
+        if byte:
+            base = byte_index * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+def fold_rows(bits):
+    """OR all the rows of a tile together
+
+    Return:
+    int: 64 bits where bit c is set if column c has alive cells
+    """
+
+    shift = TILE_CELLS // 2
+    while shift >= TILE_SIZE:
+        bits |= bits >> shift
+        shift //= 2
+    return bits & ROW_MASK
+
+
+@lru_cache(maxsize=None)
+def _columns_mask(first, last):
+    """Bits of columns 'first' to 'last' (included) in every row of a tile
+    """
+
+    row = ((1 << (last - first + 1)) - 1) << first
+    return sum(row << (TILE_SIZE * r) for r in range(TILE_SIZE))
+
+
+@lru_cache(maxsize=None)
+def _rows_mask(first, last):
+    """Bits of rows 'first' to 'last' (included) of a tile
+    """
+
+    return ((1 << (TILE_SIZE * (last - first + 1))) - 1) << (TILE_SIZE * first)
+
+
+class TiledState(MutableSet):
+    """A set of alive cells kept in 64x64 bitmap tiles
+
+    Parameters:
+    cells: Iterable of (x, y) coordinates of alive cells
+    """
+
+    __hash__ = None
+
+    def __init__(self, cells=()):
+        # (tile_x, tile_y) -> bits of the tile. Never 0.
+        self.tiles = dict()
+        self._population = 0
+
+        by_tile = dict()
+        for x, y in cells:
+            key = (x >> TILE_SHIFT, y >> TILE_SHIFT)
+            tile = by_tile.get(key)
+            if tile is None:
+                tile = by_tile[key] = bytearray(TILE_CELLS // 8)
+            index = (y & (TILE_SIZE - 1)) << TILE_SHIFT | (x & (TILE_SIZE - 1))
+            tile[index >> 3] |= 1 << (index & 7)
+
+        for key, tile in by_tile.items():
+            bits = int.from_bytes(tile, "little")
+            self.tiles[key] = bits
+            self._population += bits.bit_count()
+
+    @classmethod
+    def from_tiles(cls, tiles):
+        """Make a state from tiles
+
+        Parameters:
+        tiles (dict): (tile_x, tile_y) -> bits. Empty tiles are left out.
+
+        Return:
+        TiledState: the state. It takes over the dict.
+        """
+
+        state = cls()
+        for key in [key for key, bits in tiles.items() if not bits]:
+            del tiles[key]
+        state.tiles = tiles
+        state._population = sum(bits.bit_count() for bits in tiles.values())
+        return state
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return cls(iterable)
+
+    @property
+    def population(self):
+        """Number of alive cells
+        """
+
+        return self._population
+
+    def __len__(self):
+        return self._population
+
+    def __contains__(self, cell):
+        x, y = cell
+        bits = self.tiles.get((x >> TILE_SHIFT, y >> TILE_SHIFT))
+        return bool(bits) and bool(
+            bits >> ((y & (TILE_SIZE - 1)) << TILE_SHIFT | (x & (TILE_SIZE - 1))) & 1)
+
+    def __iter__(self):
+        for (tile_x, tile_y), bits in list(self.tiles.items()):
+            yield from self._tile_cells(tile_x, tile_y, bits)
+
+    def __repr__(self):
+        return "TiledState({} cells in {} tiles)".format(self._population, len(self.tiles))
+
+    @staticmethod
+    def _tile_cells(tile_x, tile_y, bits):
+        """Generate the cells of a tile
+        """
+
+        left = tile_x << TILE_SHIFT
+        top = tile_y << TILE_SHIFT
+        for index in bit_indices(bits):
+            yield left + (index & (TILE_SIZE - 1)), top + (index >> TILE_SHIFT)
+
+    def add(self, cell):
+        x, y = cell
+        key = (x >> TILE_SHIFT, y >> TILE_SHIFT)
+        mask = 1 << ((y & (TILE_SIZE - 1)) << TILE_SHIFT | (x & (TILE_SIZE - 1)))
+        bits = self.tiles.get(key, 0)
+        if not bits & mask:
+            self.tiles[key] = bits | mask
+            self._population += 1
+
+    def discard(self, cell):
+        x, y = cell
+        key = (x >> TILE_SHIFT, y >> TILE_SHIFT)
+        mask = 1 << ((y & (TILE_SIZE - 1)) << TILE_SHIFT | (x & (TILE_SIZE - 1)))
+        bits = self.tiles.get(key, 0)
+        if bits & mask:
+            bits ^= mask
+            if bits:
+                self.tiles[key] = bits
+            else:
+                del self.tiles[key]
+            self._population -= 1
+
+    def copy(self):
+        """Return a copy of the state. The tiles are immutable ints, so this is cheap.
+        """
+
+        state = TiledState()
+        state.tiles = dict(self.tiles)
+        state._population = self._population
+        return state
+
+    def _tile_operation(self, other, operation):
+        """Combine two TiledStates tile by tile
+        """
+
+        tiles = dict()
+        for key in self.tiles.keys() | other.tiles.keys():
+            tiles[key] = operation(self.tiles.get(key, 0), other.tiles.get(key, 0))
+        return TiledState.from_tiles(tiles)
+
+    def __and__(self, other):
+        if isinstance(other, TiledState):
+            tiles = {key: bits & other.tiles[key] for key, bits in self.tiles.items()
+                     if key in other.tiles}
+            return TiledState.from_tiles(tiles)
+        return Set.__and__(self, other)
+
+    def __or__(self, other):
+        if isinstance(other, TiledState):
+            return self._tile_operation(other, lambda a, b: a | b)
+        return Set.__or__(self, other)
+
+    def __sub__(self, other):
+        if isinstance(other, TiledState):
+            tiles = {key: bits & ~other.tiles.get(key, 0) for key, bits in self.tiles.items()}
+            return TiledState.from_tiles(tiles)
+        return Set.__sub__(self, other)
+
+    def __xor__(self, other):
+        if isinstance(other, TiledState):
+            return self._tile_operation(other, lambda a, b: a ^ b)
+        return Set.__xor__(self, other)
+
+    def __eq__(self, other):
+        if isinstance(other, TiledState):
+            return self.tiles == other.tiles
+        return Set.__eq__(self, other)
+
+    def tile_population(self, tile_x, tile_y):
+        """Number of alive cells in a tile
+
+        Parameters:
+        tile_x, tile_y (int): the tile coordinates
+
+        Return:
+        int: the number of alive cells
+        """
+
+        return self.tiles.get((tile_x, tile_y), 0).bit_count()
+
+    def tile_populations(self):
+        """Number of alive cells in every tile with alive cells
+
+        Return:
+        dict: (tile_x, tile_y) -> number of alive cells
+        """
+
+        return {key: bits.bit_count() for key, bits in self.tiles.items()}
+
+    def region_tiles(self, x_min, y_min, x_max, y_max):
+        """Generate the tiles overlapping a region, cut to the region
+
+        Parameters:
+        x_min, y_min, x_max, y_max (int): the region, edges included
+
+        Yield:
+        (int, int, int): tile_x, tile_y and the bits of the tile inside the region
+        """
+
+        first_x, first_y = x_min >> TILE_SHIFT, y_min >> TILE_SHIFT
+        last_x, last_y = x_max >> TILE_SHIFT, y_max >> TILE_SHIFT
+
+        # Look up the tiles in the region, or go through all tiles if there are fewer
+        if (last_x - first_x + 1) * (last_y - first_y + 1) <= len(self.tiles):
+            keys = ((tile_x, tile_y) for tile_y in range(first_y, last_y + 1)
+                    for tile_x in range(first_x, last_x + 1) if (tile_x, tile_y) in self.tiles)
+        else:
+            keys = [key for key in self.tiles
+                    if first_x <= key[0] <= last_x and first_y <= key[1] <= last_y]
+
+        for tile_x, tile_y in keys:
+            bits = self.tiles[(tile_x, tile_y)]
+            # Cut the edge tiles to the region
+            left = max(x_min - (tile_x << TILE_SHIFT), 0)
+            right = min(x_max - (tile_x << TILE_SHIFT), TILE_SIZE - 1)
+            top = max(y_min - (tile_y << TILE_SHIFT), 0)
+            bottom = min(y_max - (tile_y << TILE_SHIFT), TILE_SIZE - 1)
+            if left or top or right < TILE_SIZE - 1 or bottom < TILE_SIZE - 1:
+                bits &= _columns_mask(left, right) & _rows_mask(top, bottom)
+            if bits:
+                yield tile_x, tile_y, bits
+
+    def region(self, x_min, y_min, x_max, y_max):
+        """Generate the alive cells inside a region
+
+        Only the tiles overlapping the region are looked at.
+
+        Parameters:
+        x_min, y_min, x_max, y_max (int): the region, edges included
+
+        Yield:
+        (int, int): the coordinates of the alive cells
+        """
+
+        for tile_x, tile_y, bits in self.region_tiles(x_min, y_min, x_max, y_max):
+            yield from self._tile_cells(tile_x, tile_y, bits)
+
+    def region_population(self, x_min, y_min, x_max, y_max):
+        """Number of alive cells inside a region
+
+        Parameters:
+        x_min, y_min, x_max, y_max (int): the region, edges included
+
+        Return:
+        int: the number of alive cells
+        """
+
+        return sum(bits.bit_count() for _, _, bits in
+                   self.region_tiles(x_min, y_min, x_max, y_max))
+
+    def bounds(self):
+        """Return the bounding box of the alive cells
+
+        Only the tiles at the edges are looked at.
+
+        Return:
+        (int, int, int, int): (min_x, min_y, max_x, max_y), or None if there are no cells
+        """
+
+        if not self.tiles:
+            return None
+
+        min_tile_x = min(key[0] for key in self.tiles)
+        max_tile_x = max(key[0] for key in self.tiles)
+        min_tile_y = min(key[1] for key in self.tiles)
+        max_tile_y = max(key[1] for key in self.tiles)
+
+        left = right = top = bottom = 0
+        for (tile_x, tile_y), bits in self.tiles.items():
+            if tile_x == min_tile_x:
+                left |= fold_rows(bits)
+            if tile_x == max_tile_x:
+                right |= fold_rows(bits)
+            if tile_y == min_tile_y:
+                top |= bits & -bits
+            if tile_y == max_tile_y:
+                bottom = max(bottom, bits.bit_length())
+
+        return ((min_tile_x << TILE_SHIFT) + (left & -left).bit_length() - 1,
+                (min_tile_y << TILE_SHIFT) + ((top & -top).bit_length() - 1 >> TILE_SHIFT),
+                (max_tile_x << TILE_SHIFT) + right.bit_length() - 1,
+                (max_tile_y << TILE_SHIFT) + (bottom - 1 >> TILE_SHIFT))
+
+    def rows(self):
+        """Generate the rows of alive cells as runs, for the rle saver
+
+        Yield:
+        (int, list): the y coordinate of the row and a sorted list of
+            (start, end) runs of alive cells, with 'end' not included
+        """
+
+        by_row = dict()
+        for (tile_x, tile_y), bits in self.tiles.items():
+            by_row.setdefault(tile_y, []).append((tile_x, bits))
+
+        for tile_y in sorted(by_row):
+            tiles = sorted(by_row[tile_y])
+            for row in range(TILE_SIZE):
+                shift = TILE_SIZE * row
+                runs = []
+                for tile_x, bits in tiles:
+                    row_bits = bits >> shift & ROW_MASK
+                    left = tile_x << TILE_SHIFT
+                    while row_bits:
+                        start = (row_bits & -row_bits).bit_length() - 1
+                        # Add one at the start of the run to find its end
+                        end = ((row_bits + (1 << start)) & ~row_bits).bit_length() - 1
+                        row_bits &= ~((1 << end) - (1 << start))
+                        if runs and runs[-1][1] == left + start:
+                            runs[-1] = (runs[-1][0], left + end)
+                        else:
+                            runs.append((left + start, left + end))
+                if runs:
+                    yield (tile_y << TILE_SHIFT) + row, runs
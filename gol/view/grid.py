@@ -3,8 +3,12 @@
 Must contain a GolGridView class that starts itself as a thread
 """
 
-import queue
+import math
 import threading
+import time
+from itertools import chain
+
+import numpy
 import pygame
 
 # The size of a cell without scaling
@@ -13,24 +17,51 @@ BASE_CELL_SIZE = 100
 # Each step of zoom scales the cell-size by this factor
 ZOOM_FACTOR = 0.75
 
+# Below this many pixels per cell, cells are drawn as single pixels instead of rects
+MIN_RECT_SCALE = 2
+
 
-def queue_translator(event_queue, view_queue):
-    """Listens for messages on the view queue and puts them into pygames queue
+class EventQueue():
+    """The grid view queue
 
-    Parameters:
-    event_queue: pygames queue
-    view_queue: view queue
+    Messages are posted straight into pygames event queue as USEREVENTs,
+    which wakes up the view. Messages put before pygame is set up are kept
+    until 'start' is called.
     """
 
-    done = False
-    while not done:
-        # Waits for a message on this threads queue
-        msg, attr = view_queue.get()
-        # Put it into pygames queue as a USEREVENT
-        event = pygame.event.Event(pygame.USEREVENT, msg=msg, attr=attr)
-        event_queue.post(event)
-        if msg == "quit":
-            done = True
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.started = False
+
+    def put(self, message):
+        """Put a (msg, attr) message on the queue. Safe to call from any thread.
+        """
+
+        with self.lock:
+            if not self.started:
+                self.waiting.append(message)
+                return
+        self._post(message)
+
+    def start(self):
+        """Post the messages that were put before pygame was set up
+        """
+
+        with self.lock:
+            self.started = True
+            waiting, self.waiting = self.waiting, []
+        for message in waiting:
+            self._post(message)
+
+    @staticmethod
+    def _post(message):
+        msg, attr = message
+        try:
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, msg=msg, attr=attr))
+        except pygame.error:
+            # The window is closed
+            pass
 
 
 class GolGridView(threading.Thread):
@@ -38,14 +69,14 @@ class GolGridView(threading.Thread):
 
     """
 
-    def __init__(self, hub_queue: queue.Queue):
+    def __init__(self, hub_queue):
         threading.Thread.__init__(self)
 
         # The controllers queue
         self.hub_queue = hub_queue
 
         # This threads queue
-        self.queue = queue.Queue()
+        self.queue = EventQueue()
 
         # Start with no zoom
         self.zoom = 0
@@ -61,6 +92,11 @@ class GolGridView(threading.Thread):
 
         # Start with no alive cells
         self.gol = set()
+        self.generation = 0
+        self.bounds = None
+
+        # The alive cells as a NumPy array of shape (n, 2). Made from self.gol when needed.
+        self.cells = None
 
         # Which cell is centered in the window?
         self.gol_center = [0, 0]
@@ -87,10 +123,8 @@ class GolGridView(threading.Thread):
         self.draw_state(self.color_alive)
         pygame.display.flip()
 
-        # Start queue translator
-        queue_translator_thread = threading.Thread(
-            target=queue_translator, args=[pygame.event, self.queue])
-        queue_translator_thread.start()
+        # Messages from the controller can be posted as events from now on
+        self.queue.start()
 
         # To keep track of the status of the right mouse button when
         # moving the center point of the window
@@ -113,7 +147,9 @@ class GolGridView(threading.Thread):
                 if event.msg == "quit":
                     done = True
                 if event.msg == "update":
-                    self.gol = event.attr
+                    # A Frame. Its state is never changed, so it is safe to read here.
+                    self.generation, self.gol, self.bounds = event.attr
+                    self.cells = None
                     update_view = True
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -152,6 +188,12 @@ class GolGridView(threading.Thread):
                     self.zoom += 1
                     update_view = True
 
+            elif event.type == pygame.KEYDOWN:
+                # F - Fit the pattern in the window
+                if event.key == pygame.K_f:
+                    self.fit_to_pattern()
+                    update_view = True
+
             elif event.type == pygame.MOUSEBUTTONUP:
                 # Right mouse button
                 if event.button == 3:
@@ -177,25 +219,98 @@ class GolGridView(threading.Thread):
         pygame.quit()
 
 
+    def fit_to_pattern(self):
+        """Center the pattern and zoom so all of it is in the window
+        """
+
+        if self.bounds is None:
+            return
+
+        min_x, min_y, max_x, max_y = self.bounds
+        self.gol_center = [(min_x + max_x + 1) / 2, (min_y + max_y + 1) / 2]
+
+        # Zoom out until the pattern fits
+        width = max_x - min_x + 1
+        height = max_y - min_y + 1
+        self.zoom = 0
+        while pow(ZOOM_FACTOR, self.zoom) * BASE_CELL_SIZE * max(
+                width / self.window_size[0], height / self.window_size[1]) > 1:
+            self.zoom += 1
+
     def draw(self):
         """Handles the administative tasks of drawing of the cells in the grid window
         """
 
         # Tell the controller that we are busy updating the window
-        self.hub_queue.put(("view-busy", None))
+        self.hub_queue.put(("view_busy", None))
+        start = time.perf_counter()
 
         # Clear window and draw it again
         self.screen.fill(self.color_bg)
         self.draw_state(self.color_alive)
         pygame.display.flip()
 
-        # Tell the controller we are not busy anymore
-        self.hub_queue.put(("view_idle", None))
+        # Tell the controller we are not busy anymore, and how long it took
+        self.hub_queue.put(("view_idle", time.perf_counter() - start))
+
+
+    def cell_array(self):
+        """The alive cells as a NumPy array
 
+        The array is made once for each update, so moving and zooming
+        do not have to go through the set again.
+
+        Return:
+        numpy.ndarray: array of shape (n, 2) with the x and y of each cell
+        """
+
+        if self.cells is None:
+            self.cells = numpy.fromiter(
+                chain.from_iterable(self.gol), dtype=numpy.int64,
+                count=2 * len(self.gol)).reshape(-1, 2)
+        return self.cells
+
+    def visible_cells(self, scale):
+        """The alive cells that are (partly) inside the window
+
+        Parameters:
+        scale (float): pixels per cell
+
+        Return:
+        numpy.ndarray: array of shape (n, 2) with the x and y of each cell
+        """
+
+        half_width = self.window_size[0] / 2 / scale
+        half_height = self.window_size[1] / 2 / scale
+
+        region = getattr(self.gol, "region", None)
+        if region is not None:
+            # A TiledState only looks at the tiles inside the window
+            cells = list(chain.from_iterable(region(
+                math.floor(self.gol_center[0] - half_width - 1),
+                math.floor(self.gol_center[1] - half_height - 1),
+                math.ceil(self.gol_center[0] + half_width),
+                math.ceil(self.gol_center[1] + half_height))))
+            cells = numpy.array(cells, dtype=numpy.int64).reshape(-1, 2)
+        else:
+            cells = self.cell_array()
+
+        x = cells[:, 0]
+        y = cells[:, 1]
+        visible = ((x >= self.gol_center[0] - half_width - 1) &
+                   (x <= self.gol_center[0] + half_width) &
+                   (y >= self.gol_center[1] - half_height - 1) &
+                   (y <= self.gol_center[1] + half_height))
+        return cells[visible]
 
     def draw_state(self, color):
         """Draw the cells in the grid window
 
+        Only the cells inside the window are drawn. When zoomed out so far
+        that a cell is less than MIN_RECT_SCALE pixels, each cell is a single
+        pixel written straight into the window surface, so the time it takes
+        depends on the window size and not on the number of cells.
+
         Parameters:
         color: Color of the alive cells. See pygame documentation for format.
         """
@@ -203,19 +318,26 @@ class GolGridView(threading.Thread):
         # Calculate scaling factor
         scale = pow(ZOOM_FACTOR, self.zoom) * BASE_CELL_SIZE
 
-        for x, y in self.gol:
-
-            # translate scale center to origin
-            x -= self.gol_center[0]
-            y -= self.gol_center[1]
-
-            # scale
-            x *= scale
-            y *= scale
-
-            # translate to view center
-            x += self.window_size[0]/2
-            y += self.window_size[1]/2
-
-            pygame.draw.rect(self.screen, color,
-                             (x, y, scale-1, scale-1))
+        cells = self.visible_cells(scale)
+        if len(cells) == 0:
+            return
+
+        # translate scale center to origin, scale and translate to view center
+        x = (cells[:, 0] - self.gol_center[0]) * scale + self.window_size[0]/2
+        y = (cells[:, 1] - self.gol_center[1]) * scale + self.window_size[1]/2
+
+        if scale >= MIN_RECT_SCALE:
+            for left, top in zip(x.tolist(), y.tolist()):
+                pygame.draw.rect(self.screen, color,
+                                 (left, top, scale-1, scale-1))
+            return
+
+        # Many cells end up on the same pixel
+        x = numpy.floor(x).astype(numpy.intp)
+        y = numpy.floor(y).astype(numpy.intp)
+        inside = (x >= 0) & (x < self.window_size[0]) & (y >= 0) & (y < self.window_size[1])
+
+        pixels = pygame.surfarray.pixels3d(self.screen)
+        pixels[x[inside], y[inside]] = pygame.Color(color)[:3]
+        # Unlock the surface
+        del pixels
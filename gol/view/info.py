@@ -9,6 +9,32 @@ import tkinter
 import tkinter.filedialog
 from tkinter import messagebox
 
+from gol.cycle import describe_cycle
+from gol.stats import describe_stats
+
+class TkQueue(queue.Queue):
+    """The info view queue
+
+    Putting a message also generates a virtual event in the tkinter window,
+    so the view handles it straight away instead of polling the queue.
+    """
+
+    def __init__(self):
+        queue.Queue.__init__(self)
+        # The tkinter window, once its main loop is running
+        self.root = None
+
+    def put(self, item, block=True, timeout=None):
+        queue.Queue.put(self, item, block, timeout)
+        root = self.root
+        if root is not None:
+            try:
+                root.event_generate("<<GolMessage>>", when="tail")
+            except (tkinter.TclError, RuntimeError):
+                # The window is closed
+                pass
+
+
 class GolInfoView(threading.Thread):
     """Everything needed for the info window
     """
@@ -16,7 +42,7 @@ class GolInfoView(threading.Thread):
     def __init__(self, hub_queue):
         threading.Thread.__init__(self)
         self.hub_queue = hub_queue
-        self.queue = queue.Queue()
+        self.queue = TkQueue()
         self.model = None
         self.running = False
         self.start()
@@ -37,10 +63,31 @@ class GolInfoView(threading.Thread):
         step_button = tkinter.Button(root, text="Step", command=self.step)
         step_button.pack()
 
+        step_back_button = tkinter.Button(root, text="Step back", command=self.step_back)
+        step_back_button.pack()
+
         self.run_button = tkinter.Button(
             root, text="Run", command=self.auto_advance)
         self.run_button.pack()
 
+        faster_button = tkinter.Button(root, text="Faster", command=self.faster)
+        faster_button.pack()
+
+        slower_button = tkinter.Button(root, text="Slower", command=self.slower)
+        slower_button.pack()
+
+        self.show_stats = tkinter.BooleanVar(root, value=False)
+        stats_button = tkinter.Checkbutton(
+            root, text="Statistics", variable=self.show_stats, command=self.toggle_stats)
+        stats_button.pack()
+
+        export_button = tkinter.Button(
+            root, text="Export statistics...", command=self.export_stats)
+        export_button.pack()
+
+        self.stats = tkinter.Label(root, justify=tkinter.LEFT, font="TkFixedFont")
+        self.stats.pack()
+
         self.description = tkinter.Text(root, width=80, height=10)
         self.description.pack()
 
@@ -48,12 +95,15 @@ class GolInfoView(threading.Thread):
 
         self.running = False
 
-        # Poll the queue every 200ms
-        root.after(200, self.check_queue)
+        # Handle messages as soon as they are put on the queue
+        root.bind("<<GolMessage>>", lambda event: self.check_queue())
+        root.after(0, self.start_queue)
 
         # tkinter main loop
         root.mainloop()
 
+        self.queue.root = None
+
         # Tell controller to quit
         self.hub_queue.put(("quit", None))
 
@@ -63,8 +113,17 @@ class GolInfoView(threading.Thread):
 
         del self.root
         del self.run_button
+        del self.show_stats
+        del self.stats
         del self.description
 
+    def start_queue(self):
+        """Handle messages put before the main loop started, and any later ones when they are put
+        """
+
+        self.queue.root = self.root
+        self.check_queue()
+
     def check_queue(self):
         """Check if there are messages on the queue
         """
@@ -74,16 +133,24 @@ class GolInfoView(threading.Thread):
 
             if msg == "quit":
                 self.root.destroy()
+                return
             elif msg == "model":
                 self.model = attr
                 self.update_info()
+            elif msg == "stabilised":
+                self.running = False
+                self.run_button.config(text="Run")
+                messagebox.showinfo("Stabilised", describe_cycle(attr))
+            elif msg == "stats":
+                self.stats.config(text=describe_stats(attr) if attr else "")
             elif msg == "error_saving":
                 messagebox.showwarning("Warning", "Could not save file.")
             elif msg == "error_loading":
                 messagebox.showerror("Error", "Could not load file.")
-
-        # Schedule another check after 200ms
-        self.root.after(200, self.check_queue)
+            elif msg == "error_engine":
+                self.running = False
+                self.run_button.config(text="Run")
+                messagebox.showerror("Error", attr)
 
     def update_info(self):
         """Update the description/comments text-box
@@ -113,6 +180,12 @@ class GolInfoView(threading.Thread):
 
         self.hub_queue.put(("step", 1))
 
+    def step_back(self):
+        """Tell controller to go back one tick/generation
+        """
+
+        self.hub_queue.put(("step_back", None))
+
     def auto_advance(self):
         """Tell controller to start/stop 'running'. Also change button text to match.
         """
@@ -123,3 +196,31 @@ class GolInfoView(threading.Thread):
         else:
             self.run_button.config(text="Run")
         self.hub_queue.put(("run", None))
+
+    def faster(self):
+        """Tell controller to advance more generations for each update when 'running'
+        """
+
+        self.hub_queue.put(("faster", None))
+
+    def slower(self):
+        """Tell controller to advance fewer generations for each update when 'running'
+        """
+
+        self.hub_queue.put(("slower", None))
+
+    def toggle_stats(self):
+        """Tell controller to start or stop collecting statistics
+        """
+
+        self.hub_queue.put(("stats", self.show_stats.get()))
+
+    def export_stats(self):
+        """Ask for a CSV or JSON file, and tell controller to write the statistics to it
+        """
+
+        filename = tkinter.filedialog.asksaveasfilename(
+            initialdir=".", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")])
+        if filename:
+            self.hub_queue.put(("stats_export", filename))